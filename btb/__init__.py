@@ -1,4 +1,17 @@
-from .server import ToolAgentServer
-from .client import ToolAgentClient
+# Resolved on first access so that importing the client never loads the server's
+# dependencies (LLM SDKs, Chroma, Postgres, Flask) and vice versa
+_EXPORTS = {
+    "ToolAgentServer": ".server",
+    "ToolAgentClient": ".client",
+}
 
-__all__ = [ToolAgentClient, ToolAgentServer]
+__all__ = ["ToolAgentClient", "ToolAgentServer"]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
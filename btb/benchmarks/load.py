@@ -0,0 +1,260 @@
+"""
+Replay a task corpus against /api/genTool at a fixed concurrency and report
+throughput, end-to-end and per-stage latency percentiles and cache hit rates.
+
+With --spawn-server the server is started fully offline: fake LLM backend,
+in-memory catalog and vector index, hashing embeddings, tracing off. Examples:
+
+    python -m btb.benchmarks.load --spawn-server --requests 200 --concurrency 16 --save-baseline baseline.json
+    python -m btb.benchmarks.load --spawn-server --requests 200 --concurrency 16 --baseline baseline.json
+
+Without --corpus a synthetic corpus is used: a few task templates with varying
+arguments, so repeated task shapes exercise catalog reuse.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+import numpy as np
+
+OFFLINE_ENV = {
+    "BTB_LLM_BACKEND": "FAKE",
+    "BTB_CATALOG_STORE": "memory",
+    "BTB_VECTOR_BACKEND": "memory",
+    "BTB_EMBEDDING_MODEL": "hash",
+    "BTB_EMBEDDING_CACHE_PATH": "",
+    "BTB_TRACE_MODE": "off",
+}
+
+TEMPLATES = [
+    "add {a} and {b}",
+    "multiply {a} by {b}",
+    "get the median value of the numbers [{a}, {b}, {c}]",
+    "reverse the string '{word}'",
+    "count the vowels in '{word}'",
+    "convert {a} celsius to fahrenheit",
+    "check whether {a} is a prime number",
+    "compute the factorial of {c}",
+]
+WORDS = ["hello", "benchmark", "tooling", "python", "agent", "catalog"]
+
+# Compared against a baseline: (metric path, True if higher is better)
+COMPARED = [
+    (("throughput_rps",), True),
+    (("latency_s", "p50"), False),
+    (("latency_s", "p95"), False),
+    (("latency_s", "p99"), False),
+    (("reuse_rate",), True),
+    (("prompt_cache_hit_ratio",), True),
+]
+
+
+def synthetic_corpus(n: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        rng.choice(TEMPLATES).format(a=rng.randint(1, 99), b=rng.randint(1, 99), c=rng.randint(1, 12), word=rng.choice(WORDS))
+        for _ in range(n)
+    ]
+
+
+def load_corpus(path: str) -> List[str]:
+    tasks = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            # JSONL with a "task" field, or one plain task per line
+            tasks.append(json.loads(line)["task"] if line.startswith("{") else line)
+    return tasks
+
+
+def http(method: str, url: str, body: Optional[Dict] = None, timeout: float = 600, headers: Optional[Dict] = None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json", **(headers or {})})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    return {f"p{p}": float(np.percentile(values, p)) for p in (50, 95, 99)}
+
+
+def run_load(url: str, tasks: List[str], concurrency: int) -> Dict:
+    latencies, stage_latencies, statuses = [], {}, {}
+    reused = 0
+    lock = threading.Lock()
+
+    def one(index: int):
+        nonlocal reused
+        start = time.perf_counter()
+        # Each task is sent as its own caller so admission fairness does not skew the run
+        status, payload = http("POST", f"{url}/api/genTool", {"task": tasks[index]}, headers={"X-BTB-Caller": f"load-{index}"})
+        elapsed = time.perf_counter() - start
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            if status != 200:
+                return
+            latencies.append(elapsed)
+            response = json.loads(payload)
+            reused += bool(response.get("reused"))
+            for stage, seconds in response.get("stage_seconds", {}).items():
+                stage_latencies.setdefault(stage, []).append(seconds)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(len(tasks))))
+    wall = time.perf_counter() - start
+
+    ok = statuses.get(200, 0)
+    return {
+        "requests": len(tasks),
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "throughput_rps": ok / wall if wall else 0.0,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "latency_s": percentiles(latencies),
+        "stage_latency_s": {stage: percentiles(values) for stage, values in sorted(stage_latencies.items())},
+        "reuse_rate": reused / ok if ok else 0.0,
+    }
+
+
+def add_usage(result: Dict, url: str):
+    status, payload = http("GET", f"{url}/api/usage")
+    if status != 200:
+        return
+    agents = json.loads(payload).get("agents", {})
+    input_tokens = sum(agent["input_tokens"] for agent in agents.values())
+    cached_tokens = sum(agent["cached_tokens"] for agent in agents.values())
+    result["prompt_cache_hit_ratio"] = cached_tokens / input_tokens if input_tokens else 0.0
+    result["llm_calls"] = {name: agent["calls"] for name, agent in agents.items()}
+
+
+def _get(result: Dict, path: tuple):
+    for key in path:
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+
+def compare(result: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Print the change of each compared metric; return the ones worse than max_regression."""
+    regressions = []
+    print("\nvs baseline:")
+    for path, higher_is_better in COMPARED:
+        current, previous = _get(result, path), _get(baseline, path)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > max_regression else ""
+        print(f"  {'.'.join(path):<24} {previous:.3f} -> {current:.3f} ({change:+.1%}){flag}")
+        if flag:
+            regressions.append(".".join(path))
+    return regressions
+
+
+def print_result(result: Dict):
+    print(f"{result['requests']} requests at concurrency {result['concurrency']} in {result['wall_s']:.1f}s")
+    print(f"throughput: {result['throughput_rps']:.2f} req/s  statuses: {result['statuses']}")
+    fmt = lambda p: "  ".join(f"{key}={value * 1000:.0f}ms" if value is not None else f"{key}=-" for key, value in p.items())
+    print(f"end to end: {fmt(result['latency_s'])}")
+    for stage, values in result["stage_latency_s"].items():
+        print(f"  {stage:<12} {fmt(values)}")
+    print(f"catalog reuse rate: {result['reuse_rate']:.1%}")
+    if "prompt_cache_hit_ratio" in result:
+        print(f"prompt cache hit ratio: {result['prompt_cache_hit_ratio']:.1%}")
+
+
+def wait_until_serving(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if http("GET", f"{url}/metrics", timeout=1)[0] == 200:
+                return
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.1)
+    raise TimeoutError(f"Server did not start within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /api/genTool")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--corpus", help="JSONL with a task field, or one task per line")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spawn-server", action="store_true", help="Start an offline server on --port for the run")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--fake-speed", type=float, default=1.0, help="BTB_FAKE_LLM_SPEED for the spawned server")
+    parser.add_argument("--server-env", nargs="*", default=[], help="Extra KEY=VALUE settings for the spawned server")
+    parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results saved with --save-baseline")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative regression before failing")
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+        tasks = [corpus[i % len(corpus)] for i in range(args.requests)]
+    else:
+        tasks = synthetic_corpus(args.requests, args.seed)
+
+    process = None
+    url = args.url
+    if args.spawn_server:
+        url = f"http://localhost:{args.port}"
+        env = {
+            **os.environ,
+            **OFFLINE_ENV,
+            "BTB_FAKE_LLM_SPEED": str(args.fake_speed),
+            "BTB_ARTIFACT_PATH": tempfile.mkdtemp(prefix="btb-artifacts-"),
+            "BTB_WHEELHOUSE": tempfile.mkdtemp(prefix="btb-wheelhouse-"),
+            **dict(item.split("=", 1) for item in args.server_env),
+        }
+        process = subprocess.Popen(
+            [sys.executable, "-m", "btb.server.server", "--port", str(args.port)],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    try:
+        if process:
+            wait_until_serving(url, process, timeout=120)
+        http("GET", f"{url}/api/usage?reset=1")
+        result = run_load(url, tasks, args.concurrency)
+        add_usage(result, url)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print_result(result)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(result, json.load(f), args.max_regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Offline hit-rate and latency evaluation of catalog retrieval.
+
+Builds throwaway vector (numpy backend) and BM25 indexes from a catalog and
+reports how often each strategy ranks the expected tool first / in the top k.
+
+    python -m btb.benchmarks.retrieval_eval --catalog catalog.jsonl --queries queries.jsonl
+
+catalog.jsonl lines: {"id": ..., "description": ..., "arguments": [...]}
+queries.jsonl lines: {"query": ..., "expected_id": ...}
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from btb.server.agents.helpers.lexical import BM25Index, hybrid_rank, tool_document
+from btb.server.agents.helpers.postgres import to_list
+from btb.server.agents.helpers.vector_db import VectorBackend, VectorDB
+
+
+def read_jsonl(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(name, search, queries, k):
+    hits_at_1 = hits_at_k = 0
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        ids = search(query["query"], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits_at_1 += bool(ids) and ids[0] == query["expected_id"]
+        hits_at_k += query["expected_id"] in ids[:k]
+    n = len(queries)
+    return {
+        "strategy": name,
+        "hit@1": hits_at_1 / n,
+        f"hit@{k}": hits_at_k / n,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate vector, lexical and hybrid tool retrieval")
+    parser.add_argument("--catalog", required=True)
+    parser.add_argument("--queries", required=True)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--pool", type=int, default=10, help="Candidates taken from each ranking before fusion")
+    args = parser.parse_args()
+
+    catalog = read_jsonl(args.catalog)
+    queries = read_jsonl(args.queries)
+
+    with tempfile.TemporaryDirectory() as path:
+        vector_db = VectorDB(backend=VectorBackend.NUMPY, path=path)
+        vector_db.add_tools([tool["id"] for tool in catalog], [tool["description"] for tool in catalog])
+        lexical = BM25Index()
+        for tool in catalog:
+            lexical.add(tool["id"], tool_document(tool["description"], to_list(tool.get("arguments"))))
+
+        def vector(query, k):
+            return vector_db.query(query, n_results=k)["ids"][0]
+
+        def bm25(query, k):
+            return [id for id, _ in lexical.query(query, n_results=k)]
+
+        def hybrid(query, k):
+            return hybrid_rank(vector(query, args.pool), bm25(query, args.pool), n_results=k)
+
+        # Warm the embedding cache and model so the first strategy is not penalized
+        vector(queries[0]["query"], 1)
+        results = [evaluate(name, search, queries, args.k) for name, search in
+                   [("vector", vector), ("bm25", bm25), ("hybrid", hybrid)]]
+
+    print(f"{len(catalog)} tools, {len(queries)} queries")
+    for result in results:
+        print("  ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Measure cold-start cost: import time of each entry point and time until a
+freshly started server answers its first request.
+
+Every measurement runs in a new interpreter so nothing is already imported.
+Example:
+
+    python -m btb.benchmarks.startup --repeat 5
+    python -m btb.benchmarks.startup --serve --server-command "python -m btb.server.server" --probe-url http://localhost:5000/metrics
+"""
+import argparse
+import json
+import shlex
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+# Third-party packages whose presence after an import shows what a module drags in
+HEAVY_MODULES = ["anthropic", "openai", "chromadb", "weave", "flask", "psycopg2", "mdextractor", "torch", "sentence_transformers"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(module, repeat):
+    seconds = []
+    loaded = []
+    for _ in range(repeat):
+        script = IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+        out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+        if out.returncode != 0:
+            return {"module": module, "error": out.stderr.strip().splitlines()[-1]}
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        seconds.append(result["seconds"])
+        loaded = result["loaded"]
+    return {
+        "module": module,
+        "median_ms": float(np.median(seconds) * 1000),
+        "max_ms": float(np.max(seconds) * 1000),
+        "heavy_loaded": loaded,
+    }
+
+
+def time_first_request(command, probe_url, timeout):
+    """Start the server and poll probe_url until it answers; returns seconds or None on timeout."""
+    start = time.perf_counter()
+    process = subprocess.Popen(shlex.split(command), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode} before serving")
+            try:
+                with urllib.request.urlopen(probe_url, timeout=1):
+                    return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.05)
+        return None
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to first served request")
+    parser.add_argument("--modules", nargs="+", default=["btb", "btb.client.client", "btb.server.server"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--serve", action="store_true", help="Also start the server and time its first response")
+    parser.add_argument("--server-command", default=f"{sys.executable} -m btb.server.server")
+    parser.add_argument("--probe-url", default="http://localhost:5000/metrics")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON, e.g. to save as a baseline")
+    args = parser.parse_args()
+
+    results = {"imports": [time_import(module, args.repeat) for module in args.modules]}
+    if args.serve:
+        results["first_request_s"] = time_first_request(args.server_command, args.probe_url, args.timeout)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results["imports"]:
+        if "error" in result:
+            print(f"{result['module']:<24} failed: {result['error']}")
+            continue
+        loaded = ", ".join(result["heavy_loaded"]) or "-"
+        print(f"{result['module']:<24} median={result['median_ms']:.1f}ms max={result['max_ms']:.1f}ms loaded: {loaded}")
+    if args.serve:
+        first = results["first_request_s"]
+        print(f"first request: {'timed out' if first is None else f'{first:.2f}s'}")
+
+
+if __name__ == "__main__":
+    main()
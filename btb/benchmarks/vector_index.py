@@ -0,0 +1,92 @@
+"""
+Compare the numpy vector index against the Chroma path.
+
+Uses random unit vectors so only indexing and search are measured, not the
+embedding model. Example:
+
+    python -m btb.benchmarks.vector_index --sizes 1000 10000 100000 1000000 --skip-chroma-above 100000
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from btb.server.agents.helpers.numpy_index import NumpyVectorIndex
+
+
+def random_vectors(rng, n, dim):
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def time_queries(search, queries, k):
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        search(q, k)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def bench_numpy(vectors, ids, queries, k, quantize):
+    with tempfile.TemporaryDirectory() as path:
+        index = NumpyVectorIndex(path=path, quantize=quantize, initial_capacity=len(ids))
+        start = time.perf_counter()
+        index.add(ids, vectors)
+        build = time.perf_counter() - start
+        p50, p99 = time_queries(lambda q, k: index.query(q, n_results=k), queries, k)
+        # Recall of the quantized matrix against exact float32 scores
+        exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+        found = [set(index.query(q, n_results=k)["ids"][0]) for q in queries]
+        recall = np.mean([len(found[i] & {ids[j] for j in exact[i]}) / k for i in range(len(queries))])
+        return build, p50, p99, recall
+
+
+def bench_chroma(vectors, ids, queries, k):
+    import chromadb
+
+    with tempfile.TemporaryDirectory() as path:
+        client = chromadb.PersistentClient(path=path)
+        collection = client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"})
+        batch = client.get_max_batch_size()
+        start = time.perf_counter()
+        for i in range(0, len(ids), batch):
+            collection.add(ids=ids[i:i + batch], embeddings=vectors[i:i + batch].tolist())
+        build = time.perf_counter() - start
+        p50, p99 = time_queries(lambda q, k: collection.query(query_embeddings=[q.tolist()], n_results=k), queries, k)
+        return build, p50, p99, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark numpy vs Chroma vector search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (384 matches Chroma's default model)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--skip-chroma-above", type=int, default=100_000,
+                        help="Skip the Chroma run for larger catalogs, where building the HNSW index takes very long")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'backend':<14}{'tools':>10}{'build s':>10}{'p50 ms':>10}{'p99 ms':>10}{'recall':>8}")
+    for size in args.sizes:
+        vectors = random_vectors(rng, size, args.dim)
+        ids = [str(i) for i in range(size)]
+        queries = random_vectors(rng, args.queries, args.dim)
+        runs = [
+            ("numpy-f32", lambda: bench_numpy(vectors, ids, queries, args.k, quantize=False)),
+            ("numpy-int8", lambda: bench_numpy(vectors, ids, queries, args.k, quantize=True)),
+        ]
+        if size <= args.skip_chroma_above:
+            runs.append(("chroma", lambda: bench_chroma(vectors, ids, queries, args.k)))
+        for name, run in runs:
+            build, p50, p99, recall = run()
+            recall = f"{recall:.3f}" if recall is not None else "-"
+            print(f"{name:<14}{size:>10}{build:>10.2f}{p50:>10.3f}{p99:>10.3f}{recall:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,8 @@
-from .client import ToolAgentClient
-
 __all__ = ["ToolAgentClient"]
+
+
+def __getattr__(name):
+    if name == "ToolAgentClient":
+        from .client import ToolAgentClient
+        return ToolAgentClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
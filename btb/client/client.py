@@ -1,13 +1,75 @@
 import requests
 import os
+import random
 import subprocess
+import time
 from dotenv import load_dotenv
-from typing import List
-import weave
+from typing import Dict, List, Optional
+from .. import tracing
+from .. import metrics
+from .telemetry import get_reporter, output_size
 load_dotenv()
 
-@weave.op
-def run_command(id: str, command: str, implementation: str, env_variables: List[str], dependencies: List[str]):
+SERVER_URL = os.environ.get("BTB_SERVER_URL", "http://localhost:5000")
+# Local copy of the server's wheelhouse that offline installs read from
+WHEELHOUSE = os.environ.get("BTB_CLIENT_WHEELHOUSE", os.path.expanduser("~/.cache/btb/wheels"))
+
+# Pinned requirement sets already installed by this process
+_installed = set()
+
+RUN_SECONDS = metrics.histogram("btb_client_run_seconds", "Tool execution time on the client, dependency install included", ["status"])
+INSTALL_SECONDS = metrics.histogram("btb_client_install_seconds", "Dependency installation time on the client")
+
+def fetch_wheels(wheels: List[str]):
+    # download the wheels this client does not have yet; each file is fetched once
+    os.makedirs(WHEELHOUSE, exist_ok=True)
+    for wheel in wheels:
+        path = os.path.join(WHEELHOUSE, wheel)
+        if os.path.exists(path):
+            continue
+        response = requests.get(f'{SERVER_URL}/api/wheels/{wheel}', timeout=300)
+        response.raise_for_status()
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(response.content)
+        os.replace(temp, path)
+
+def install_dependencies(dependencies: List[str], resolved: Optional[Dict] = None):
+    """
+    resolved is the server's resolved_dependencies: pinned requirements are
+    installed with --no-index from the local wheelhouse, and the declared
+    dependencies from the package index only if that is not possible.
+    """
+    if resolved and resolved.get('requirements'):
+        requirements = tuple(resolved['requirements'])
+        if requirements in _installed:
+            return
+        try:
+            fetch_wheels(resolved['wheels'])
+            subprocess.check_call(["uv", "pip", "install", "--no-index", "--find-links", WHEELHOUSE, *requirements])
+            _installed.add(requirements)
+            return
+        except (requests.RequestException, subprocess.CalledProcessError) as e:
+            print(f"Offline install failed ({e}), installing from the package index")
+    subprocess.check_call(["uv", "pip", "install", *dependencies])
+
+def run_command(id: str, command: str, implementation: str, env_variables: List[str], dependencies: List[str], resolved: Optional[Dict] = None):
+    result = run_tool(id, command, implementation, env_variables, dependencies, resolved)
+    return None if result is None else result[:2]
+
+@tracing.op
+def run_tool(id: str, command: str, implementation: str, env_variables: List[str], dependencies: List[str], resolved: Optional[Dict] = None):
+    """
+    Like run_command, but returns [out, err, seconds] where seconds is the
+    execution time alone, without dependency installation.
+    """
+    start = time.perf_counter()
+    result = _run_command(id, command, implementation, env_variables, dependencies, resolved)
+    status = "missing_env" if result is None else ("error" if result[1] else "ok")
+    RUN_SECONDS.labels(status=status).observe(time.perf_counter() - start)
+    return result
+
+def _run_command(id: str, command: str, implementation: str, env_variables: List[str], dependencies: List[str], resolved: Optional[Dict] = None):
     if env_variables:
         for var in env_variables:
             if os.getenv(var) is None:
@@ -15,8 +77,8 @@ def run_command(id: str, command: str, implementation: str, env_variables: List[
                 return None
 
     if dependencies:
-        # install all dependencies through pip
-        subprocess.check_call(["uv", "pip", "install", *dependencies])
+        with INSTALL_SECONDS.time():
+            install_dependencies(dependencies, resolved)
 
     # Create a temporary file named {id}.py
     temp_file_name = f"{id}.py"
@@ -24,6 +86,7 @@ def run_command(id: str, command: str, implementation: str, env_variables: List[
         f.write(implementation)
     out = None
     err = None
+    start = time.perf_counter()
 
     try:
         # Run the command with environment variables inherited
@@ -43,6 +106,7 @@ def run_command(id: str, command: str, implementation: str, env_variables: List[
         #     print("Output: \n{}\n".format(output))
 
     finally:
+        execution_seconds = time.perf_counter() - start
         # Delete the temporary file
         if os.path.exists(temp_file_name):
             os.remove(temp_file_name)
@@ -59,23 +123,69 @@ def run_command(id: str, command: str, implementation: str, env_variables: List[
         err = decode_bytes(err) if err else None
     return [
         out,
-        err
+        err,
+        execution_seconds
     ]
 
 
-@weave.op
-def request_tool(task: str):
-    response = requests.post('http://localhost:5000/api/genTool', json={'task': task})
+@tracing.op
+def request_tool(task: str, constraints: dict | None = None, priority: str | None = None, max_retries: int = 3):
+    body = {'task': task}
+    if constraints:
+        body['constraints'] = constraints
+    if priority:
+        body['priority'] = priority
+    for attempt in range(max_retries + 1):
+        response = requests.post(f'{SERVER_URL}/api/genTool', json=body)
+        # 429/503 mean the server shed the request before doing any work; wait as told and retry
+        if response.status_code not in (429, 503) or attempt == max_retries:
+            break
+        retry_after = float(response.headers.get('Retry-After', 1))
+        time.sleep(retry_after * (1 + random.random() * 0.2))
     return response.json()
 
 class ToolAgentClient():
-    def __init__(self):
-        pass
+    def __init__(self, transport: str | None = None, grpc_target: str | None = None):
+        """
+        transport is "http" (the JSON API, default) or "grpc", which also skips
+        re-sending implementations this client already has (BTB_TRANSPORT).
+        grpc_target is the server's gRPC host:port (BTB_GRPC_TARGET).
+        """
+        self.transport = transport or os.environ.get("BTB_TRANSPORT", "http")
+        if self.transport not in ("http", "grpc"):
+            raise ValueError(f"Unknown transport {self.transport!r}, expected 'http' or 'grpc'")
+        self.grpc = None
+        if self.transport == "grpc":
+            # only gRPC users need grpcio installed
+            from .grpc_client import GRPC_TARGET, GrpcToolClient
+            self.grpc = GrpcToolClient(grpc_target or GRPC_TARGET)
+
+    def request_tool(self, task: str, constraints: dict | None = None, priority: str | None = None):
+        if self.grpc:
+            return self.grpc.request_tool(task, constraints, priority)
+        return request_tool(task, constraints, priority)
 
-    @weave.op
-    def give_task(self, task: str):
-        tool = request_tool(task)
-        (out, err) = run_command(tool['id'], tool['command'], tool['implementation'], tool['env_variables'], tool['dependencies'])
+    @tracing.op
+    def give_task(self, task: str, constraints: dict | None = None, priority: str | None = None):
+        """
+        constraints restrict which catalog tools may be returned, e.g.
+        {"available_env_variables": ["OPENAI_API_KEY"], "pure": True}.
+        See btb/server/agents/helpers/filters.py for the supported keys.
+        priority ("high", "normal" or "low") orders queued requests on a busy server.
+        """
+        tool = self.request_tool(task, constraints, priority)
+        result = run_tool(tool['id'], tool['command'], tool['implementation'], tool['env_variables'], tool['dependencies'], tool.get('resolved_dependencies'))
+        if result is None:
+            # missing env variables: the tool never ran, so there is nothing to report
+            return {
+                'status': 'ERROR',
+                'result': 'Missing required environment variables'
+            }
+        (out, err, execution_seconds) = result
+        reporter = get_reporter(SERVER_URL)
+        if reporter:
+            # lets the server demote tools that fail or run slowly; install time is not the tool's
+            reporter.report(tool['id'], not err, execution_seconds, output_size(out), tool.get('request_id'))
         if err:
             return {
                 'status': 'ERROR',
@@ -0,0 +1,124 @@
+"""
+gRPC transport for ToolAgentClient, see btb/server/grpc_service.py.
+
+Implementations received are cached by hash and listed in known_hashes on
+later requests, so a tool the client has already fetched comes back without
+its code. Like request_tool, requests shed by admission control
+(RESOURCE_EXHAUSTED, UNAVAILABLE) are retried after the server's retry-after.
+
+    BTB_GRPC_TARGET  host:port of the server's gRPC port (default: localhost:50051)
+"""
+from collections import OrderedDict
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+import grpc
+
+from .. import rpc
+
+GRPC_TARGET = os.environ.get("BTB_GRPC_TARGET", "localhost:50051")
+# Implementations kept for known_hashes, least recently used dropped first
+MAX_CACHED_IMPLEMENTATIONS = 256
+
+RETRYABLE = (grpc.StatusCode.RESOURCE_EXHAUSTED, grpc.StatusCode.UNAVAILABLE)
+
+
+class ToolRequestError(RuntimeError):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class GrpcToolClient:
+    def __init__(self, target: str = GRPC_TARGET, caller: Optional[str] = None, max_retries: int = 3):
+        self.channel = grpc.insecure_channel(target)
+        self.caller = caller or ""
+        self.max_retries = max_retries
+        self.implementations: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.stubs = {}
+        for method, (request_type, response_type, streaming) in rpc.METHODS.items():
+            factory = self.channel.unary_stream if streaming else self.channel.unary_unary
+            self.stubs[method] = factory(
+                rpc.method_path(method),
+                request_serializer=rpc.message_class(request_type).SerializeToString,
+                response_deserializer=rpc.message_class(response_type).FromString,
+            )
+
+    def close(self):
+        self.channel.close()
+
+    def _known_hashes(self) -> List[str]:
+        with self.lock:
+            return list(self.implementations)
+
+    def _remember(self, descriptor) -> Dict:
+        with self.lock:
+            if not descriptor.implementation_omitted and descriptor.implementation_hash:
+                self.implementations[descriptor.implementation_hash] = descriptor.implementation
+            if descriptor.implementation_hash in self.implementations:
+                self.implementations.move_to_end(descriptor.implementation_hash)
+            while len(self.implementations) > MAX_CACHED_IMPLEMENTATIONS:
+                self.implementations.popitem(last=False)
+            return dict(self.implementations)
+
+    def _to_dict(self, response) -> Dict:
+        return rpc.response_to_dict(response, self._remember(response.tool))
+
+    def _request(self, task: str, constraints: dict | None, priority: str | None):
+        return rpc.ToolRequest(
+            task=task,
+            constraints_json=json.dumps(constraints) if constraints else "",
+            priority=priority or "",
+            caller=self.caller,
+            known_hashes=self._known_hashes(),
+        )
+
+    def _call(self, method: str, request):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.stubs[method](request)
+            except grpc.RpcError as e:
+                if e.code() not in RETRYABLE or attempt == self.max_retries:
+                    raise
+                retry_after = float(dict(e.trailing_metadata() or ()).get("retry-after", 1))
+                time.sleep(retry_after * (1 + random.random() * 0.2))
+
+    def request_tool(self, task: str, constraints: dict | None = None, priority: str | None = None) -> Dict:
+        """The /api/genTool response for task, as a dict of the same shape."""
+        return self._to_dict(self._call("GenerateTool", self._request(task, constraints, priority)))
+
+    def request_tools(self, tasks: List[str], constraints: dict | None = None, priority: str | None = None) -> List[Dict | ToolRequestError]:
+        """
+        Several tasks in one call, handled concurrently by the server. Items are
+        in the order of tasks; a failed item is a ToolRequestError instead of a tool.
+        """
+        batch = rpc.BatchToolRequest(requests=[self._request(task, constraints, priority) for task in tasks])
+        return [
+            self._to_dict(result.response) if result.status == 200 else ToolRequestError(result.status, result.error)
+            for result in self._call("GenerateTools", batch).results
+        ]
+
+    def stream_tool(self, task: str, constraints: dict | None = None, priority: str | None = None) -> Iterator[Dict]:
+        """
+        Yields {"stage", "seconds"} as each server stage finishes, then
+        {"stage": "done", "tool": ...} with the tool.
+
+        Raises:
+            ToolRequestError: if the request failed or was not admitted
+        """
+        for event in self.stubs["StreamTool"](self._request(task, constraints, priority)):
+            if not event.HasField("result"):
+                yield {"stage": event.stage, "seconds": event.seconds}
+                continue
+            if event.result.status != 200:
+                raise ToolRequestError(event.result.status, event.result.error)
+            yield {"stage": event.stage, "tool": self._to_dict(event.result.response)}
+
+    def get_tool(self, id: str) -> Dict:
+        descriptor = self._call("GetTool", rpc.GetToolRequest(id=id, known_hashes=self._known_hashes()))
+        return rpc.descriptor_to_dict(descriptor, self._remember(descriptor))
@@ -0,0 +1,103 @@
+"""
+Asynchronous run reports from the client to the server.
+
+Every tool run is recorded with report() and sent in batches to
+/api/telemetry by a background thread, so reporting never delays the caller.
+Delivery is best effort: a failed batch is retried once with the next flush,
+and if the server stays unreachable the oldest reports are dropped once
+MAX_PENDING are waiting. Pending reports are flushed at exit.
+
+    BTB_TELEMETRY           0 disables reporting (default: 1)
+    BTB_TELEMETRY_INTERVAL  seconds between flushes (default: 5)
+"""
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import requests
+
+# Reports per request, and the most kept while the server is unreachable
+BATCH_SIZE = 100
+MAX_PENDING = 10_000
+
+
+class TelemetryReporter:
+    def __init__(self, url: str, interval: float = 5.0, timeout: float = 5.0):
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        # (report, already retried), oldest first; appending to a full deque drops the oldest
+        self.pending: deque = deque(maxlen=MAX_PENDING)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def report(self, tool_id: str, success: bool, runtime_seconds: float, output_bytes: int, request_id: Optional[str] = None):
+        with self.lock:
+            self.pending.append(({
+                "tool_id": tool_id,
+                "success": success,
+                "runtime_seconds": runtime_seconds,
+                "output_bytes": output_bytes,
+                "request_id": request_id,
+                "reported_at": time.time(),
+            }, False))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="btb-telemetry", daemon=True)
+                self.thread.start()
+            if len(self.pending) >= BATCH_SIZE:
+                self.wakeup.set()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        while True:
+            with self.lock:
+                batch = [self.pending.popleft() for _ in range(min(BATCH_SIZE, len(self.pending)))]
+            if not batch:
+                return
+            try:
+                response = requests.post(self.url, json={"reports": [report for report, _ in batch]}, timeout=self.timeout)
+                # 4xx means the batch itself is bad; resending it would not help
+                if response.status_code >= 500:
+                    raise requests.HTTPError(response.status_code)
+            except requests.RequestException:
+                with self.lock:
+                    # Back in front, in order, for the next flush; reports that already
+                    # failed twice are dropped, and so are the oldest if there is no room
+                    retry = [(report, True) for report, retried in batch if not retried]
+                    room = MAX_PENDING - len(self.pending)
+                    if len(retry) > room:
+                        retry = retry[len(retry) - room:]
+                    self.pending.extendleft(reversed(retry))
+                return
+
+
+_reporter: Optional[TelemetryReporter] = None
+_reporter_lock = threading.Lock()
+
+
+def get_reporter(server_url: str) -> Optional[TelemetryReporter]:
+    # None when BTB_TELEMETRY=0
+    global _reporter
+    if os.environ.get("BTB_TELEMETRY", "1") == "0":
+        return None
+    with _reporter_lock:
+        if _reporter is None:
+            _reporter = TelemetryReporter(
+                f"{server_url}/api/telemetry",
+                interval=float(os.environ.get("BTB_TELEMETRY_INTERVAL", "5")),
+            )
+            atexit.register(_reporter.flush)
+        return _reporter
+
+
+def output_size(output) -> int:
+    return len(str(output).encode("utf-8")) if output is not None else 0
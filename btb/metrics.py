@@ -0,0 +1,379 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Metrics are created once at import time of the module that owns them and
+updated on the hot path, so updates are a dict lookup plus a locked add:
+
+    REQUEST_SECONDS = histogram("btb_request_seconds", "Tool request latency", ["status"])
+    REQUEST_SECONDS.labels(status="ok").observe(1.2)
+
+    with DB_SECONDS.labels(store="postgres", op="get_tool").time():
+        ...
+
+Pre-forked workers (see server/prefork.py) each have their own registry, so
+with BTB_METRICS_DIR set every process also writes a snapshot of its registry
+to <dir>/<pid>.json, and /metrics renders the sum over all of them: any worker
+answers a scrape with the totals of the whole server. When a worker exits the
+master folds its counters and histograms into <dir>/retired.json so they do
+not go backwards; its gauges are dropped. Snapshots of live workers are at most
+SNAPSHOT_INTERVAL seconds old, except the scraped worker's own.
+"""
+from bisect import bisect_left
+import functools
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+SNAPSHOT_INTERVAL = 5.0
+RETIRED = "retired.json"
+
+# Seconds; spans fast DB calls up to multi-minute generations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _CounterChild:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self.lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        with self.lock:
+            self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count", "lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.children: Dict[Tuple[str, ...], object] = {}
+        self.lock = threading.Lock()
+        if not self.label_names:
+            self._unlabelled = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **labels):
+        key = tuple(str(v) for v in values) if values else tuple(str(labels[name]) for name in self.label_names)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def _child_state(self, child):
+        return child.value
+
+    def _merge_child(self, child, state):
+        with child.lock:
+            child.value += state
+
+    def snapshot(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "documentation": self.documentation,
+            "label_names": list(self.label_names),
+            "children": [[list(key), self._child_state(child)] for key, child in list(self.children.items())],
+        }
+
+    def merge(self, snapshot: Dict):
+        """Add the values of another process's snapshot of this metric."""
+        for key, state in snapshot["children"]:
+            self._merge_child(self.labels(*key), state)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled.inc(amount)
+
+    def _samples(self):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(child.value)}"
+                for key, child in list(self.children.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._unlabelled.set(value)
+
+    def dec(self, amount: float = 1.0):
+        self._unlabelled.dec(amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, label_names)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def _child_state(self, child):
+        with child.lock:
+            return {"counts": list(child.counts), "sum": child.sum, "count": child.count}
+
+    def _merge_child(self, child, state):
+        with child.lock:
+            child.counts = [a + b for a, b in zip(child.counts, state["counts"])]
+            child.sum += state["sum"]
+            child.count += state["count"]
+
+    def snapshot(self) -> Dict:
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.bounds)
+        return snapshot
+
+    def observe(self, value: float):
+        self._unlabelled.observe(value)
+
+    def time(self) -> _Timer:
+        return self._unlabelled.time()
+
+    def _samples(self):
+        lines = []
+        for key, child in list(self.children.items()):
+            with child.lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.bounds + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', _format_value(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                # Re-importing a module must not duplicate or reset its metrics
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} already registered as a {existing.kind}")
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def merge(self, snapshot: Dict[str, Dict], gauges: bool = True):
+        for name, state in snapshot.items():
+            if state["kind"] == "gauge" and not gauges:
+                continue
+            kind = _KINDS[state["kind"]]
+            if kind is Histogram:
+                metric = Histogram(name, state["documentation"], state["label_names"], state["buckets"])
+            else:
+                metric = kind(name, state["documentation"], state["label_names"])
+            self.register(metric).merge(state)
+
+
+_KINDS = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, documentation: str, label_names: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, label_names))
+
+
+def gauge(name: str, documentation: str, label_names: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, label_names))
+
+
+def histogram(name: str, documentation: str, label_names: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, label_names, buckets))
+
+
+def _read_snapshot(path: str) -> Dict[str, Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_snapshot(path: str, snapshot: Dict[str, Dict]):
+    # Write and rename, so readers never see a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def _directory_lock(directory: str, exclusive: bool):
+    """Shared for readers, exclusive while the master retires a worker."""
+    import fcntl
+
+    f = open(os.path.join(directory, "lock"), "a")
+    fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    return f
+
+
+def write_snapshot(directory: str):
+    _write_snapshot(os.path.join(directory, f"{os.getpid()}.json"), REGISTRY.snapshot())
+
+
+def start_snapshots(directory: str, interval: float = SNAPSHOT_INTERVAL) -> threading.Event:
+    """Write this process's snapshot every interval seconds until the returned event is set."""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            write_snapshot(directory)
+
+    write_snapshot(directory)
+    threading.Thread(target=run, name="btb-metrics-snapshots", daemon=True).start()
+    return stop
+
+
+def retire(directory: str, pid: int):
+    """Fold an exited process's counters and histograms into the retired totals."""
+    path = os.path.join(directory, f"{pid}.json")
+    with _directory_lock(directory, exclusive=True):
+        snapshot = _read_snapshot(path)
+        if snapshot:
+            retired = Registry()
+            retired.merge(_read_snapshot(os.path.join(directory, RETIRED)))
+            retired.merge(snapshot, gauges=False)
+            _write_snapshot(os.path.join(directory, RETIRED), retired.snapshot())
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def render() -> str:
+    """The exposition for /metrics: summed over every process when BTB_METRICS_DIR is set."""
+    directory = os.environ.get("BTB_METRICS_DIR")
+    if not directory:
+        return REGISTRY.render()
+    write_snapshot(directory)
+    total = Registry()
+    with _directory_lock(directory, exclusive=False):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".json"):
+                total.merge(_read_snapshot(os.path.join(directory, name)))
+    return total.render()
+
+
+def timed(metric: Histogram, **labels):
+    """Decorator observing the wrapped function's duration in metric."""
+    def decorator(fn):
+        child = metric.labels(**labels) if labels else metric._unlabelled
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,216 @@
+"""
+Protobuf messages and method table of the gRPC ToolAgent service.
+
+The schema is built at import time with descriptor_pb2 instead of generated
+_pb2 modules, so there is no protoc step; it is equivalent to:
+
+    package btb.v1;
+
+    service ToolAgent {
+      rpc GenerateTool (ToolRequest) returns (ToolResponse);
+      rpc GenerateTools (BatchToolRequest) returns (BatchToolResponse);
+      rpc StreamTool (ToolRequest) returns (stream ProgressEvent);
+      rpc GetTool (GetToolRequest) returns (ToolDescriptor);
+    }
+
+Requests carry known_hashes, the implementation hashes the client already
+holds; a ToolDescriptor whose hash is among them is sent without its
+implementation and with implementation_omitted set.
+"""
+from typing import Dict, Iterable, Optional
+
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+PACKAGE = "btb.v1"
+SERVICE = f"{PACKAGE}.ToolAgent"
+
+_F = descriptor_pb2.FieldDescriptorProto
+_STRING, _BOOL, _INT32, _INT64, _DOUBLE, _MESSAGE = _F.TYPE_STRING, _F.TYPE_BOOL, _F.TYPE_INT32, _F.TYPE_INT64, _F.TYPE_DOUBLE, _F.TYPE_MESSAGE
+_OPTIONAL, _REPEATED = _F.LABEL_OPTIONAL, _F.LABEL_REPEATED
+
+# message name -> [(field, type, repeated, message type)], numbered in order
+MESSAGES = {
+    "ToolDescriptor": [
+        ("id", _STRING, False, None),
+        ("description", _STRING, False, None),
+        ("arguments", _STRING, True, None),
+        ("argument_types", _STRING, True, None),
+        ("env_variables", _STRING, True, None),
+        ("dependencies", _STRING, True, None),
+        ("language", _STRING, False, None),
+        ("implementation_hash", _STRING, False, None),
+        ("implementation", _STRING, False, None),
+        ("implementation_omitted", _BOOL, False, None),
+        ("validation", _STRING, False, None),
+        ("requirements", _STRING, True, None),
+        ("wheels", _STRING, True, None),
+        ("usage_count", _INT64, False, None),
+        ("success_count", _INT64, False, None),
+        ("failure_count", _INT64, False, None),
+    ],
+    "ToolRequest": [
+        ("task", _STRING, False, None),
+        # same keys as the JSON API's constraints, see helpers/filters.py
+        ("constraints_json", _STRING, False, None),
+        ("priority", _STRING, False, None),
+        ("caller", _STRING, False, None),
+        ("known_hashes", _STRING, True, None),
+    ],
+    "StageTime": [
+        ("stage", _STRING, False, None),
+        ("seconds", _DOUBLE, False, None),
+    ],
+    "ToolResponse": [
+        ("tool", _MESSAGE, False, "ToolDescriptor"),
+        ("command", _STRING, False, None),
+        ("request_id", _STRING, False, None),
+        ("reused", _BOOL, False, None),
+        ("stage_seconds", _MESSAGE, True, "StageTime"),
+    ],
+    "BatchToolRequest": [
+        ("requests", _MESSAGE, True, "ToolRequest"),
+    ],
+    "ToolResult": [
+        ("response", _MESSAGE, False, "ToolResponse"),
+        # HTTP-style status of this item (200 on success) and the error otherwise
+        ("status", _INT32, False, None),
+        ("error", _STRING, False, None),
+    ],
+    "BatchToolResponse": [
+        ("results", _MESSAGE, True, "ToolResult"),
+    ],
+    "ProgressEvent": [
+        ("stage", _STRING, False, None),
+        ("seconds", _DOUBLE, False, None),
+        # set on the last event only
+        ("result", _MESSAGE, False, "ToolResult"),
+    ],
+    "GetToolRequest": [
+        ("id", _STRING, False, None),
+        ("known_hashes", _STRING, True, None),
+    ],
+}
+
+# method -> (request, response, server streaming)
+METHODS = {
+    "GenerateTool": ("ToolRequest", "ToolResponse", False),
+    "GenerateTools": ("BatchToolRequest", "BatchToolResponse", False),
+    "StreamTool": ("ToolRequest", "ProgressEvent", True),
+    "GetTool": ("GetToolRequest", "ToolDescriptor", False),
+}
+
+
+def _build():
+    file = descriptor_pb2.FileDescriptorProto(name="btb/v1/tool_agent.proto", package=PACKAGE, syntax="proto3")
+    for name, fields in MESSAGES.items():
+        message = file.message_type.add(name=name)
+        for number, (field, type, repeated, type_name) in enumerate(fields, start=1):
+            added = message.field.add(name=field, number=number, type=type, label=_REPEATED if repeated else _OPTIONAL)
+            if type_name:
+                added.type_name = f".{PACKAGE}.{type_name}"
+    service = file.service.add(name="ToolAgent")
+    for name, (request, response, streaming) in METHODS.items():
+        service.method.add(
+            name=name,
+            input_type=f".{PACKAGE}.{request}",
+            output_type=f".{PACKAGE}.{response}",
+            server_streaming=streaming,
+        )
+    # A private pool, so importing this twice or next to other schemas cannot conflict
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file)
+    return {name: message_factory.GetMessageClass(pool.FindMessageTypeByName(f"{PACKAGE}.{name}")) for name in MESSAGES}
+
+
+_classes = _build()
+ToolDescriptor = _classes["ToolDescriptor"]
+ToolRequest = _classes["ToolRequest"]
+StageTime = _classes["StageTime"]
+ToolResponse = _classes["ToolResponse"]
+BatchToolRequest = _classes["BatchToolRequest"]
+ToolResult = _classes["ToolResult"]
+BatchToolResponse = _classes["BatchToolResponse"]
+ProgressEvent = _classes["ProgressEvent"]
+GetToolRequest = _classes["GetToolRequest"]
+
+
+def method_path(method: str) -> str:
+    return f"/{SERVICE}/{method}"
+
+
+def message_class(name: str):
+    return _classes[name]
+
+
+def tool_descriptor(tool: Dict, known_hashes: Iterable[str] = ()) -> "ToolDescriptor":
+    """A tool dict (get_tool or API response shape) as a ToolDescriptor."""
+    resolved = tool.get("resolved_dependencies") or {}
+    omitted = bool(tool.get("implementation_hash")) and tool["implementation_hash"] in set(known_hashes)
+    return ToolDescriptor(
+        id=tool["id"],
+        description=tool.get("description") or "",
+        arguments=tool.get("arguments") or [],
+        argument_types=tool.get("argument_types") or [],
+        env_variables=tool.get("env_variables") or [],
+        dependencies=tool.get("dependencies") or [],
+        language=tool.get("language") or "python",
+        implementation_hash=tool.get("implementation_hash") or "",
+        implementation="" if omitted else tool.get("implementation") or "",
+        implementation_omitted=omitted,
+        validation=tool.get("validation") or "",
+        requirements=resolved.get("requirements") or [],
+        wheels=resolved.get("wheels") or [],
+        usage_count=tool.get("usage_count") or 0,
+        success_count=tool.get("success_count") or 0,
+        failure_count=tool.get("failure_count") or 0,
+    )
+
+
+def descriptor_to_dict(descriptor: "ToolDescriptor", implementations: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Back to the JSON API's tool shape. An omitted implementation is filled in
+    from implementations (hash -> code), the client's cache.
+    """
+    implementation = descriptor.implementation
+    if descriptor.implementation_omitted:
+        implementation = (implementations or {}).get(descriptor.implementation_hash)
+        if implementation is None:
+            raise KeyError(f"Implementation {descriptor.implementation_hash} was omitted but is not cached")
+    return {
+        "id": descriptor.id,
+        "description": descriptor.description,
+        "arguments": list(descriptor.arguments),
+        "argument_types": list(descriptor.argument_types),
+        "env_variables": list(descriptor.env_variables),
+        "dependencies": list(descriptor.dependencies),
+        "language": descriptor.language,
+        "implementation_hash": descriptor.implementation_hash,
+        "implementation": implementation,
+        "validation": descriptor.validation or None,
+        "resolved_dependencies": {"requirements": list(descriptor.requirements), "wheels": list(descriptor.wheels)} if descriptor.requirements else None,
+        "usage_count": descriptor.usage_count,
+        "success_count": descriptor.success_count,
+        "failure_count": descriptor.failure_count,
+    }
+
+
+def tool_response(result: Dict, known_hashes: Iterable[str] = ()) -> "ToolResponse":
+    """A handle_tool_request result as a ToolResponse."""
+    return ToolResponse(
+        tool=tool_descriptor(result, known_hashes),
+        command=result.get("command") or "",
+        request_id=result.get("request_id") or "",
+        reused=bool(result.get("reused")),
+        stage_seconds=[StageTime(stage=stage, seconds=seconds) for stage, seconds in (result.get("stage_seconds") or {}).items()],
+    )
+
+
+def response_to_dict(response: "ToolResponse", implementations: Optional[Dict[str, str]] = None) -> Dict:
+    """Back to the JSON API's /api/genTool response shape."""
+    return {
+        **descriptor_to_dict(response.tool, implementations),
+        "command": response.command,
+        "request_id": response.request_id,
+        "reused": response.reused,
+        "stage_seconds": {item.stage: item.seconds for item in response.stage_seconds},
+    }
@@ -1,3 +1,9 @@
-from .server import ToolAgentServer
-
 __all__ = ["ToolAgentServer"]
+
+
+def __getattr__(name):
+    # Deferred so importing a submodule (e.g. btb.server.dag) does not load every agent
+    if name == "ToolAgentServer":
+        from .server import ToolAgentServer
+        return ToolAgentServer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
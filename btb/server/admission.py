@@ -0,0 +1,204 @@
+from collections import OrderedDict, deque
+import math
+import os
+import threading
+import time
+from typing import Deque, Dict, Optional
+
+from .agents.helpers.scheduler import Priority, worker_share
+from .. import metrics
+
+ADMISSION_QUEUE_DEPTH = metrics.gauge("btb_admission_queue_depth", "Tool requests waiting for admission", ["priority"])
+ADMISSION_QUEUE_SECONDS = metrics.histogram("btb_admission_queue_seconds", "Time tool requests waited for admission", ["priority", "outcome"])
+ADMISSION_ACTIVE = metrics.gauge("btb_admission_active", "Admitted tool requests currently running")
+ADMISSION_REJECTED = metrics.counter("btb_admission_rejected_total", "Tool requests rejected by admission control", ["reason"])
+
+
+class AdmissionRejected(Exception):
+    """
+    The request was not admitted. status is the HTTP status to answer with (429
+    when the caller is over its own share, 503 when the server is saturated)
+    and retry_after the suggested wait in seconds.
+    """
+
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("caller", "priority", "enqueued", "granted")
+
+    def __init__(self, caller: str, priority: Priority):
+        self.caller = caller
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+
+class AdmissionController:
+    """
+    Bounded admission queue in front of handle_tool_request.
+
+    At most max_concurrent requests run at once. Others wait in a queue per
+    priority; within a priority callers are served round-robin, so one client
+    sending a burst cannot starve the rest. A request is rejected immediately
+    when the queue (or the caller's share of it) is full or when its expected
+    wait already exceeds queue_timeout, and rejected after waiting queue_timeout
+    without being admitted.
+
+    The expected wait is the limit that normally applies: it follows the
+    measured service time, so slow requests shorten the queue. max_queue is the
+    backstop for fast ones. The defaults agree at the initial service time
+    estimate (max_queue = max_concurrent * queue_timeout / initial_service_time),
+    so max_queue takes over once requests average less than that estimate.
+
+    Each process has its own controller. from_env reads the limits as totals for
+    the server and gives each pre-forked worker an equal share (the listening
+    socket spreads requests about evenly across workers).
+    """
+
+    def __init__(self,
+                 max_concurrent: int = 8,
+                 max_queue: int = 24,
+                 max_queue_per_caller: int = 16,
+                 queue_timeout: float = 30.0,
+                 initial_service_time: float = 10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_caller = max_queue_per_caller
+        self.queue_timeout = queue_timeout
+        self.condition = threading.Condition()
+        self.active = 0
+        # priority -> caller -> waiting tickets; OrderedDict order is the round-robin order
+        self.queues: Dict[Priority, "OrderedDict[str, Deque[_Ticket]]"] = {priority: OrderedDict() for priority in Priority}
+        self.queued = 0
+        self.queued_by_caller: Dict[str, int] = {}
+        # Moving average of how long an admitted request runs, for wait estimates
+        self.service_time = initial_service_time
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_concurrent=math.floor(worker_share(int(os.environ.get("BTB_MAX_CONCURRENT_REQUESTS", "8")))),
+            max_queue=math.floor(worker_share(int(os.environ.get("BTB_MAX_QUEUED_REQUESTS", "24")))),
+            max_queue_per_caller=math.floor(worker_share(int(os.environ.get("BTB_MAX_QUEUED_PER_CALLER", "16")))),
+            queue_timeout=float(os.environ.get("BTB_QUEUE_TIMEOUT", "30")),
+        )
+
+    def _expected_wait(self, ahead: int) -> float:
+        # Requests ahead drain max_concurrent at a time, one service time per round
+        return math.ceil((ahead + 1) / self.max_concurrent) * self.service_time
+
+    def _ahead_of(self, priority: Priority) -> int:
+        return sum(len(tickets) for p in Priority if p <= priority for tickets in self.queues[p].values())
+
+    def _reject(self, status: int, reason: str, retry_after: float):
+        ADMISSION_REJECTED.labels(reason=reason).inc()
+        raise AdmissionRejected(status, reason, max(1.0, retry_after))
+
+    def _enqueue(self, ticket: _Ticket):
+        self.queues[ticket.priority].setdefault(ticket.caller, deque()).append(ticket)
+        self.queued += 1
+        self.queued_by_caller[ticket.caller] = self.queued_by_caller.get(ticket.caller, 0) + 1
+        ADMISSION_QUEUE_DEPTH.labels(priority=ticket.priority.name).inc()
+
+    def _dequeue(self, ticket: _Ticket):
+        callers = self.queues[ticket.priority]
+        tickets = callers[ticket.caller]
+        tickets.remove(ticket)
+        if not tickets:
+            del callers[ticket.caller]
+        self.queued -= 1
+        self.queued_by_caller[ticket.caller] -= 1
+        if not self.queued_by_caller[ticket.caller]:
+            del self.queued_by_caller[ticket.caller]
+        ADMISSION_QUEUE_DEPTH.labels(priority=ticket.priority.name).dec()
+
+    def _grant_next(self):
+        # Highest priority first; within it, the caller at the front, who then moves to the back
+        while self.active < self.max_concurrent:
+            for priority in Priority:
+                callers = self.queues[priority]
+                if callers:
+                    caller, tickets = next(iter(callers.items()))
+                    ticket = tickets[0]
+                    self._dequeue(ticket)
+                    if caller in callers:
+                        callers.move_to_end(caller)
+                    ticket.granted = True
+                    self.active += 1
+                    break
+            else:
+                return
+        self.condition.notify_all()
+
+    def acquire(self, caller: str, priority: Priority = Priority.NORMAL) -> float:
+        """
+        Wait for a slot.
+
+        Args:
+            caller: Identity requests are shared fairly between
+            priority: Queue the request waits in
+        Returns:
+            Seconds spent queued
+        Raises:
+            AdmissionRejected: The request should be answered with e.status right away
+        """
+        with self.condition:
+            if self.active < self.max_concurrent and not self.queued:
+                self.active += 1
+                ADMISSION_ACTIVE.inc()
+                ADMISSION_QUEUE_SECONDS.labels(priority=priority.name, outcome="admitted").observe(0.0)
+                return 0.0
+            if self.queued >= self.max_queue:
+                self._reject(503, "queue_full", self._expected_wait(self.queued))
+            if self.queued_by_caller.get(caller, 0) >= self.max_queue_per_caller:
+                self._reject(429, "caller_limit", self._expected_wait(self.queued_by_caller[caller]))
+            expected = self._expected_wait(self._ahead_of(priority))
+            if expected > self.queue_timeout:
+                # Would time out in the queue anyway; fail now instead of holding the connection
+                self._reject(503, "overloaded", expected)
+
+            ticket = _Ticket(caller, priority)
+            self._enqueue(ticket)
+            deadline = ticket.enqueued + self.queue_timeout
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._dequeue(ticket)
+                    waited = time.monotonic() - ticket.enqueued
+                    ADMISSION_QUEUE_SECONDS.labels(priority=priority.name, outcome="timeout").observe(waited)
+                    self._reject(503, "queue_timeout", self._expected_wait(self._ahead_of(priority)))
+                self.condition.wait(remaining)
+            waited = time.monotonic() - ticket.enqueued
+            ADMISSION_ACTIVE.inc()
+            ADMISSION_QUEUE_SECONDS.labels(priority=priority.name, outcome="admitted").observe(waited)
+            return waited
+
+    def release(self, service_time: Optional[float] = None):
+        with self.condition:
+            self.active -= 1
+            ADMISSION_ACTIVE.dec()
+            if service_time is not None:
+                self.service_time = 0.8 * self.service_time + 0.2 * service_time
+            self._grant_next()
+
+    def status(self) -> Dict:
+        with self.condition:
+            return {
+                "active": self.active,
+                "max_concurrent": self.max_concurrent,
+                "queued": {priority.name: sum(len(t) for t in self.queues[priority].values()) for priority in Priority},
+                "expected_wait_s": self._expected_wait(self.queued) if self.queued or self.active >= self.max_concurrent else 0.0,
+            }
+
+
+def parse_priority(value: Optional[str]) -> Priority:
+    # "high" / "normal" / "low", case-insensitive; anything else is NORMAL
+    try:
+        return Priority[value.strip().upper()] if value else Priority.NORMAL
+    except KeyError:
+        return Priority.NORMAL
@@ -3,4 +3,6 @@ from .formatter import ToolFormatterAgent
 from .invoker import ToolInvocationAgent
 from .matcher import ToolMatcherAgent
 from .summary import ToolSummaryAgent
-__all__ = ["ToolGeneratorAgent", "ToolFormatterAgent", "ToolInvocationAgent", "ToolMatcherAgent", "ToolSummaryAgent"]
+from .debugger import ToolDebuggerAgent
+from .requirement_resolver import RequirementResolverAgent
+__all__ = ["ToolGeneratorAgent", "ToolFormatterAgent", "ToolInvocationAgent", "ToolMatcherAgent", "ToolSummaryAgent", "ToolDebuggerAgent", "RequirementResolverAgent"]
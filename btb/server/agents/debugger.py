@@ -1,47 +1,50 @@
-from anthropic import Anthropic
-from anthropic.types.content_block import ContentBlock
-import weave
+from ... import tracing
 import dotenv
-from mdextractor import extract_md_blocks
-from typing import Dict, Optional, List
-from enum import Enum
+from .helpers.artifacts import load_artifact, save_artifact
 from .helpers.marker import Marker, parse_marked_blocks
-from .helpers.backend import BackendType, AgentBackend
+from .helpers.backend import BackendType
+from .helpers.routing import create_backend
+from .helpers.scheduler import Priority
 
 dotenv.load_dotenv()
 # Take in an exception, implementation code, and invocation command
-# Return an explanation of the issue and the requirments to fix it
+# Return the implementation with the issue fixed
 
-class ToolFormatterAgent:
-    def __init__(self, backend: BackendType = BackendType.ANTHROPIC):
-        self.system_prompt = """You are a specialized code generation assistant focused on debuggingtool implementations for AI agents. 
+class ToolDebuggerAgent:
+    def __init__(self, backend: BackendType | None = None, model: str | None = None):
+        self.system_prompt = """You are a specialized code generation assistant focused on debugging tool implementations for AI agents. 
 Your primary role is to:
-1. Take in code blocks from a previous response, an exception, and an invocation command
-2. Return an explanation of the issue and the requirments to fix it
+1. Take in a tool implementation, the command line invocation that was run, and the error it produced
+2. Find the cause of the error and fix it in the implementation
+3. Keep the tool's arguments, command line interface and output format unchanged
+4. Never take API keys or other sensitive information as arguments, always load them from environment variables
+5. Always include the full fixed implementation code in your response
 
 When generating tool code, always return response in the following format:
 # START_IMPLEMENTATION
 Code Block
 # END_IMPLEMENTATION
 """
-        self.backend = AgentBackend(backend, self.system_prompt)
+        self.backend = create_backend("debugger", self.system_prompt, Priority.LOW, backend, model)
 
-    @weave.op
-    def generate_main_function(self, code_implementation: str, load_file_name: str | None = None, save_file_name: str | None = None) -> str:
+    @tracing.op
+    def fix_implementation(self, code_implementation: str, command: str, error: str, load_file_name: str | None = None, save_file_name: str | None = None) -> str:
         if load_file_name:
             try:
-                with open(load_file_name, "r") as f:
-                    return f.read()
+                return load_artifact(load_file_name)
             except Exception as e:
                 return f"Failed to load file: {str(e)}"
 
-        try:
-            with_main_fn = self.backend.generate(code_implementation)
-        except Exception as e:
-            return f"Failed to generate main function: {str(e)}"
+        prompt = '\n'.join([
+            f"COMMAND: {command}",
+            f"ERROR: {error}",
+            "# START_IMPLEMENTATION",
+            code_implementation,
+            "# END_IMPLEMENTATION",
+        ])
+        fixed = self.backend.generate(prompt)
 
-        implementation = parse_marked_blocks(Marker.IMPLEMENTATION, with_main_fn)
+        implementation = parse_marked_blocks(Marker.IMPLEMENTATION, fixed)
         if save_file_name:
-            with open(save_file_name, "w") as f:
-                f.write(implementation)
+            save_artifact(save_file_name, implementation)
         return implementation
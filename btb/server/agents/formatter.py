@@ -1,19 +1,15 @@
-from anthropic import Anthropic
-import os
-from anthropic.types.content_block import ContentBlock
-import weave
+from ... import tracing
 import dotenv
-import re
-from mdextractor import extract_md_blocks
-from typing import Dict, Optional, List
-from enum import Enum
+from .helpers.artifacts import load_artifact, save_artifact
 from .helpers.marker import Marker, parse_marked_blocks
-from .helpers.backend import BackendType, AgentBackend
+from .helpers.backend import BackendType
+from .helpers.routing import create_backend
+from .helpers.scheduler import Priority
 
 dotenv.load_dotenv()
 
 class ToolFormatterAgent:
-    def __init__(self, backend: BackendType = BackendType.ANTHROPIC):
+    def __init__(self, backend: BackendType | None = None, model: str | None = None):
         self.system_prompt = """You are a specialized code generation assistant focused on creating tool implementations for AI agents. 
 Your primary role is to:
 1. Take in code blocks from a previous response
@@ -30,24 +26,19 @@ When generating tool code, always return response in the following format:
 Code Block
 # END_IMPLEMENTATION
 """
-        self.backend = AgentBackend(backend, self.system_prompt)
+        self.backend = create_backend("formatter", self.system_prompt, Priority.LOW, backend, model)
 
-    @weave.op
+    @tracing.op
     def generate_main_function(self, code_implementation: str, load_file_name: str | None = None, save_file_name: str | None = None) -> str:
         if load_file_name:
             try:
-                with open(load_file_name, "r") as f:
-                    return f.read()
+                return load_artifact(load_file_name)
             except Exception as e:
                 return f"Failed to load file: {str(e)}"
 
-        try:
-            with_main_fn = self.backend.generate(code_implementation)
-        except Exception as e:
-            return f"Failed to generate main function: {str(e)}"
+        with_main_fn = self.backend.generate(code_implementation)
 
         implementation = parse_marked_blocks(Marker.IMPLEMENTATION, with_main_fn)
         if save_file_name:
-            with open(save_file_name, "w") as f:
-                f.write(implementation)
+            save_artifact(save_file_name, implementation)
         return implementation
@@ -1,20 +1,17 @@
-from anthropic import Anthropic
-import os
-from anthropic.types.content_block import ContentBlock
-import weave
+from ... import tracing
 import dotenv
-import re
-from mdextractor import extract_md_blocks
-from typing import Dict, Optional, List
-from enum import Enum
-
+from typing import Dict
+from .helpers.artifacts import load_artifact, save_artifact
 from .helpers.marker import Marker, parse_marked_blocks
-from .helpers.backend import BackendType, AgentBackend
+from .helpers.backend import BackendType
+from .helpers.routing import create_backend
+from .helpers.cancellation import RequestCancelled
+from .helpers.scheduler import LLMRequestError, Priority
 
 dotenv.load_dotenv()
 
 class ToolGeneratorAgent:
-    def __init__(self, backend: BackendType = BackendType.ANTHROPIC):
+    def __init__(self, backend: BackendType | None = None, model: str | None = None):
         self.system_prompt = """You are a specialized code generation assistant focused on creating tool implementations for AI agents. 
 Your primary role is to:
 1. Generate clean, well-documented tool code
@@ -54,9 +51,9 @@ List of comma separated argument types to pass to the tool
 List of comma separated environment variables to load. If none, write NONE
 # END_ENV_VARIABLES
 """
-        self.backend = AgentBackend(backend, self.system_prompt)
+        self.backend = create_backend("generator", self.system_prompt, Priority.LOW, backend, model)
 
-    @weave.op
+    @tracing.op
     def generate_tool_code(self,
                           tool_description: str,
                           language: str = "python",
@@ -70,6 +67,9 @@ List of comma separated environment variables to load. If none, write NONE
             language: Programming language to use (default: python)
         Returns:
             Dict containing generated code and optionally test code
+        Raises:
+            RequestCancelled: if the request was cancelled while the call was queued or retried
+            LLMRequestError: if the LLM call failed permanently or ran out of retries
         """
         prompt = f"""Please generate {language} code for a tool with the following description:
 {tool_description}
@@ -80,12 +80,11 @@ The code should be production-ready, well-documented, and include error handling
         try:
             text = ""
             if load_file_name:
-                with open(load_file_name, "r") as f:
-                    text = f.read()
+                text = load_artifact(load_file_name)
             else:
                 text = self.backend.generate(prompt)
-                with open(save_file_name, "w") as f:
-                    f.write(text)
+                if save_file_name:
+                    save_artifact(save_file_name, text)
             code_content = {}
             # Extract code blocks from the response
             for marker in Marker:
@@ -100,6 +99,9 @@ The code should be production-ready, well-documented, and include error handling
                 "env_variables": code_content.get(Marker.ENV_VARIABLES.name, "")
             }
 
+        except (RequestCancelled, LLMRequestError):
+            # the caller answers these with 504 and 429, not as a failed generation
+            raise
         except Exception as e:
             return {
                 "success": str(False),
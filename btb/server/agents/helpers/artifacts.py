@@ -0,0 +1,370 @@
+"""
+Append-only log of stage artifacts (raw generations, formatted implementations,
+invocations, ...).
+
+Agents hand artifacts to the log and return immediately; a background thread
+writes them in batches to the current segment file and rotates to a new
+segment once it reaches segment_bytes. Each segment has a sidecar .idx file
+with one line per artifact (kind, tool id, request id, offset, length), so
+artifacts can be looked up by tool id or request id without reading the
+segments. Oldest segments are deleted once the log exceeds max_bytes or
+max_age_days.
+
+Several processes (e.g. pre-forked workers) may share one directory: each
+writes its own segments and readers pick up the others' .idx files on a miss.
+A writer holds an flock on its open segment, and retention skips segments it
+cannot lock, so no process deletes a segment another one is still writing.
+
+Artifacts are addressed by name "<kind>:<tool id>", e.g. "generate:1234", which
+is what the agents' save_file_name / load_file_name arguments take.
+"""
+from contextvars import ContextVar
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Set per request so every artifact written while serving it is indexed under it
+current_request_id: ContextVar[Optional[str]] = ContextVar("btb_request_id", default=None)
+
+
+class ArtifactEntry:
+    __slots__ = ("kind", "tool_id", "request_id", "ts", "segment", "offset", "length")
+
+    def __init__(self, kind: str, tool_id: str, request_id: Optional[str], ts: float, segment: str, offset: int, length: int):
+        self.kind = kind
+        self.tool_id = tool_id
+        self.request_id = request_id
+        self.ts = ts
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ArtifactLog:
+    def __init__(self,
+                 path: str = "artifacts",
+                 segment_bytes: int = 64 * 1024 * 1024,
+                 max_bytes: int = 2 * 1024 * 1024 * 1024,
+                 max_age_days: float = 30.0,
+                 flush_interval: float = 0.5,
+                 max_pending: int = 10_000):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.flush_interval = flush_interval
+        os.makedirs(path, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.by_tool: Dict[str, List[ArtifactEntry]] = {}
+        self.by_request: Dict[str, List[ArtifactEntry]] = {}
+        # Bytes of each .idx file already loaded, so refreshes only read what is new
+        self.index_positions: Dict[str, int] = {}
+        # Artifacts accepted but not yet on disk, readable by name meanwhile
+        self.pending_content: Dict[tuple, str] = {}
+        self.dropped = 0
+
+        self.queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.segment = None
+        self.segment_file = None
+        self.index_file = None
+        self.sequence = 0
+        self.thread = None
+        os.register_at_fork(after_in_child=self._after_fork)
+        self._refresh_index()
+
+    # Writing
+
+    def append(self, kind: str, tool_id: str, content: str, request_id: Optional[str] = None):
+        """Queue an artifact for writing; never blocks the caller."""
+        request_id = request_id or current_request_id.get()
+        record = {"kind": kind, "tool_id": tool_id, "request_id": request_id, "ts": time.time(), "content": content}
+        self._start()
+        with self.lock:
+            self.pending_content[(kind, tool_id)] = content
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.lock:
+                self.pending_content.pop((kind, tool_id), None)
+                self.dropped += 1
+
+    def _start(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="btb-artifact-log", daemon=True)
+                    self.thread.start()
+
+    def _after_fork(self):
+        # A forked child gets its own writer thread and segments; its copies of the
+        # parent's files would keep the parent's segment locked for the child's lifetime
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.pending_content = {}
+        self._close_segment()
+        self.thread = None
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while time.monotonic() < deadline:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"artifact log write failed: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _open_segment(self):
+        self.sequence += 1
+        self.segment = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self.sequence:06d}"
+        # Unbuffered, so closing a copy inherited across fork writes nothing twice
+        self.segment_file = open(os.path.join(self.path, self.segment + ".log"), "ab", buffering=0)
+        self.index_file = open(os.path.join(self.path, self.segment + ".idx"), "ab", buffering=0)
+        # Held until the segment is closed (or this process exits), see _apply_retention
+        fcntl.flock(self.segment_file, fcntl.LOCK_EX)
+
+    def _close_segment(self):
+        if self.segment_file:
+            self.segment_file.close()
+            self.index_file.close()
+        self.segment = self.segment_file = self.index_file = None
+
+    def _write_batch(self, batch: List[Dict]):
+        chunk, size = [], 0
+        if self.segment_file is None:
+            self._rotate()
+        for record in batch:
+            line = (json.dumps(record) + "\n").encode("utf-8")
+            if self.segment_file.tell() + size + len(line) > self.segment_bytes and (chunk or self.segment_file.tell()):
+                self._write_chunk(chunk)
+                chunk, size = [], 0
+                self._rotate()
+            chunk.append((record, line))
+            size += len(line)
+        self._write_chunk(chunk)
+
+    def _rotate(self):
+        self._close_segment()
+        self._open_segment()
+        self._apply_retention()
+
+    def _write_chunk(self, chunk: List[tuple]):
+        if not chunk:
+            return
+        batch = [record for record, _ in chunk]
+        lines = [line for _, line in chunk]
+        entries = []
+        offset = self.segment_file.tell()
+        for record, line in chunk:
+            entries.append(ArtifactEntry(record["kind"], record["tool_id"], record["request_id"], record["ts"], self.segment, offset, len(line)))
+            offset += len(line)
+        # One write and one fsync per batch instead of one file per artifact
+        self.segment_file.write(b"".join(lines))
+        self.segment_file.flush()
+        os.fsync(self.segment_file.fileno())
+        index_lines = b"".join((json.dumps(entry.to_dict()) + "\n").encode("utf-8") for entry in entries)
+
+        # Under the lock so a concurrent _refresh_index never loads these lines a second time
+        with self.lock:
+            self.index_file.write(index_lines)
+            self.index_file.flush()
+            index_path = os.path.join(self.path, self.segment + ".idx")
+            self.index_positions[index_path] = self.index_positions.get(index_path, 0) + len(index_lines)
+            for entry, record in zip(entries, batch):
+                self._add_entry(entry)
+                if self.pending_content.get((record["kind"], record["tool_id"])) is record["content"]:
+                    del self.pending_content[(record["kind"], record["tool_id"])]
+
+    def _segments(self) -> List[str]:
+        # Names start with a timestamp, so sorted order is age order
+        return sorted(name[:-4] for name in os.listdir(self.path) if name.endswith(".log"))
+
+    def _apply_retention(self):
+        segments = self._segments()
+        sizes = {segment: os.path.getsize(os.path.join(self.path, segment + ".log")) for segment in segments}
+        total = sum(sizes.values())
+        cutoff = time.time() - self.max_age_days * 86400
+        for segment in segments:
+            if segment == self.segment:
+                continue
+            log_path = os.path.join(self.path, segment + ".log")
+            if total <= self.max_bytes and os.path.getmtime(log_path) >= cutoff:
+                break
+            try:
+                log_file = open(log_path, "rb")
+            except FileNotFoundError:
+                # Removed by another process's retention
+                total -= sizes[segment]
+                continue
+            with log_file:
+                try:
+                    fcntl.flock(log_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another live writer's open segment
+                    continue
+                for suffix in (".log", ".idx"):
+                    try:
+                        os.remove(os.path.join(self.path, segment + suffix))
+                    except FileNotFoundError:
+                        pass
+            total -= sizes[segment]
+            self._forget_segment(segment)
+
+    def flush(self, timeout: float = 5.0):
+        """Wait (bounded) until every queued artifact is on disk."""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    # Indexing
+
+    def _add_entry(self, entry: ArtifactEntry):
+        self.by_tool.setdefault(entry.tool_id, []).append(entry)
+        if entry.request_id:
+            self.by_request.setdefault(entry.request_id, []).append(entry)
+
+    def _forget_segment(self, segment: str):
+        with self.lock:
+            for index in (self.by_tool, self.by_request):
+                for key in list(index):
+                    index[key] = [entry for entry in index[key] if entry.segment != segment]
+                    if not index[key]:
+                        del index[key]
+            self.index_positions.pop(os.path.join(self.path, segment + ".idx"), None)
+
+    def _refresh_index(self):
+        # Load index lines written since the last refresh, by this or any other process
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith(".idx"):
+                continue
+            index_path = os.path.join(self.path, name)
+            with self.lock:
+                position = self.index_positions.get(index_path, 0)
+            try:
+                with open(index_path, "rb") as f:
+                    f.seek(position)
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            # A line still being written by another process is picked up next time
+            complete = data[:data.rfind(b"\n") + 1]
+            with self.lock:
+                if self.index_positions.get(index_path, 0) != position:
+                    continue
+                for line in complete.splitlines():
+                    self._add_entry(ArtifactEntry(**json.loads(line)))
+                self.index_positions[index_path] = position + len(complete)
+
+    # Reading
+
+    def _read_entry(self, entry: ArtifactEntry) -> Dict:
+        with open(os.path.join(self.path, entry.segment + ".log"), "rb") as f:
+            f.seek(entry.offset)
+            return json.loads(f.read(entry.length))
+
+    def entries(self, tool_id: Optional[str] = None, request_id: Optional[str] = None, kind: Optional[str] = None) -> List[ArtifactEntry]:
+        """Index entries for a tool and/or request, oldest first."""
+        self._refresh_index()
+        with self.lock:
+            if tool_id is not None:
+                found = list(self.by_tool.get(tool_id, []))
+                if request_id is not None:
+                    found = [entry for entry in found if entry.request_id == request_id]
+            elif request_id is not None:
+                found = list(self.by_request.get(request_id, []))
+            else:
+                found = [entry for entries in self.by_tool.values() for entry in entries]
+        found = [entry for entry in found if kind is None or entry.kind == kind]
+        return sorted(found, key=lambda entry: entry.ts)
+
+    def read(self, entry: ArtifactEntry) -> str:
+        return self._read_entry(entry)["content"]
+
+    def latest(self, kind: str, tool_id: str) -> Optional[str]:
+        """Content of the most recent artifact of kind for tool_id, or None."""
+        with self.lock:
+            pending = self.pending_content.get((kind, tool_id))
+        if pending is not None:
+            return pending
+        entries = self.entries(tool_id=tool_id, kind=kind)
+        for entry in reversed(entries):
+            try:
+                return self.read(entry)
+            except FileNotFoundError:
+                # Removed by retention since the index was read
+                continue
+        return None
+
+    def artifacts(self, tool_id: Optional[str] = None, request_id: Optional[str] = None, kind: Optional[str] = None) -> List[Dict]:
+        """Like entries, but the stored records themselves, content included."""
+        artifacts = []
+        for entry in self.entries(tool_id=tool_id, request_id=request_id, kind=kind):
+            try:
+                artifacts.append(self._read_entry(entry))
+            except FileNotFoundError:
+                continue
+        return artifacts
+
+
+_log = None
+_log_lock = threading.Lock()
+
+def get_artifact_log() -> ArtifactLog:
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = ArtifactLog(
+                path=os.environ.get("BTB_ARTIFACT_PATH", "artifacts"),
+                segment_bytes=int(os.environ.get("BTB_ARTIFACT_SEGMENT_BYTES", str(64 * 1024 * 1024))),
+                max_bytes=int(os.environ.get("BTB_ARTIFACT_MAX_BYTES", str(2 * 1024 * 1024 * 1024))),
+                max_age_days=float(os.environ.get("BTB_ARTIFACT_MAX_AGE_DAYS", "30")),
+            )
+        return _log
+
+
+def _parse_name(name: str):
+    kind, _, tool_id = name.partition(":")
+    if not tool_id:
+        raise ValueError(f"Artifact name must look like <kind>:<tool id>, got {name!r}")
+    return kind, tool_id
+
+
+def save_artifact(name: str, content: str):
+    """Queue content under name ("<kind>:<tool id>")."""
+    kind, tool_id = _parse_name(name)
+    get_artifact_log().append(kind, tool_id, content)
+
+
+def load_artifact(name: str) -> str:
+    """
+    Content saved under name, for replaying a stage without calling the model.
+
+    name is "<kind>:<tool id>"; a path to an existing file (e.g. one of the old
+    save_runs/ outputs) is read directly.
+
+    Raises:
+        FileNotFoundError: Nothing was saved under name
+    """
+    if os.path.isfile(name):
+        with open(name, "r") as f:
+            return f.read()
+    kind, tool_id = _parse_name(name)
+    content = get_artifact_log().latest(kind, tool_id)
+    if content is None:
+        raise FileNotFoundError(f"No artifact {name}")
+    return content
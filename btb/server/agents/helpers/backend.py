@@ -1,25 +1,41 @@
 from enum import Enum, auto
-from typing import Optional
+from typing import Any, Optional
 import os
-from anthropic import Anthropic
-import openai
+import time
+from .scheduler import LLMScheduler, Priority, get_scheduler
+from .usage import UsageRecorder, get_usage_recorder
+from ....metrics import counter, histogram
+
+LLM_SECONDS = histogram("btb_llm_call_seconds", "Latency of successful LLM calls", ["agent", "backend", "model"])
+LLM_TOKENS = counter("btb_llm_tokens_total", "LLM tokens by kind (input, cached, output)", ["agent", "kind"])
+
+# Output tokens reserved in the scheduler's token bucket per call, by priority: HIGH
+# stages (summary, matcher) answer in a few lines, LOW ones (generator, formatter) write code
+EXPECTED_OUTPUT_TOKENS = {Priority.HIGH: 256, Priority.NORMAL: 1024, Priority.LOW: 2048}
 
 class BackendType(Enum):
     """Enum representing the available LLM backend providers."""
     ANTHROPIC = auto()
     OPENAI = auto()
+    FAKE = auto()  # deterministic offline responses, see fake_llm.py
 
 class AgentBackend:
     """
     A flexible backend class that supports multiple LLM providers.
-    Currently supports OpenAI and Anthropic APIs.
+    Currently supports OpenAI and Anthropic APIs, plus an offline fake for benchmarks.
     """
     
     def __init__(self, 
                  backend_type: BackendType, 
                  system_prompt: str,
                  api_key: Optional[str] = None,
-                 model: Optional[str] = None):
+                 model: Optional[str] = None,
+                 priority: Priority = Priority.NORMAL,
+                 scheduler: Optional[LLMScheduler] = None,
+                 agent: Optional[str] = None,
+                 client: Optional[Any] = None,
+                 usage_recorder: Optional[UsageRecorder] = None,
+                 cache_system_prompt: bool = True):
         """
         Initialize the AgentBackend.
 
@@ -28,25 +44,52 @@ class AgentBackend:
             system_prompt: The system prompt to use for the LLM
             api_key: API key for the selected backend. If None, will try to get from environment variables
             model: The specific model to use. If None, will use a default model for the selected backend
+            priority: Scheduling class of this agent's calls in the shared LLM scheduler
+            scheduler: Scheduler enforcing rate limits and retries. If None, uses the process-wide one
+            agent: Name usage is recorded under, e.g. "generator"
+            client: Pre-built provider client (e.g. a stub for offline tests). If None, one is created from api_key
+            usage_recorder: Where per-call usage is recorded. If None, uses the process-wide recorder
+            cache_system_prompt: Mark the system prompt as a cacheable prefix (Anthropic prompt caching)
         """
         self.backend_type = backend_type
         self.system_prompt = system_prompt
+        self.priority = priority
+        self.scheduler = scheduler or get_scheduler()
+        self.agent = agent
+        self.usage_recorder = usage_recorder or get_usage_recorder()
+        self.cache_system_prompt = cache_system_prompt
 
         # Set up the appropriate client based on backend type
         if backend_type == BackendType.ANTHROPIC:
             self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
-            if not self.api_key:
+            if client is not None:
+                self.client = client
+            elif not self.api_key:
                 raise ValueError("Anthropic API key must be provided or set as ANTHROPIC_API_KEY environment variable")
-            self.client = Anthropic(api_key=self.api_key)
+            else:
+                # Imported here so only the providers actually configured get loaded
+                from anthropic import Anthropic
+                # Retries are done by the scheduler so they count against the shared limits
+                self.client = Anthropic(api_key=self.api_key, max_retries=0)
             self.model = model or "claude-3-sonnet-20240229"
 
         elif backend_type == BackendType.OPENAI:
             self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
-            if not self.api_key:
+            if client is not None:
+                self.client = client
+            elif not self.api_key:
                 raise ValueError("OpenAI API key must be provided or set as OPENAI_API_KEY environment variable")
-            self.client = openai.OpenAI(api_key=self.api_key)
+            else:
+                import openai
+                self.client = openai.OpenAI(api_key=self.api_key, max_retries=0)
             self.model = model or "gpt-4-turbo"
 
+        elif backend_type == BackendType.FAKE:
+            from .fake_llm import FakeLLMClient
+            self.api_key = None
+            self.client = client or FakeLLMClient(agent)
+            self.model = model or "fake"
+
         else:
             raise ValueError(f"Unsupported backend type: {backend_type}")
 
@@ -64,13 +107,33 @@ class AgentBackend:
             
         Returns:
             The generated text response
+
+        Raises:
+            LLMRequestError: if the request fails permanently or runs out of retries
         """
+        # Rough prompt size (~4 characters per token) plus the expected answer; corrected once usage is known
+        estimated_tokens = (len(self.system_prompt) + len(prompt)) // 4 + min(max_tokens, EXPECTED_OUTPUT_TOKENS[self.priority])
+        return self.scheduler.submit(
+            self.backend_type.name,
+            self.model,
+            lambda: self._generate_once(prompt, max_tokens, temperature),
+            estimated_tokens,
+            self.priority,
+        )
+
+    def _generate_once(self, prompt: str, max_tokens: int, temperature: float):
+        # One request to the provider, returning (text, tokens used)
+        start = time.monotonic()
         if self.backend_type == BackendType.ANTHROPIC:
+            system = self.system_prompt
+            if self.cache_system_prompt:
+                # The system prompt is identical on every call, so cache it as the prompt prefix
+                system = [{"type": "text", "text": self.system_prompt, "cache_control": {"type": "ephemeral"}}]
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=max_tokens,
                 temperature=temperature,
-                system=self.system_prompt,
+                system=system,
                 messages=[
                     {
                         "role": "user",
@@ -78,7 +141,13 @@ class AgentBackend:
                     }
                 ]
             )
-            return response.content[0].text
+            usage = response.usage
+            cached = getattr(usage, "cache_read_input_tokens", None) or 0
+            written = getattr(usage, "cache_creation_input_tokens", None) or 0
+            # Anthropic's input_tokens excludes the cached and cache-written parts
+            input_tokens = usage.input_tokens + cached + written
+            self._record_usage(input_tokens, cached, written, usage.output_tokens, time.monotonic() - start)
+            return response.content[0].text, input_tokens + usage.output_tokens
             
         elif self.backend_type == BackendType.OPENAI:
             response = self.client.chat.completions.create(
@@ -90,7 +159,34 @@ class AgentBackend:
                     {"role": "user", "content": prompt}
                 ]
             )
-            return response.choices[0].message.content
+            usage = response.usage
+            # OpenAI caches long prompt prefixes automatically; the static system prompt comes first
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached = getattr(details, "cached_tokens", None) or 0
+            self._record_usage(usage.prompt_tokens, cached, 0, usage.completion_tokens, time.monotonic() - start)
+            return response.choices[0].message.content, usage.total_tokens
+
+        elif self.backend_type == BackendType.FAKE:
+            response = self.client.generate(self.system_prompt, prompt, self.cache_system_prompt)
+            self._record_usage(response.input_tokens, response.cached_tokens, 0, response.output_tokens, time.monotonic() - start)
+            return response.text, response.input_tokens + response.output_tokens
         
         else:
             raise ValueError(f"Unsupported backend type: {self.backend_type}")
+
+    def _record_usage(self, input_tokens: int, cached_tokens: int, cache_write_tokens: int, output_tokens: int, latency: float):
+        agent = self.agent or "unknown"
+        LLM_SECONDS.labels(agent=agent, backend=self.backend_type.name, model=self.model).observe(latency)
+        LLM_TOKENS.labels(agent=agent, kind="input").inc(input_tokens)
+        LLM_TOKENS.labels(agent=agent, kind="cached").inc(cached_tokens)
+        LLM_TOKENS.labels(agent=agent, kind="output").inc(output_tokens)
+        self.usage_recorder.record(
+            self.agent,
+            self.backend_type.name,
+            self.model,
+            input_tokens,
+            cached_tokens,
+            cache_write_tokens,
+            output_tokens,
+            latency,
+        )
@@ -0,0 +1,69 @@
+from contextvars import ContextVar
+import threading
+import time
+from typing import Optional
+
+class RequestCancelled(Exception):
+    """Raised inside a request's work once the request was cancelled or ran past its deadline."""
+
+
+class CancelToken:
+    """
+    Cancellation state of one request. Set as the current token while the
+    request's stages run so blocking helpers (e.g. the LLM scheduler) can stop
+    waiting as soon as the request is abandoned.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        """
+        Args:
+            deadline: time.monotonic() value after which the request counts as cancelled
+        """
+        self.deadline = deadline
+        self.event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self.event.is_set():
+            self.reason = reason
+            self.event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self.event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+        return self.event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+
+
+current_token: ContextVar[Optional[CancelToken]] = ContextVar("btb_cancel_token", default=None)
+
+def check_cancelled():
+    token = current_token.get()
+    if token is not None:
+        token.check()
+
+def bounded_wait(timeout: Optional[float]) -> Optional[float]:
+    # Clamp a wait so it never outlives the current request's deadline
+    token = current_token.get()
+    remaining = token.remaining() if token is not None else None
+    if remaining is None:
+        return timeout
+    return remaining if timeout is None else min(timeout, remaining)
+
+def sleep(seconds: float):
+    # time.sleep that wakes up early, and raises, when the current request is cancelled
+    token = current_token.get()
+    if token is None:
+        time.sleep(seconds)
+        return
+    token.event.wait(bounded_wait(seconds))
+    token.check()
@@ -1,37 +1,201 @@
-from .postgres import PostgresDB
+from .postgres import PostgresDB, to_list
 from .vector_db import VectorDB
-import weave
+from .lexical import get_lexical_index, hybrid_rank, tool_document
+from .filters import tool_metadata, constraints_to_where, matches_where
+from .memory_store import get_memory_store
+from .feedback import aggregate_reports, observed_success_rate, rank_by_stats
+from .index_service import RemoteLexicalIndex, RemoteVectorDB, get_index_client
+from .... import tracing
+import os
+import threading
+import time
+
+# Distinct env vars and dependencies across the catalog, which constraint filters exclude
+# by; cached per process, dropped on local writes and reloaded after this many seconds
+# so other workers' new tools are picked up
+CATALOG_VALUES_TTL = float(os.environ.get("BTB_CATALOG_VALUES_TTL", "60"))
+_catalog_values = {}
+_catalog_values_lock = threading.Lock()
+# bumped by every invalidation, so a load that raced a write is not cached
+_catalog_generation = 0
+
+def invalidate_catalog_values():
+    global _catalog_generation
+    with _catalog_values_lock:
+        _catalog_values.clear()
+        _catalog_generation += 1
 
 class DBAdapter:
-    def __init__(self):
-        self.postgres = PostgresDB()
-        self.vector_db = VectorDB()
+    def __init__(self, hybrid: bool = True, candidate_pool: int = 10):
+        # BTB_CATALOG_STORE=memory keeps the catalog in process, for offline benchmarks
+        self.postgres = get_memory_store() if os.environ.get("BTB_CATALOG_STORE") == "memory" else PostgresDB()
+        # hybrid retrieval fuses BM25 over descriptions and argument names with the vector ranking
+        self.hybrid = hybrid
+        self.candidate_pool = candidate_pool
+        index_socket = os.environ.get("BTB_INDEX_SOCKET")
+        if index_socket:
+            # multi-worker mode: the indexes live in the index service process
+            client = get_index_client(index_socket)
+            self.vector_db = RemoteVectorDB(client)
+            self.lexical = RemoteLexicalIndex(client)
+        else:
+            self.vector_db = VectorDB()
+            self.lexical = get_lexical_index(self.postgres)
 
-    @weave.op
-    def add_tool(self, id, description, arguments, argument_types, env_variables, command, implementation, dependencies):
+    @tracing.op
+    def add_tool(self, id, description, arguments, argument_types, env_variables, command, implementation, dependencies, language="python", validation=None):
         # document is description of a tool
         # we need to embed the document and add it to the vector database
-        self.postgres.add_tool(id, description, arguments, argument_types, env_variables, command, implementation, dependencies)
-        self.vector_db.add_tool(id, description)
+        self.postgres.add_tool(id, description, arguments, argument_types, env_variables, command, implementation, dependencies, language, validation)
+        self.vector_db.add_tool(id, description, self._metadata({
+            "language": language,
+            "env_variables": env_variables,
+            "dependencies": dependencies,
+            "implementation": implementation,
+        }))
+        self.lexical.add(id, tool_document(description, to_list(arguments)))
+        invalidate_catalog_values()
+
+    def add_tools(self, tools):
+        # bulk import: one Postgres batch and one embedding batch for all tools
+        self.postgres.add_tools(tools)
+        self.vector_db.add_tools(
+            [tool["id"] for tool in tools],
+            [tool["description"] for tool in tools],
+            [self._metadata(tool) for tool in tools],
+        )
+        for tool in tools:
+            self.lexical.add(tool["id"], tool_document(tool["description"], to_list(tool.get("arguments"))))
+        invalidate_catalog_values()
+
+    def _metadata(self, tool):
+        return tool_metadata(
+            tool.get("language") or "python",
+            to_list(tool.get("env_variables")),
+            to_list(tool.get("dependencies")),
+            tool.get("implementation"),
+            observed_success_rate(tool),
+        )
 
-    def query(self, query: str):
-        return self.vector_db.query(query)
+    def refresh_metadata(self, ids):
+        # push filter metadata derived from the catalog row (e.g. success_rate) to the vector store
+        tools = self.postgres.list_tool_metadata(list(ids))
+        if tools:
+            self.vector_db.set_metadata([tool["id"] for tool in tools], [self._metadata(tool) for tool in tools])
+
+    def query(self, query: str, n_results: int = 1, constraints=None):
+        # constraints are applied as a metadata pre-filter, see filters.constraints_to_where
+        where = None
+        if constraints:
+            where = constraints_to_where(
+                constraints,
+                known_env_variables=self._catalog_values("env_variables") if constraints.get("available_env_variables") is not None else (),
+                known_dependencies=self._catalog_values("dependencies") if constraints.get("allowed_dependencies") is not None else (),
+            )
+        if not self.hybrid:
+            return self.vector_db.query(query, n_results=n_results, where=where)
+        vector_ids = self.vector_db.query(query, n_results=self.candidate_pool, where=where)["ids"][0]
+        lexical_ids = [id for id, _ in self.lexical.query(query, n_results=self.candidate_pool)]
+        if where and lexical_ids:
+            # BM25 has no metadata, so check its candidates against the vector store's
+            found = self.vector_db.get_tools(lexical_ids)
+            allowed = {id for id, metadata in zip(found["ids"], found["metadatas"]) if matches_where(metadata, where)}
+            lexical_ids = [id for id in lexical_ids if id in allowed]
+        return {"ids": [hybrid_rank(vector_ids, lexical_ids, n_results)]}
+
+    def _catalog_values(self, column):
+        with _catalog_values_lock:
+            cached = _catalog_values.get(column)
+            if cached and time.monotonic() - cached[0] < CATALOG_VALUES_TTL:
+                return cached[1]
+            generation = _catalog_generation
+        values = self.postgres.distinct_list_values(column)
+        with _catalog_values_lock:
+            if generation == _catalog_generation:
+                _catalog_values[column] = (time.monotonic(), values)
+        return values
+
+    def sync_metadata(self):
+        # backfill filter metadata for tools indexed before it was stored
+        tools = self.postgres.list_tool_metadata()
+        if tools:
+            self.vector_db.set_metadata([tool["id"] for tool in tools], [self._metadata(tool) for tool in tools])
 
     def get_tool(self, id: str):
         # get a tool from the postgres database
         return self.postgres.get_tool(id)
 
+    def get_tool_summary(self, id: str):
+        # get a tool's metadata without transferring its implementation
+        return self.postgres.get_tool_summary(id)
+
+    def get_implementation(self, id: str):
+        return self.postgres.get_implementation(id)
+
+    def record_usage(self, id: str):
+        self.postgres.record_usage(id)
+
+    def record_runs(self, reports):
+        # reports from clients, oldest first; see feedback.py
+        runs = aggregate_reports(reports)
+        if runs:
+            self.postgres.record_runs(runs)
+            # reports may name retired ids; their runs were counted on the canonical tool
+            self.refresh_metadata({self.postgres.resolve_id(id) for id in runs})
+        return len(runs)
+
+    def rank_candidates(self, ids):
+        # demote unreliable or slow tools and drop ones that keep failing
+        if not ids:
+            return ids
+        return rank_by_stats(ids, self.postgres.get_tool_stats(ids))
+
     def remove_tool(self, id: str):
         # remove a tool from the vector database and postgres database
         self.vector_db.remove_tool(id)
+        self.lexical.remove(id)
         self.postgres.remove_tool(id)
+        invalidate_catalog_values()
 
-    def update_tool(self, id, description=None, arguments=None, argument_types=None, env_variables=None, command=None, implementation=None):
+    def retire_tools(self, canonical_id: str, retired_ids):
+        # Postgres first: once the aliases are committed, requests holding a retired id
+        # already get the canonical tool, so dropping the index entries cannot strand them
+        self.postgres.retire_tools(canonical_id, retired_ids)
+        self.vector_db.remove_tools(list(retired_ids))
+        # the canonical tool now carries the retired tools' runs
+        self.refresh_metadata([canonical_id])
+        for id in retired_ids:
+            self.lexical.remove(id)
+        invalidate_catalog_values()
+
+    def resolve_id(self, id: str):
+        return self.postgres.resolve_id(id)
+
+    def list_tools(self):
+        return self.postgres.list_tools()
+
+    def update_tool(self, id, description=None, arguments=None, argument_types=None, env_variables=None, command=None, implementation=None, dependencies=None, validation=None):
         # update a tool in the vector database
-        self.postgres.update_tool(id, description, arguments, argument_types, env_variables, command, implementation)
-        if description is not None:
-            self.vector_db.update_tool(id, description)
+        self.postgres.update_tool(id, description, arguments, argument_types, env_variables, command, implementation, dependencies, validation)
+        if env_variables is not None or dependencies is not None:
+            invalidate_catalog_values()
+        metadata = None
+        if env_variables is not None or dependencies is not None or implementation is not None:
+            tool = self.postgres.get_tool(id)
+            metadata = self._metadata(tool) if tool else None
+        if description is not None or metadata is not None:
+            self.vector_db.update_tool(id, description, metadata)
+        if description is not None or arguments is not None:
+            tool = self.postgres.get_tool_summary(id)
+            if tool:
+                self.lexical.add(id, tool_document(tool["description"], tool["arguments"]))
 
     def clear_db(self):
         self.postgres.delete_table()
         self.vector_db.clear_collection()
+        self.lexical.clear()
+        invalidate_catalog_values()
+
+    def close(self):
+        # Release the Postgres connection; the vector store and lexical index are shared
+        self.postgres.close()
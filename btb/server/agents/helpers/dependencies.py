@@ -0,0 +1,212 @@
+"""
+Resolved-requirements cache and local wheelhouse for tool dependencies.
+
+A tool's declared dependencies are normalized (PEP 503 names, deduplicated,
+sorted) into a requirement set. The first time a set is seen it is resolved
+once with pip into pinned versions, and a wheel for every pin is put in the
+wheelhouse under BTB_WHEELHOUSE. Later tools with the same set reuse the
+resolution. The server hands the pins and wheel names to clients, which fetch
+the wheels once from /api/wheels and install with --no-index from their own
+copy, so installs are reproducible and need no package index.
+
+    <BTB_WHEELHOUSE>/resolutions/<key>.json   {"dependencies", "requirements", "wheels"}
+    <BTB_WHEELHOUSE>/wheels/*.whl
+
+Wheels are built for the server's Python and platform; clients on another
+platform fall back to installing the declared dependencies from the index.
+"""
+from dataclasses import asdict, dataclass
+import fcntl
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .cancellation import bounded_wait, check_cancelled, sleep
+from ....metrics import counter, histogram
+
+RESOLUTIONS = counter("btb_dependency_resolutions_total", "Dependency set lookups by outcome (hit, resolved, failed)", ["outcome"])
+RESOLVE_SECONDS = histogram("btb_dependency_resolve_seconds", "Time to resolve a dependency set and fill the wheelhouse")
+
+WHEELHOUSE = os.environ.get("BTB_WHEELHOUSE", "wheelhouse")
+RESOLVE_TIMEOUT = float(os.environ.get("BTB_RESOLVE_TIMEOUT", "300"))
+# A set that failed to resolve is not retried for this long
+FAILURE_TTL = 600
+
+
+class ResolutionError(RuntimeError):
+    """pip could not resolve or download a requirement set."""
+
+
+@dataclass
+class Resolution:
+    key: str
+    dependencies: List[str]
+    # name==version for every package to install, transitive ones included
+    requirements: List[str]
+    wheels: List[str]
+
+
+def canonical_name(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def normalize(dependencies: List[str]) -> List[str]:
+    requirements = set()
+    for dependency in dependencies:
+        match = re.match(r"\s*([A-Za-z0-9][A-Za-z0-9._-]*)(.*)", dependency)
+        if match:
+            requirements.add(canonical_name(match.group(1)) + re.sub(r"\s+", "", match.group(2)))
+    return sorted(requirements)
+
+
+def requirement_key(requirements: List[str]) -> str:
+    # The interpreter is part of the key: pins resolved for one Python may not install on another
+    text = "\n".join([f"python{sys.version_info.major}.{sys.version_info.minor}"] + requirements)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def lock_file(f):
+    """
+    Exclusive flock on f, polled so a cancelled request (see cancellation.py)
+    stops waiting for another process's resolution or install.
+    """
+    while True:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            sleep(0.1)
+
+
+def _wheel_pin(filename: str) -> Tuple[str, str]:
+    name, version = filename.split("-")[:2]
+    return canonical_name(name), version
+
+
+class DependencyCache:
+    def __init__(self, root: str = WHEELHOUSE):
+        self.root = os.path.abspath(root)
+        self.wheel_dir = os.path.join(self.root, "wheels")
+        self.resolution_dir = os.path.join(self.root, "resolutions")
+        os.makedirs(self.wheel_dir, exist_ok=True)
+        os.makedirs(self.resolution_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.key_locks: Dict[str, threading.Lock] = {}
+        self.resolved: Dict[str, Resolution] = {}
+        self.failed: Dict[str, Tuple[float, str]] = {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.resolution_dir, f"{key}.json")
+
+    def lookup(self, dependencies: List[str]) -> Optional[Resolution]:
+        """The cached resolution of dependencies, without resolving."""
+        requirements = normalize(dependencies)
+        key = requirement_key(requirements)
+        with self.lock:
+            if key in self.resolved:
+                return self.resolved[key]
+        if not requirements:
+            return Resolution(key, [], [], [])
+        try:
+            with open(self._path(key), "r") as f:
+                resolution = Resolution(key=key, **json.load(f))
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            self.resolved[key] = resolution
+        return resolution
+
+    def resolve(self, dependencies: List[str]) -> Resolution:
+        """
+        Pins and wheels for dependencies, resolving them on first use. Threads
+        share an in-process lock and workers a file lock, so each set is
+        resolved once.
+
+        Raises:
+            ResolutionError: if pip cannot resolve or download the set
+        """
+        resolution = self.lookup(dependencies)
+        if resolution is not None:
+            RESOLUTIONS.labels(outcome="hit").inc()
+            return resolution
+        requirements = normalize(dependencies)
+        key = requirement_key(requirements)
+        with self.lock:
+            failed = self.failed.get(key)
+            if failed and time.monotonic() - failed[0] < FAILURE_TTL:
+                raise ResolutionError(failed[1])
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock, open(self._path(key) + ".lock", "w") as f:
+            lock_file(f)
+            resolution = self.lookup(dependencies)
+            if resolution is not None:
+                RESOLUTIONS.labels(outcome="hit").inc()
+                return resolution
+            try:
+                with RESOLVE_SECONDS.time():
+                    resolution = self._resolve(key, requirements)
+            except ResolutionError as e:
+                RESOLUTIONS.labels(outcome="failed").inc()
+                with self.lock:
+                    self.failed[key] = (time.monotonic(), str(e))
+                raise
+            # Written last and atomically: a resolution file means its wheels are all present
+            temp = self._path(key) + f".{os.getpid()}.tmp"
+            with open(temp, "w") as f:
+                json.dump({k: v for k, v in asdict(resolution).items() if k != "key"}, f)
+            os.replace(temp, self._path(key))
+        RESOLUTIONS.labels(outcome="resolved").inc()
+        with self.lock:
+            self.resolved[key] = resolution
+        return resolution
+
+    def _pip(self, *args: str):
+        check_cancelled()
+        try:
+            return subprocess.run(
+                [sys.executable, "-m", "pip", *args, "--quiet", "--disable-pip-version-check"],
+                check=True, capture_output=True, text=True, timeout=bounded_wait(RESOLVE_TIMEOUT),
+            )
+        except subprocess.CalledProcessError as e:
+            raise ResolutionError(e.stderr[-4000:])
+        except subprocess.TimeoutExpired:
+            # Cut short by the caller's deadline: not a property of the set, so not cached as failed
+            check_cancelled()
+            raise ResolutionError(f"pip took longer than {RESOLVE_TIMEOUT}s")
+
+    def _resolve(self, key: str, requirements: List[str]) -> Resolution:
+        with tempfile.TemporaryDirectory(prefix="btb-resolve-") as workdir:
+            report = os.path.join(workdir, "report.json")
+            self._pip("install", "--dry-run", "--ignore-installed", "--report", report, *requirements)
+            with open(report, "r") as f:
+                installs = json.load(f)["install"]
+        pins = sorted(f"{canonical_name(item['metadata']['name'])}=={item['metadata']['version']}" for item in installs)
+        # Downloads wheels and builds any sdist-only pins; already present wheels are reused
+        self._pip("wheel", "--no-deps", "--wheel-dir", self.wheel_dir, *pins)
+        available = {_wheel_pin(filename): filename for filename in os.listdir(self.wheel_dir) if filename.endswith(".whl")}
+        wheels = []
+        for pin in pins:
+            name, version = pin.split("==")
+            if (name, version) not in available:
+                raise ResolutionError(f"No wheel for {pin} in the wheelhouse")
+            wheels.append(available[(name, version)])
+        return Resolution(key, requirements, pins, wheels)
+
+
+_cache: Optional[DependencyCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_dependency_cache() -> DependencyCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DependencyCache()
+        return _cache
@@ -0,0 +1,260 @@
+from collections import OrderedDict
+import hashlib
+import os
+import queue
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+
+class HashingEmbeddingFunction:
+    """
+    Feature-hashed bag of words. No model to download, so it is what offline
+    benchmarks use; identical texts still get identical vectors.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def __call__(self, texts: List[str]) -> List[np.ndarray]:
+        vectors = []
+        for text in texts:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for word in text.lower().split():
+                digest = hashlib.md5(word.encode("utf-8")).digest()
+                index = int.from_bytes(digest[:4], "little") % self.dim
+                vector[index] += 1.0 if digest[4] & 1 else -1.0
+            norm = np.linalg.norm(vector)
+            vectors.append(vector / norm if norm else vector)
+        return vectors
+
+
+def create_embedding_function(model_name: Optional[str] = None):
+    """
+    Build the local embedding function configured by BTB_EMBEDDING_MODEL.
+
+    "default" (or unset) is Chroma's bundled ONNX all-MiniLM-L6-v2, which is what
+    the tool_descriptions collection was populated with. "hash" is the
+    model-free HashingEmbeddingFunction. Any other value is loaded as a
+    sentence-transformers model.
+    """
+    model_name = model_name or os.environ.get("BTB_EMBEDDING_MODEL", "default")
+    if model_name == "hash":
+        return HashingEmbeddingFunction()
+
+    from chromadb.utils import embedding_functions
+
+    if model_name == "default":
+        return embedding_functions.DefaultEmbeddingFunction()
+    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+
+
+class EmbeddingCache:
+    """
+    LRU cache of embeddings keyed by text hash.
+
+    New entries are also queued for a background thread that writes them to
+    spill_path as .npy files, so put() never touches the disk. A miss in
+    memory is read back from there, so entries evicted from memory (or
+    written by another worker, or before a restart) are not embedded again.
+    An entry dropped because the write queue was full, or evicted before its
+    write, is only lost from the disk cache. Once more than max_spill_files
+    are on disk, the least recently used are deleted down to 90% of the limit
+    (reads refresh a file's mtime).
+    """
+
+    def __init__(self, max_entries: int = 10_000, spill_path: Optional[str] = "embedding_cache", max_spill_files: int = 100_000, max_pending: int = 10_000):
+        self.max_entries = max_entries
+        self.spill_path = spill_path
+        self.max_spill_files = max_spill_files
+        self.entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.lock = threading.Lock()
+        self.prune_lock = threading.Lock()
+        self.spill_count = 0
+        self.queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.thread = None
+        if spill_path:
+            os.makedirs(spill_path, exist_ok=True)
+            # workers share the directory, so this is only an estimate until the next prune recounts
+            self.spill_count = sum(1 for _ in self._spilled())
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _spill_file(self, key: str) -> str:
+        return os.path.join(self.spill_path, key[:2], key + ".npy")
+
+    def _spilled(self):
+        for shard in os.scandir(self.spill_path):
+            if shard.is_dir():
+                yield from (entry for entry in os.scandir(shard.path) if entry.name.endswith(".npy"))
+
+    def _prune(self):
+        # Files another worker removed meanwhile are skipped
+        if not self.prune_lock.acquire(blocking=False):
+            return
+        try:
+            files = []
+            for entry in self._spilled():
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+            files.sort()
+            keep = int(self.max_spill_files * 0.9)
+            for _, path in files[:max(len(files) - keep, 0)]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            with self.lock:
+                self.spill_count = min(len(files), keep)
+        finally:
+            self.prune_lock.release()
+
+    def _start(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="btb-embedding-spill", daemon=True)
+                    self.thread.start()
+
+    def _after_fork(self):
+        # A forked child gets its own writer thread; the parent writes what it queued
+        self.lock = threading.Lock()
+        self.prune_lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.thread = None
+
+    def _run(self):
+        while True:
+            key, vector = self.queue.get()
+            try:
+                self._write(key, vector)
+            except Exception as e:
+                print(f"embedding cache spill failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _write(self, key: str, vector: np.ndarray):
+        file = self._spill_file(key)
+        if os.path.exists(file):
+            return
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        tmp = file + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, vector)
+        os.replace(tmp, file)
+        with self.lock:
+            self.spill_count += 1
+            over = self.spill_count > self.max_spill_files
+        if over:
+            self._prune()
+
+    def flush(self, timeout: float = 5.0):
+        """Wait (bounded) until every queued entry is on disk."""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self.lock:
+            vector = self.entries.get(key)
+            if vector is not None:
+                self.entries.move_to_end(key)
+                return vector
+        if not self.spill_path:
+            return None
+        file = self._spill_file(key)
+        try:
+            vector = np.load(file)
+            os.utime(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        self.put(key, vector, spill=False)
+        return vector
+
+    def put(self, key: str, vector: np.ndarray, spill: bool = True):
+        """Cache vector in memory and, unless spill is False (it came from disk), queue it for writing."""
+        with self.lock:
+            self.entries[key] = vector
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        if not self.spill_path or not spill:
+            return
+        self._start()
+        try:
+            self.queue.put_nowait((key, vector))
+        except queue.Full:
+            pass
+
+
+class Embedder:
+    """
+    Embeds text in batches through a single embedding function, skipping texts
+    already present in the cache.
+    """
+
+    def __init__(self, embedding_function=None, cache: Optional[EmbeddingCache] = None, batch_size: int = 64, model_name: Optional[str] = None):
+        self.model_name = model_name or os.environ.get("BTB_EMBEDDING_MODEL", "default")
+        self._embedding_function = embedding_function
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.batch_size = batch_size
+
+    @property
+    def embedding_function(self):
+        # The model is loaded on the first cache miss, not at startup
+        if self._embedding_function is None:
+            self._embedding_function = create_embedding_function(self.model_name)
+        return self._embedding_function
+
+    def key(self, text: str) -> str:
+        # Namespace by model so switching models never returns stale vectors
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed(self, texts: List[str]) -> List[np.ndarray]:
+        keys = [self.key(text) for text in texts]
+        vectors = {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                vectors[key] = cached
+            else:
+                missing[key] = text
+
+        pending = list(missing.items())
+        for i in range(0, len(pending), self.batch_size):
+            batch = pending[i:i + self.batch_size]
+            embeddings = self.embedding_function([text for _, text in batch])
+            for (key, _), embedding in zip(batch, embeddings):
+                vector = np.asarray(embedding, dtype=np.float32)
+                self.cache.put(key, vector)
+                vectors[key] = vector
+
+        return [vectors[key] for key in keys]
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder() -> Embedder:
+    # Shared across requests so the model is loaded once and the cache is warm
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            _embedder = Embedder(
+                cache=EmbeddingCache(
+                    max_entries=int(os.environ.get("BTB_EMBEDDING_CACHE_SIZE", "10000")),
+                    spill_path=os.environ.get("BTB_EMBEDDING_CACHE_PATH", "embedding_cache"),
+                    max_spill_files=int(os.environ.get("BTB_EMBEDDING_SPILL_FILES", "100000")),
+                ),
+                batch_size=int(os.environ.get("BTB_EMBEDDING_BATCH_SIZE", "64")),
+            )
+        return _embedder
@@ -0,0 +1,139 @@
+"""
+Deterministic stand-in for an LLM provider, used by BackendType.FAKE.
+
+Every stage gets a canned response in the marker format its agent parses, so
+the whole pipeline runs offline. Responses depend only on the prompt, and
+latency follows a per-stage profile (fixed overhead plus output tokens at a
+given rate, with jitter seeded by the prompt), so benchmark runs are
+repeatable.
+
+Profiles can be overridden through BTB_FAKE_LLM, e.g.
+BTB_FAKE_LLM='{"generator": {"base_latency": 3.0, "tokens_per_second": 40}}',
+and all latencies scaled with BTB_FAKE_LLM_SPEED (2 runs twice as fast, and
+0 disables the sleeps).
+"""
+import hashlib
+import json
+import os
+import random
+import re
+from typing import Dict, Optional
+
+from . import cancellation
+
+# Seconds before the first token, output tokens per second, and jitter (fraction of the total)
+DEFAULT_PROFILES = {
+    "summary": {"base_latency": 0.4, "tokens_per_second": 80, "jitter": 0.2},
+    "matcher": {"base_latency": 0.3, "tokens_per_second": 80, "jitter": 0.2},
+    "invoker": {"base_latency": 0.5, "tokens_per_second": 80, "jitter": 0.2},
+    "generator": {"base_latency": 1.5, "tokens_per_second": 60, "jitter": 0.3},
+    "formatter": {"base_latency": 1.0, "tokens_per_second": 60, "jitter": 0.3},
+    "debugger": {"base_latency": 1.0, "tokens_per_second": 60, "jitter": 0.3},
+    "requirement_resolver": {"base_latency": 0.5, "tokens_per_second": 80, "jitter": 0.2},
+}
+DEFAULT_PROFILE = {"base_latency": 0.5, "tokens_per_second": 60, "jitter": 0.2}
+
+
+def count_tokens(text: str) -> int:
+    # Same ~4 characters per token estimate the scheduler uses
+    return max(1, len(text) // 4)
+
+
+def normalize_task(task: str) -> str:
+    """
+    The fake summary of a task: numbers and quoted strings replaced by
+    placeholders, so tasks that differ only in their arguments share a tool.
+    """
+    text = re.sub(r"(['\"]).*?\1", "<text>", task.strip())
+    text = re.sub(r"-?\d+(\.\d+)?", "<number>", text)
+    return " ".join(text.lower().split())
+
+
+def _field(prompt: str, name: str) -> str:
+    match = re.search(rf"^{name}:\s*(.*)$", prompt, re.MULTILINE | re.IGNORECASE)
+    return match.group(1).strip() if match else ""
+
+
+def _block(name: str, content: str) -> str:
+    return f"# START_{name}\n{content}\n# END_{name}"
+
+
+class FakeResponse:
+    __slots__ = ("text", "input_tokens", "cached_tokens", "output_tokens")
+
+    def __init__(self, text: str, input_tokens: int, cached_tokens: int, output_tokens: int):
+        self.text = text
+        self.input_tokens = input_tokens
+        self.cached_tokens = cached_tokens
+        self.output_tokens = output_tokens
+
+
+class FakeLLMClient:
+    # System prompts "cached" so far, shared like a provider's prompt cache
+    cached_prefixes = set()
+
+    def __init__(self, agent: Optional[str], profile: Optional[Dict] = None, speed: Optional[float] = None):
+        self.agent = agent or "unknown"
+        overrides = json.loads(os.environ.get("BTB_FAKE_LLM", "{}")).get(self.agent, {})
+        self.profile = {**DEFAULT_PROFILES.get(self.agent, DEFAULT_PROFILE), **overrides, **(profile or {})}
+        self.speed = speed if speed is not None else float(os.environ.get("BTB_FAKE_LLM_SPEED", "1"))
+
+    def generate(self, system_prompt: str, prompt: str, cache_system_prompt: bool = True) -> FakeResponse:
+        text = self._respond(prompt)
+        system_tokens = count_tokens(system_prompt)
+        input_tokens = system_tokens + count_tokens(prompt)
+        output_tokens = count_tokens(text)
+        cached_tokens = 0
+        if cache_system_prompt:
+            key = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+            if key in self.cached_prefixes:
+                cached_tokens = system_tokens
+            self.cached_prefixes.add(key)
+
+        if self.speed > 0:
+            seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16], 16)
+            jitter = 1 + random.Random(seed).uniform(-1, 1) * self.profile["jitter"]
+            latency = (self.profile["base_latency"] + output_tokens / self.profile["tokens_per_second"]) * jitter
+            # Wakes up early when the request is cancelled, like an aborted HTTP call
+            cancellation.sleep(latency / self.speed)
+        return FakeResponse(text, input_tokens, cached_tokens, output_tokens)
+
+    def _respond(self, prompt: str) -> str:
+        if self.agent == "summary":
+            return _block("SUMMARY", normalize_task(prompt))
+        if self.agent == "matcher":
+            # Same summary means the same task shape, so the stored tool fits
+            task = _field(prompt, "Task description")
+            tool = _field(prompt, "Tool description")
+            return _block("MATCH", "TRUE" if task and task == tool else "FALSE")
+        if self.agent == "invoker":
+            return _block("IMPLEMENTATION", f"python {_field(prompt, 'ID')}.py")
+        if self.agent in ("formatter", "debugger"):
+            # The prompt is the implementation; hand it back unchanged
+            code = prompt.split("# START_IMPLEMENTATION")[-1].split("# END_IMPLEMENTATION")[0].strip()
+            return _block("IMPLEMENTATION", code)
+        if self.agent == "requirement_resolver":
+            return json.dumps({"libraries": [], "reasoning": "offline fake backend"})
+        if self.agent == "generator":
+            return self._tool(prompt)
+        return prompt
+
+    def _tool(self, prompt: str) -> str:
+        description = prompt.strip().splitlines()[1] if len(prompt.strip().splitlines()) > 1 else prompt.strip()
+        implementation = f'''import sys
+
+
+def tool(*args: str) -> str:
+    """{description.replace('"', "'")}"""
+    return repr(list(args))
+
+
+if __name__ == "__main__":
+    print(tool(*sys.argv[1:]))'''
+        return "\n\n".join([
+            _block("IMPLEMENTATION", implementation),
+            _block("DEPENDENCIES", "NONE"),
+            _block("ARGUMENTS", "args"),
+            _block("ARGUMENT_TYPES", "str"),
+            _block("ENV_VARIABLES", "NONE"),
+        ])
@@ -0,0 +1,108 @@
+"""
+Execution feedback from clients and how it shapes retrieval.
+
+Clients report every run of a served tool (see btb/client/telemetry.py). The
+reports are folded into per-tool counters on the catalog row, and candidate
+ranking uses them: a tool's retrieval rank is weighted by its smoothed success
+rate, its mean runtime and its sandbox smoke test outcome. Tools that failed
+their last BTB_BROKEN_AFTER_FAILURES runs in a row, or still failed their smoke
+test after the debugger's repairs, are dropped from the candidates, so the
+request generates a replacement instead of re-sending a tool that does not work.
+"""
+from dataclasses import dataclass
+import os
+from typing import Dict, Iterable, List
+
+from ....metrics import counter, histogram
+
+TOOL_RUNS = counter("btb_tool_runs_total", "Client-reported tool executions", ["status"])
+TOOL_RUN_SECONDS = histogram("btb_tool_run_seconds", "Client-reported tool runtime")
+CANDIDATES_DROPPED = counter("btb_candidates_dropped_total", "Retrieved tools skipped because they keep failing")
+
+# Failed runs in a row after which a tool is no longer offered
+BROKEN_AFTER_FAILURES = int(os.environ.get("BTB_BROKEN_AFTER_FAILURES", "3"))
+# Mean runtime at which a tool's ranking weight is halved
+SLOW_TOOL_SECONDS = float(os.environ.get("BTB_SLOW_TOOL_SECONDS", "30"))
+# Ranking weight by sandbox outcome (see sandbox.py); None is a tool never smoke tested
+# and pending one still being validated. Failed tools are not ranked at all.
+VALIDATION_WEIGHTS = {"passed": 1.0, "skipped": 0.8, "pending": 0.8, None: 0.8}
+# Retrieval weight of rank r is 1 / (RANK_K + r): small, so a lower-ranked tool
+# needs a clearly better record (about twice the weight for rank 1) to overtake
+RANK_K = 1
+
+
+@dataclass
+class RunTotals:
+    successes: int = 0
+    failures: int = 0
+    # failures after the last success in the batch; the whole count if none succeeded
+    trailing_failures: int = 0
+    runtime_seconds: float = 0.0
+    output_bytes: int = 0
+
+
+def aggregate_reports(reports: Iterable[Dict]) -> Dict[str, RunTotals]:
+    """
+    Fold reports (in the order the runs happened) into one RunTotals per tool id.
+
+    Raises:
+        ValueError: if a report lacks a tool_id or success flag
+    """
+    totals: Dict[str, RunTotals] = {}
+    for report in reports:
+        if not report.get("tool_id") or not isinstance(report.get("success"), bool):
+            raise ValueError("Every report needs a tool_id and a boolean success")
+        runtime = max(float(report.get("runtime_seconds") or 0), 0.0)
+        run = totals.setdefault(report["tool_id"], RunTotals())
+        if report["success"]:
+            run.successes += 1
+            run.trailing_failures = 0
+        else:
+            run.failures += 1
+            run.trailing_failures += 1
+        run.runtime_seconds += runtime
+        run.output_bytes += max(int(report.get("output_bytes") or 0), 0)
+        TOOL_RUNS.labels(status="success" if report["success"] else "failure").inc()
+        TOOL_RUN_SECONDS.observe(runtime)
+    return totals
+
+
+def success_rate(stats: Dict) -> float:
+    # Laplace smoothed, so a new tool starts at 0.5 and one run cannot sink it
+    return (stats["success_count"] + 1) / (stats["success_count"] + stats["failure_count"] + 2)
+
+
+def observed_success_rate(stats: Dict) -> float:
+    # Unsmoothed, for the min_success_rate constraint; a tool never reported on counts as 1.0
+    runs = (stats.get("success_count") or 0) + (stats.get("failure_count") or 0)
+    return (stats.get("success_count") or 0) / runs if runs else 1.0
+
+
+def mean_runtime(stats: Dict) -> float:
+    runs = stats["success_count"] + stats["failure_count"]
+    return stats["runtime_seconds"] / runs if runs else 0.0
+
+
+def is_broken(stats: Dict) -> bool:
+    return stats["consecutive_failures"] >= BROKEN_AFTER_FAILURES or stats.get("validation") == "failed"
+
+
+def rank_by_stats(ids: List[str], stats: Dict[str, Dict]) -> List[str]:
+    """
+    Reorder retrieval results by reciprocal rank weighted by success rate and
+    speed, dropping broken tools. Ids without stats keep neutral weights.
+    """
+    scored = []
+    for rank, id in enumerate(ids):
+        tool_stats = stats.get(id)
+        if tool_stats is None:
+            scored.append((1 / (RANK_K + rank) * 0.5, id))
+            continue
+        if is_broken(tool_stats):
+            CANDIDATES_DROPPED.inc()
+            continue
+        weight = success_rate(tool_stats) / (1 + mean_runtime(tool_stats) / SLOW_TOOL_SECONDS)
+        weight *= VALIDATION_WEIGHTS.get(tool_stats.get("validation"), VALIDATION_WEIGHTS[None])
+        scored.append((1 / (RANK_K + rank) * weight, id))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [id for _, id in scored]
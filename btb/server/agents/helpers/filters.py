@@ -0,0 +1,139 @@
+import re
+from typing import Dict, Iterable, List, Optional
+
+# Modules whose import means the tool talks to the outside world
+IMPURE_MODULES = {"requests", "urllib", "http", "socket", "aiohttp", "httpx", "subprocess", "smtplib", "ftplib", "boto3"}
+
+ENV_PREFIX = "env:"
+DEP_PREFIX = "dep:"
+
+_requirement_name = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+_import = re.compile(r"^\s*(?:from|import)\s+([A-Za-z_][A-Za-z0-9_]*)", re.MULTILINE)
+
+
+def dependency_name(requirement: str) -> str:
+    # "Requests[socks]>=2.0" -> "requests"
+    match = _requirement_name.match(requirement or "")
+    return match.group(1).lower().replace("_", "-") if match else ""
+
+
+def is_pure(env_variables: Iterable[str], implementation: str) -> bool:
+    # Heuristic: no secrets to load and no network or process modules imported
+    if list(env_variables):
+        return False
+    return not (set(_import.findall(implementation or "")) & IMPURE_MODULES)
+
+
+def tool_metadata(language: str,
+                  env_variables: List[str],
+                  dependencies: List[str],
+                  implementation: str,
+                  success_rate: float = 1.0) -> Dict:
+    """
+    Flatten a tool into Chroma metadata.
+
+    Chroma metadata values must be scalars, so list-valued fields are stored as
+    one boolean flag per item ("env:OPENAI_API_KEY": True) plus a count.
+    """
+    dependency_names = sorted({dependency_name(d) for d in dependencies} - {""})
+    metadata = {
+        "language": language or "python",
+        "pure": is_pure(env_variables, implementation),
+        "success_rate": float(success_rate),
+        "env_count": len(env_variables),
+        "dependency_count": len(dependency_names),
+    }
+    for var in env_variables:
+        metadata[ENV_PREFIX + var] = True
+    for name in dependency_names:
+        metadata[DEP_PREFIX + name] = True
+    return metadata
+
+
+def constraints_to_where(constraints: Optional[Dict], known_env_variables: Iterable[str] = (), known_dependencies: Iterable[str] = ()) -> Optional[Dict]:
+    """
+    Translate /api/genTool constraints into a Chroma where clause.
+
+    Supported constraints:
+        language: only tools written in this language
+        available_env_variables: only tools whose env vars are all in this list
+        allowed_dependencies: only tools whose dependencies are all in this list
+        max_dependencies: only tools with at most this many dependencies
+        pure: only tools that need no env vars or network access
+        min_success_rate: only tools with at least this observed success rate, from
+            client run reports (1.0 until a tool has any)
+
+    "All in this list" is expressed by excluding every catalog value outside it,
+    which is why the known env vars and dependencies are passed in.
+    """
+    if not constraints:
+        return None
+    clauses = []
+    if constraints.get("language"):
+        clauses.append({"language": constraints["language"]})
+    if constraints.get("available_env_variables") is not None:
+        available = set(constraints["available_env_variables"])
+        if not available:
+            clauses.append({"env_count": 0})
+        for var in sorted(set(known_env_variables) - available):
+            clauses.append({ENV_PREFIX + var: {"$ne": True}})
+    if constraints.get("allowed_dependencies") is not None:
+        allowed = {dependency_name(d) for d in constraints["allowed_dependencies"]}
+        if not allowed:
+            clauses.append({"dependency_count": 0})
+        for name in sorted({dependency_name(d) for d in known_dependencies} - allowed):
+            clauses.append({DEP_PREFIX + name: {"$ne": True}})
+    if constraints.get("max_dependencies") is not None:
+        clauses.append({"dependency_count": {"$lte": int(constraints["max_dependencies"])}})
+    if constraints.get("pure"):
+        clauses.append({"pure": True})
+    if constraints.get("min_success_rate") is not None:
+        clauses.append({"success_rate": {"$gte": float(constraints["min_success_rate"])}})
+
+    if not clauses:
+        return None
+    # Chroma rejects $and with fewer than two operands
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _matches_condition(value, condition) -> bool:
+    if not isinstance(condition, dict):
+        return value == condition
+    for op, operand in condition.items():
+        if op == "$eq" and not value == operand:
+            return False
+        if op == "$ne" and not value != operand:
+            return False
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            if op == "$gt" and not value > operand:
+                return False
+            if op == "$gte" and not value >= operand:
+                return False
+            if op == "$lt" and not value < operand:
+                return False
+            if op == "$lte" and not value <= operand:
+                return False
+        if op == "$in" and value not in operand:
+            return False
+        if op == "$nin" and value in operand:
+            return False
+    return True
+
+
+def matches_where(metadata: Optional[Dict], where: Optional[Dict]) -> bool:
+    # Evaluate a Chroma where clause against one metadata dict (used by the numpy backend)
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif not _matches_condition(metadata.get(key), condition):
+            return False
+    return True
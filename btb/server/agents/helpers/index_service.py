@@ -0,0 +1,205 @@
+"""
+Local index service for multi-worker serving.
+
+Chroma's PersistentClient (and the numpy index's memmap) must only be written
+by one process, and the embedding model and BM25 index are too large to load
+once per worker. In production mode a single IndexService process owns the
+VectorDB and the lexical index; workers reach them through RemoteVectorDB and
+RemoteLexicalIndex, which have the same methods and talk to the service over
+a Unix socket.
+"""
+from multiprocessing.connection import Client, Listener
+from multiprocessing import AuthenticationError
+import multiprocessing
+import os
+import threading
+import time
+
+# Methods callable through the socket, per target
+ALLOWED_METHODS = {
+    "vector": {"add_tool", "add_tools", "query", "get_tool", "get_tools", "set_metadata", "remove_tool", "remove_tools", "compact", "update_tool", "clear_collection"},
+    "lexical": {"add", "remove", "clear", "query"},
+}
+
+
+class IndexServiceError(RuntimeError):
+    """An index call failed inside the service process."""
+
+
+def _authkey() -> bytes:
+    # No default: a known key would let any local user drive the index through the socket
+    key = os.environ.get("BTB_INDEX_AUTHKEY")
+    if not key:
+        raise RuntimeError("BTB_INDEX_AUTHKEY must be set to use the index service")
+    return key.encode("utf-8")
+
+
+class IndexService:
+    def __init__(self, path: str):
+        self.path = path
+        self.targets = None
+        self.listener = None
+
+    def _build_targets(self):
+        # Imported here so the workers that only hold a proxy never load them
+        from .vector_db import VectorDB
+        from .postgres import PostgresDB
+        from .lexical import get_lexical_index
+
+        postgres = PostgresDB()
+        lexical = get_lexical_index(postgres)
+        postgres.close()
+        return {"vector": VectorDB(), "lexical": lexical}
+
+    def serve_forever(self):
+        self.targets = self._build_targets()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.listener = Listener(self.path, family="AF_UNIX", authkey=_authkey())
+        try:
+            while True:
+                try:
+                    conn = self.listener.accept()
+                except (OSError, EOFError):
+                    if self.listener is None:
+                        return
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    target, method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if method not in ALLOWED_METHODS.get(target, ()):
+                    conn.send(("error", f"Unknown index method {target}.{method}"))
+                    continue
+                try:
+                    result = getattr(self.targets[target], method)(*args, **kwargs)
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+                else:
+                    conn.send(("ok", result))
+
+    def close(self):
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.close()
+
+
+class IndexClient:
+    """
+    Connection to an IndexService, one socket per thread so concurrent
+    requests in a worker do not serialize on a single connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+
+    def _connection(self):
+        # A forked child must not reuse its parent's socket
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = Client(self.path, family="AF_UNIX", authkey=_authkey())
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def _reset(self):
+        conn = getattr(self.local, "conn", None)
+        self.local.conn = None
+        if conn is not None and self.local.pid == os.getpid():
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def call(self, target: str, method: str, *args, **kwargs):
+        # One reconnect, for a service restarted since this thread last used it
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send((target, method, args, kwargs))
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                self._reset()
+                if attempt:
+                    raise
+        if status == "error":
+            raise IndexServiceError(result)
+        return result
+
+
+class _RemoteIndex:
+    target = ""
+
+    def __init__(self, client: IndexClient):
+        self.client = client
+
+    def __getattr__(self, method):
+        if method not in ALLOWED_METHODS[self.target]:
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.client.call(self.target, method, *args, **kwargs)
+
+
+class RemoteVectorDB(_RemoteIndex):
+    """Stands in for VectorDB in a worker process."""
+    target = "vector"
+
+
+class RemoteLexicalIndex(_RemoteIndex):
+    """Stands in for the shared BM25Index in a worker process."""
+    target = "lexical"
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_index_client(path: str) -> IndexClient:
+    with _clients_lock:
+        if path not in _clients:
+            _clients[path] = IndexClient(path)
+        return _clients[path]
+
+
+def _run_service(path: str):
+    IndexService(path).serve_forever()
+
+
+def start_index_service(path: str, timeout: float = 120.0) -> multiprocessing.Process:
+    """
+    Start an IndexService in a child process and wait until it accepts connections.
+
+    Args:
+        path: Unix socket path the service listens on
+        timeout: Seconds to wait for the index to load
+    Returns:
+        The service process
+    """
+    authkey = _authkey()
+    # A socket left by an earlier service (alive or not) would answer the readiness probe
+    # below, or fail it with a different key; the new service binds a fresh one
+    if os.path.exists(path):
+        os.unlink(path)
+    process = multiprocessing.get_context("fork").Process(target=_run_service, args=(path,), name="btb-index", daemon=True)
+    process.start()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not process.is_alive():
+            raise RuntimeError(f"Index service exited with code {process.exitcode} during startup")
+        try:
+            Client(path, family="AF_UNIX", authkey=authkey).close()
+            return process
+        except (FileNotFoundError, ConnectionRefusedError):
+            time.sleep(0.1)
+        except AuthenticationError:
+            process.terminate()
+            raise RuntimeError(f"{path} is held by another index service with a different BTB_INDEX_AUTHKEY; pass another --index-socket")
+    process.terminate()
+    raise TimeoutError(f"Index service did not start within {timeout}s")
@@ -0,0 +1,121 @@
+from collections import Counter, defaultdict
+import math
+import re
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "given", "in", "into", "is",
+    "it", "its", "of", "on", "or", "that", "the", "this", "to", "with", "return", "returns",
+}
+
+_camel = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+def tokenize(text: str) -> List[str]:
+    # Lowercased words; snake_case and camelCase identifiers also yield their parts
+    tokens = []
+    for raw in re.findall(r"[A-Za-z0-9_]+", text or ""):
+        parts = [p for p in _camel.sub("_", raw).split("_") if p]
+        if len(parts) > 1:
+            tokens.append(raw.lower())
+        tokens.extend(p.lower() for p in parts)
+    return [t for t in tokens if t not in STOPWORDS]
+
+
+def tool_document(description: str, arguments: Iterable[str] | None = None) -> str:
+    return " ".join([description or "", *(arguments or [])])
+
+
+class BM25Index:
+    """
+    Okapi BM25 over tool descriptions and argument names, kept as an inverted
+    index so a query only touches the postings of its own terms.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_terms: Dict[str, Counter] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, id: str, text: str):
+        terms = Counter(tokenize(text))
+        with self.lock:
+            self.remove(id)
+            self.doc_terms[id] = terms
+            self.doc_lengths[id] = sum(terms.values())
+            self.total_length += self.doc_lengths[id]
+            for term, tf in terms.items():
+                self.postings[term][id] = tf
+
+    def remove(self, id: str):
+        with self.lock:
+            terms = self.doc_terms.pop(id, None)
+            if terms is None:
+                return
+            self.total_length -= self.doc_lengths.pop(id)
+            for term in terms:
+                self.postings[term].pop(id, None)
+                if not self.postings[term]:
+                    del self.postings[term]
+
+    def clear(self):
+        with self.lock:
+            self.postings.clear()
+            self.doc_terms.clear()
+            self.doc_lengths.clear()
+            self.total_length = 0
+
+    def query(self, text: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        with self.lock:
+            n_docs = len(self.doc_terms)
+            if not n_docs:
+                return []
+            avg_length = self.total_length / n_docs
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(text)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for id, tf in postings.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self.doc_lengths[id] / avg_length)
+                    scores[id] += idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60, n_results: int | None = None) -> List[str]:
+    # score(d) = sum over rankings of 1 / (k + rank of d), ranks starting at 1
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, id in enumerate(ranking, start=1):
+            scores[id] += 1.0 / (k + rank)
+    fused = sorted(scores, key=lambda id: scores[id], reverse=True)
+    return fused[:n_results] if n_results else fused
+
+
+def hybrid_rank(vector_ids: List[str], lexical_ids: List[str], n_results: int = 1, k: int = 60) -> List[str]:
+    # Vector ranking first so it wins ties, e.g. when the lexical side is empty
+    return reciprocal_rank_fusion([vector_ids, lexical_ids], k=k, n_results=n_results)
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+def get_lexical_index(postgres) -> BM25Index:
+    # Built once per process from Postgres, then kept current by DBAdapter writes
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            index = BM25Index()
+            for id, description, arguments in postgres.list_tool_documents():
+                index.add(id, tool_document(description, arguments))
+            _shared_index = index
+        return _shared_index
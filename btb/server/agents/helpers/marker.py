@@ -1,5 +1,5 @@
 from enum import Enum
-import weave
+from .... import tracing
 import re
 from typing import List
 
@@ -17,7 +17,7 @@ class Marker(Enum):
 
 markers = { m.name: { "start": "# START_" + m.value, "end": "# END_" + m.value } for m in Marker }
 
-@weave.op
+@tracing.op
 def parse_marked_blocks(marker: Marker, contents: str) -> List[str]:
     start = markers[marker.name]["start"]
     end = markers[marker.name]["end"]
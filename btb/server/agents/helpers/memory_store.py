@@ -0,0 +1,193 @@
+from datetime import datetime, timezone
+import threading
+
+from .postgres import LIST_COLUMNS, METADATA_COLUMNS, STATS_COLUMNS, SUMMARY_COLUMNS, TOOL_COLUMNS, UPDATABLE_COLUMNS, implementation_hash, to_list
+
+
+class InMemoryToolStore:
+    """
+    Process-local stand-in for PostgresDB with the same methods and return
+    shapes, so the server can run without a database (offline benchmarks).
+    Nothing is persisted.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tools = {}
+        # retired id -> canonical id, see PostgresDB.retire_tools
+        self.aliases = {}
+
+    def close(self):
+        pass
+
+    def delete_table(self):
+        with self.lock:
+            self.tools.clear()
+            self.aliases.clear()
+
+    def add_tool(self, id, description, arguments, argument_types, env_variables, command, implementation, dependencies, language="python", validation=None):
+        now = datetime.now(timezone.utc)
+        tool = {
+            "id": id,
+            "description": description,
+            "arguments": to_list(arguments),
+            "argument_types": to_list(argument_types),
+            "env_variables": to_list(env_variables),
+            "command": command,
+            "dependencies": to_list(dependencies),
+            "language": language,
+            "implementation_hash": implementation_hash(implementation),
+            "created_at": now,
+            "updated_at": now,
+            "usage_count": 0,
+            "last_used_at": None,
+            "success_count": 0,
+            "failure_count": 0,
+            "consecutive_failures": 0,
+            "runtime_seconds": 0.0,
+            "output_bytes": 0,
+            "validation": validation,
+            "implementation": implementation,
+        }
+        with self.lock:
+            if id in self.tools:
+                raise ValueError(f"Tool {id} already exists")
+            self.tools[id] = tool
+
+    def add_tools(self, tools):
+        for tool in tools:
+            self.add_tool(
+                tool["id"],
+                tool["description"],
+                tool.get("arguments"),
+                tool.get("argument_types"),
+                tool.get("env_variables"),
+                tool.get("command"),
+                tool["implementation"],
+                tool.get("dependencies"),
+                tool.get("language") or "python",
+                tool.get("validation"),
+            )
+
+    def remove_tool(self, id):
+        with self.lock:
+            self.tools.pop(id, None)
+
+    def update_tool(self, id, description=None, arguments=None, argument_types=None, env_variables=None, command=None, implementation=None, dependencies=None, validation=None):
+        values = {
+            "description": description,
+            "arguments": arguments,
+            "argument_types": argument_types,
+            "env_variables": env_variables,
+            "command": command,
+            "implementation": implementation,
+            "dependencies": dependencies,
+            "validation": validation,
+        }
+        with self.lock:
+            tool = self.tools.get(id)
+            if tool is None:
+                return
+            for column in UPDATABLE_COLUMNS:
+                if values[column] is not None:
+                    tool[column] = to_list(values[column]) if column in LIST_COLUMNS else values[column]
+            if implementation is not None:
+                tool["implementation_hash"] = implementation_hash(implementation)
+                tool["consecutive_failures"] = 0
+            tool["updated_at"] = datetime.now(timezone.utc)
+
+    def retire_tools(self, canonical_id, retired_ids):
+        with self.lock:
+            canonical = self.tools[canonical_id]
+            for retired_id in retired_ids:
+                self.aliases[retired_id] = canonical_id
+            for retired_id, target in self.aliases.items():
+                if target in retired_ids:
+                    self.aliases[retired_id] = canonical_id
+            for retired_id in retired_ids:
+                tool = self.tools.pop(retired_id, None)
+                if tool is None:
+                    continue
+                for column in ("usage_count", "success_count", "failure_count", "runtime_seconds", "output_bytes"):
+                    canonical[column] += tool[column]
+                if tool["last_used_at"] and (canonical["last_used_at"] is None or tool["last_used_at"] > canonical["last_used_at"]):
+                    canonical["last_used_at"] = tool["last_used_at"]
+
+    def record_runs(self, runs):
+        with self.lock:
+            for id, totals in runs.items():
+                tool = self.tools.get(self.aliases.get(id, id))
+                if tool is None:
+                    continue
+                tool["success_count"] += totals.successes
+                tool["failure_count"] += totals.failures
+                if totals.successes:
+                    tool["consecutive_failures"] = totals.trailing_failures
+                else:
+                    tool["consecutive_failures"] += totals.trailing_failures
+                tool["runtime_seconds"] += totals.runtime_seconds
+                tool["output_bytes"] += totals.output_bytes
+
+    def get_tool_stats(self, ids):
+        with self.lock:
+            return {id: {column: self.tools[id][column] for column in STATS_COLUMNS} for id in ids if id in self.tools}
+
+    def resolve_id(self, id):
+        with self.lock:
+            return self.aliases.get(id, id)
+
+    def list_aliases(self):
+        with self.lock:
+            return dict(self.aliases)
+
+    def record_usage(self, id):
+        with self.lock:
+            tool = self.tools.get(self.aliases.get(id, id))
+            if tool:
+                tool["usage_count"] += 1
+                tool["last_used_at"] = datetime.now(timezone.utc)
+
+    def list_tool_documents(self):
+        with self.lock:
+            return [(tool["id"], tool["description"], list(tool["arguments"])) for tool in self.tools.values()]
+
+    def distinct_list_values(self, column):
+        if column not in LIST_COLUMNS:
+            raise ValueError(f"{column} is not a list column")
+        with self.lock:
+            return sorted({value for tool in self.tools.values() for value in tool[column]})
+
+    def list_tool_metadata(self, ids=None):
+        with self.lock:
+            tools = self.tools.values() if ids is None else [self.tools[id] for id in ids if id in self.tools]
+            return [{column: tool[column] for column in METADATA_COLUMNS} for tool in tools]
+
+    def list_tools(self):
+        with self.lock:
+            return [{column: tool[column] for column in TOOL_COLUMNS} for tool in self.tools.values()]
+
+    def _select(self, id, columns):
+        with self.lock:
+            tool = self.tools.get(self.aliases.get(id, id))
+            return {column: tool[column] for column in columns} if tool else None
+
+    def get_tool(self, id):
+        return self._select(id, TOOL_COLUMNS)
+
+    def get_tool_summary(self, id):
+        return self._select(id, SUMMARY_COLUMNS)
+
+    def get_implementation(self, id):
+        return self._select(id, ["implementation", "implementation_hash"])
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_memory_store() -> InMemoryToolStore:
+    # Shared so every DBAdapter built by a request sees the same tools
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = InMemoryToolStore()
+        return _store
@@ -0,0 +1,405 @@
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class NumpyVectorIndex:
+    """
+    Exact in-memory vector index backed by a memory-mapped numpy matrix.
+
+    Rows are L2-normalized on insert so cosine similarity is a single matrix
+    product. With quantize=True rows are stored as int8 with a per-row scale.
+    Deletes only tombstone a row; the matrix is rewritten without dead rows
+    once they exceed compact_ratio of the stored rows.
+
+    Ids, documents and metadata are kept in meta.json (a snapshot) plus
+    meta.log, to which every flush appends only the rows changed since the
+    last one. The log is folded into a new snapshot once it holds more than
+    max_log_rows rows (or the rows are renumbered by compaction).
+    """
+
+    # Quantized rows are dequantized this many at a time while scoring
+    SCORE_BLOCK_ROWS = 16384
+
+    def __init__(self,
+                 path: str = "vector_index",
+                 dim: Optional[int] = None,
+                 quantize: bool = False,
+                 initial_capacity: int = 1024,
+                 compact_ratio: float = 0.25,
+                 max_log_rows: int = 10000):
+        """
+        Args:
+            path: Directory holding the matrix and its metadata. Created if missing
+            dim: Embedding dimension. If None, taken from the first insert or existing index
+            quantize: Store rows as int8 instead of float32
+            initial_capacity: Number of rows to allocate on first insert
+            compact_ratio: Fraction of tombstoned rows that triggers compaction
+            max_log_rows: Changed rows meta.log may hold before it is folded into meta.json
+        """
+        self.path = path
+        self.quantize = quantize
+        self.initial_capacity = initial_capacity
+        self.compact_ratio = compact_ratio
+        self.max_log_rows = max_log_rows
+        self.lock = threading.RLock()
+
+        self.dim = dim
+        self.count = 0
+        self.capacity = 0
+        self.ids: List[Optional[str]] = []
+        self.documents: List[Optional[str]] = []
+        self.metadatas: List[Optional[Dict]] = []
+        self.row_of: Dict[str, int] = {}
+        self.matrix = None
+        self.scales = None
+        self.alive = np.zeros(0, dtype=bool)
+        # Rows changed since the last flush, rows in meta.log, and the snapshot the log applies to
+        self.dirty = set()
+        self.log_rows = 0
+        self.generation = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    @property
+    def dtype(self):
+        return np.int8 if self.quantize else np.float32
+
+    def _matrix_file(self):
+        return os.path.join(self.path, "int8.mat" if self.quantize else "float32.mat")
+
+    def _meta_file(self):
+        return os.path.join(self.path, "meta.json")
+
+    def _log_file(self):
+        return os.path.join(self.path, "meta.log")
+
+    def _scales_file(self):
+        return os.path.join(self.path, "scales.mat")
+
+    def _load(self):
+        if not os.path.exists(self._meta_file()):
+            return
+        with open(self._meta_file(), "r") as f:
+            meta = json.load(f)
+        if meta["quantize"] != self.quantize:
+            raise ValueError(f"Index at {self.path} was built with quantize={meta['quantize']}")
+        self.dim = meta["dim"]
+        self.count = meta["count"]
+        self.capacity = meta["capacity"]
+        self.ids = meta["ids"]
+        self.documents = meta["documents"]
+        self.metadatas = meta.get("metadatas", [None] * self.count)
+        self.generation = meta.get("generation", 0)
+        self._replay_log()
+        self.row_of = {id: row for row, id in enumerate(self.ids) if id is not None}
+        self.alive = np.zeros(self.capacity, dtype=bool)
+        self.alive[:self.count] = [id is not None for id in self.ids]
+        if self.capacity:
+            self.matrix = np.memmap(self._matrix_file(), dtype=self.dtype, mode="r+", shape=(self.capacity, self.dim))
+        if self.quantize and self.capacity:
+            legacy = os.path.join(self.path, "scales.npy")
+            if os.path.exists(self._scales_file()):
+                self.scales = np.memmap(self._scales_file(), dtype=np.float32, mode="r+", shape=(self.capacity,))
+            else:
+                # Indexes written before scales were memory-mapped kept them in scales.npy
+                self.scales = np.memmap(self._scales_file(), dtype=np.float32, mode="w+", shape=(self.capacity,))
+                if os.path.exists(legacy):
+                    saved = np.load(legacy)
+                    self.scales[:len(saved)] = saved
+
+    def _replay_log(self):
+        if not os.path.exists(self._log_file()):
+            return
+        with open(self._log_file(), "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash is the last one; its rows were never acknowledged
+                    break
+                if entry.get("generation") != self.generation:
+                    # Left over from before the snapshot was last rewritten
+                    continue
+                self.count, self.capacity = entry["count"], entry["capacity"]
+                self.dim = entry["dim"]
+                grow = self.count - len(self.ids)
+                if grow > 0:
+                    self.ids.extend([None] * grow)
+                    self.documents.extend([None] * grow)
+                    self.metadatas.extend([None] * grow)
+                for row, value in entry["rows"].items():
+                    row = int(row)
+                    self.ids[row], self.documents[row], self.metadatas[row] = value if value else (None, None, None)
+                self.log_rows += len(entry["rows"])
+
+    def _write_snapshot(self):
+        self.generation += 1
+        tmp = self._meta_file() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "dim": self.dim,
+                "quantize": self.quantize,
+                "generation": self.generation,
+                "count": self.count,
+                "capacity": self.capacity,
+                "ids": self.ids,
+                "documents": self.documents,
+                "metadatas": self.metadatas,
+            }, f)
+        os.replace(tmp, self._meta_file())
+        # Entries of the old generation are ignored on load, so a crash before this is harmless
+        open(self._log_file(), "w").close()
+        self.log_rows = 0
+        self.dirty.clear()
+
+    def flush(self, snapshot: bool = False):
+        with self.lock:
+            if self.matrix is not None:
+                self.matrix.flush()
+            if self.quantize and self.scales is not None:
+                self.scales.flush()
+            if snapshot or not os.path.exists(self._meta_file()) or self.log_rows + len(self.dirty) > self.max_log_rows:
+                self._write_snapshot()
+                return
+            if not self.dirty:
+                return
+            rows = {
+                str(row): [self.ids[row], self.documents[row], self.metadatas[row]] if self.ids[row] is not None else None
+                for row in sorted(self.dirty)
+            }
+            with open(self._log_file(), "a") as f:
+                f.write(json.dumps({
+                    "generation": self.generation,
+                    "dim": self.dim,
+                    "count": self.count,
+                    "capacity": self.capacity,
+                    "rows": rows,
+                }) + "\n")
+            self.log_rows += len(rows)
+            self.dirty.clear()
+
+    def _grow(self, needed: int):
+        if self.count + needed <= self.capacity:
+            return
+        capacity = max(self.capacity, self.initial_capacity)
+        while self.count + needed > capacity:
+            capacity *= 2
+        self._reallocate(capacity, np.arange(self.count))
+
+    def _reallocate(self, capacity: int, keep_rows: np.ndarray):
+        # Rewrite the memory-mapped file with only keep_rows, then swap it in
+        tmp = self._matrix_file() + ".tmp"
+        matrix = np.memmap(tmp, dtype=self.dtype, mode="w+", shape=(capacity, self.dim))
+        if self.matrix is not None and len(keep_rows):
+            matrix[:len(keep_rows)] = self.matrix[keep_rows]
+        matrix.flush()
+        if self.quantize:
+            scales_tmp = self._scales_file() + ".tmp"
+            scales = np.memmap(scales_tmp, dtype=np.float32, mode="w+", shape=(capacity,))
+            if self.scales is not None and len(keep_rows):
+                scales[:len(keep_rows)] = self.scales[keep_rows]
+            scales.flush()
+            del scales
+            self.scales = None
+            os.replace(scales_tmp, self._scales_file())
+            self.scales = np.memmap(self._scales_file(), dtype=np.float32, mode="r+", shape=(capacity,))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(keep_rows)] = self.alive[keep_rows]
+        self.alive = alive
+        del self.matrix
+        os.replace(tmp, self._matrix_file())
+        self.matrix = np.memmap(self._matrix_file(), dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def _normalize(self, embeddings) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _write_rows(self, rows: np.ndarray, vectors: np.ndarray):
+        if self.quantize:
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self.matrix[rows] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self.scales[rows] = scales
+        else:
+            self.matrix[rows] = vectors
+
+    def add(self, ids: List[str], embeddings, documents: Optional[List[str]] = None, metadatas: Optional[List[Dict]] = None):
+        vectors = self._normalize(embeddings)
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}")
+            # Re-adding an id replaces it
+            self._tombstone([id for id in ids if id in self.row_of])
+            self._grow(len(ids))
+            rows = np.arange(self.count, self.count + len(ids))
+            self._write_rows(rows, vectors)
+            self.alive[rows] = True
+            for i, id in enumerate(ids):
+                self.ids.append(id)
+                self.documents.append(documents[i] if documents else None)
+                self.metadatas.append(metadatas[i] if metadatas else None)
+                self.row_of[id] = int(rows[i])
+                self.dirty.add(int(rows[i]))
+            self.count += len(ids)
+            self.flush()
+
+    def update(self, id: str, embedding=None, document: Optional[str] = None, metadata: Optional[Dict] = None):
+        with self.lock:
+            row = self.row_of.get(id)
+            if row is None:
+                return
+            if embedding is not None:
+                self._write_rows(np.array([row]), self._normalize(embedding))
+            if document is not None:
+                self.documents[row] = document
+            if metadata is not None:
+                self.metadatas[row] = metadata
+            self.dirty.add(row)
+            self.flush()
+
+    def set_metadata(self, ids: List[str], metadatas: List[Dict]):
+        # Replace the metadata of many rows with a single flush
+        with self.lock:
+            for id, metadata in zip(ids, metadatas):
+                row = self.row_of.get(id)
+                if row is not None:
+                    self.metadatas[row] = metadata
+                    self.dirty.add(row)
+            self.flush()
+
+    def _tombstone(self, ids: List[str]):
+        for id in ids:
+            row = self.row_of.pop(id, None)
+            if row is not None:
+                self.alive[row] = False
+                self.ids[row] = None
+                self.documents[row] = None
+                self.metadatas[row] = None
+                self.dirty.add(row)
+
+    def delete(self, ids: List[str]):
+        with self.lock:
+            self._tombstone(ids)
+            if self.count and (self.count - len(self.row_of)) / self.count > self.compact_ratio:
+                self.compact()
+            else:
+                self.flush()
+
+    def compact(self):
+        with self.lock:
+            keep_rows = np.array([row for row, id in enumerate(self.ids) if id is not None], dtype=np.int64)
+            if len(keep_rows) == self.count:
+                return
+            self._reallocate(max(self.initial_capacity, self.capacity), keep_rows)
+            self.ids = [self.ids[row] for row in keep_rows]
+            self.documents = [self.documents[row] for row in keep_rows]
+            self.metadatas = [self.metadatas[row] for row in keep_rows]
+            self.row_of = {id: row for row, id in enumerate(self.ids)}
+            self.count = len(keep_rows)
+            # Rows were renumbered, so the log no longer applies
+            self.flush(snapshot=True)
+
+    def clear(self):
+        with self.lock:
+            self.matrix = None
+            self.scales = None
+            self.alive = np.zeros(0, dtype=bool)
+            for file in (self._matrix_file(), self._meta_file(), self._log_file(), self._scales_file()):
+                if os.path.exists(file):
+                    os.remove(file)
+            self.count = 0
+            self.capacity = 0
+            self.ids, self.documents, self.metadatas, self.row_of = [], [], [], {}
+            self.dirty.clear()
+            self.log_rows = 0
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def get(self, ids: List[str]):
+        with self.lock:
+            rows = [self.row_of[id] for id in ids if id in self.row_of]
+            return {
+                "ids": [self.ids[row] for row in rows],
+                "documents": [self.documents[row] for row in rows],
+                "metadatas": [self.metadatas[row] for row in rows],
+            }
+
+    def rows_matching(self, predicate) -> np.ndarray:
+        # Live rows whose metadata satisfies predicate; row numbers only hold under the same lock
+        with self.lock:
+            return np.array([row for row, metadata in enumerate(self.metadatas)
+                             if self.ids[row] is not None and predicate(metadata)], dtype=np.int64)
+
+    def scores(self, queries) -> np.ndarray:
+        # Cosine similarity of each query against every stored row, dead rows at -inf
+        q = self._normalize(queries)
+        with self.lock:
+            if not self.count:
+                return np.empty((len(q), 0), dtype=np.float32)
+            matrix = self.matrix[:self.count]
+            if self.quantize:
+                # Dequantize by scaling the scores rather than the matrix, one block of rows at
+                # a time so only SCORE_BLOCK_ROWS float32 rows exist at once
+                scores = np.empty((len(q), self.count), dtype=np.float32)
+                for start in range(0, self.count, self.SCORE_BLOCK_ROWS):
+                    end = min(start + self.SCORE_BLOCK_ROWS, self.count)
+                    scores[:, start:end] = (q @ matrix[start:end].astype(np.float32).T) * self.scales[start:end]
+            else:
+                scores = q @ matrix.T
+            scores[:, ~self.alive[:self.count]] = -np.inf
+            return scores
+
+    def query(self, query_embeddings, n_results: int = 1, predicate: Optional[Callable[[Dict], bool]] = None):
+        """
+        Exact top-k search, optionally only over rows whose metadata satisfies predicate.
+
+        Filtering, scoring and mapping rows back to ids happen under one lock
+        acquisition, so a concurrent compact() cannot renumber rows in between.
+
+        Returns:
+            A dict shaped like a Chroma query result, with cosine distances
+        """
+        result = {"ids": [], "distances": [], "documents": [], "metadatas": []}
+        with self.lock:
+            scores = self.scores(query_embeddings)
+            if predicate is not None:
+                mask = np.full(scores.shape[1], -np.inf, dtype=np.float32)
+                mask[self.rows_matching(predicate)] = 0
+                scores = scores + mask
+            for row_scores in scores:
+                k = min(n_results, int(np.isfinite(row_scores).sum()))
+                if k <= 0:
+                    top = np.array([], dtype=np.int64)
+                else:
+                    top = np.argpartition(-row_scores, k - 1)[:k]
+                    top = top[np.argsort(-row_scores[top])]
+                result["ids"].append([self.ids[row] for row in top])
+                result["distances"].append([float(1 - row_scores[row]) for row in top])
+                result["documents"].append([self.documents[row] for row in top])
+                result["metadatas"].append([self.metadatas[row] for row in top])
+        return result
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_index(path: str, quantize: bool = False) -> NumpyVectorIndex:
+    # One instance per directory: separate instances would rewrite the same files under different locks
+    key = (os.path.abspath(path), quantize)
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = NumpyVectorIndex(path=path, quantize=quantize)
+        return _shared[key]
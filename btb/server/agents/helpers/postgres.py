@@ -1,109 +1,509 @@
 # Check if the table exists before creating it
-import psycopg2
+import functools
+import hashlib
+import os
+import threading
+from ....metrics import histogram, timed
+
+DB_SECONDS = histogram("btb_db_seconds", "Catalog store call latency", ["store", "op"])
+
+# Connection parameters; BTB_POSTGRES_DSN overrides the local default
+CONNECT_KWARGS = dict(database="postgres", user='postgres', password='postgres', host="localhost", port=5432)
+
+# Table creation and migration run once per process, not once per PostgresDB
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+# Columns returned by the narrow (metadata only) reads, in select order
+SUMMARY_COLUMNS = [
+    "id",
+    "description",
+    "arguments",
+    "argument_types",
+    "env_variables",
+    "command",
+    "dependencies",
+    "language",
+    "implementation_hash",
+    "created_at",
+    "updated_at",
+    "usage_count",
+    "last_used_at",
+    "success_count",
+    "failure_count",
+    "consecutive_failures",
+    "runtime_seconds",
+    "output_bytes",
+    "validation",
+]
+TOOL_COLUMNS = SUMMARY_COLUMNS + ["implementation"]
+
+# Execution outcomes reported by clients, see feedback.py
+STATS_COLUMNS = ["id", "success_count", "failure_count", "consecutive_failures", "runtime_seconds", "output_bytes", "validation"]
+
+# Columns stored as TEXT[]; legacy rows kept them as comma-separated TEXT
+LIST_COLUMNS = ["arguments", "argument_types", "env_variables", "dependencies"]
+
+# Columns the vector store's filter metadata is built from, see filters.tool_metadata
+METADATA_COLUMNS = ["id", "description", "language", "env_variables", "dependencies", "implementation", "success_count", "failure_count"]
+
+# Columns update_tool is allowed to write
+UPDATABLE_COLUMNS = ["description", "arguments", "argument_types", "env_variables", "command", "implementation", "dependencies", "validation"]
+
+# Ids retired by compaction (see compaction.py) resolve to the tool that replaced them
+RESOLVE_ID = "COALESCE((SELECT canonical_id FROM tool_aliases WHERE retired_id = $1), $1)"
+
+# Server-side prepared statements, created once per connection
+PREPARED_STATEMENTS = {
+    "btb_insert_tool": (
+        "(text, text, text[], text[], text[], text, text, text[], text, text, text)",
+        """
+        INSERT INTO tools (id, description, arguments, argument_types, env_variables, command, implementation, dependencies, implementation_hash, language, validation)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+        """,
+    ),
+    "btb_get_tool": (
+        "(text)",
+        f"SELECT {', '.join(TOOL_COLUMNS)} FROM tools WHERE id = {RESOLVE_ID}",
+    ),
+    "btb_get_tool_summary": (
+        "(text)",
+        f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM tools WHERE id = {RESOLVE_ID}",
+    ),
+    "btb_get_implementation": (
+        "(text)",
+        f"SELECT implementation, implementation_hash FROM tools WHERE id = {RESOLVE_ID}",
+    ),
+    "btb_get_tool_stats": (
+        "(text[])",
+        f"SELECT {', '.join(STATS_COLUMNS)} FROM tools WHERE id = ANY($1)",
+    ),
+    "btb_record_runs": (
+        # id, successes, failures, whether any run succeeded, failures after the last success, runtime, output bytes
+        "(text, integer, integer, boolean, integer, double precision, bigint)",
+        f"""
+        UPDATE tools SET
+            success_count = success_count + $2,
+            failure_count = failure_count + $3,
+            consecutive_failures = CASE WHEN $4 THEN $5 ELSE consecutive_failures + $5 END,
+            runtime_seconds = runtime_seconds + $6,
+            output_bytes = output_bytes + $7
+        WHERE id = {RESOLVE_ID}
+        """,
+    ),
+    "btb_resolve_id": (
+        "(text)",
+        f"SELECT {RESOLVE_ID}",
+    ),
+    "btb_remove_tool": (
+        "(text)",
+        "DELETE FROM tools WHERE id = $1",
+    ),
+    "btb_record_usage": (
+        "(text)",
+        f"UPDATE tools SET usage_count = usage_count + 1, last_used_at = now() WHERE id = {RESOLVE_ID}",
+    ),
+}
+
+
+def to_list(value):
+    # Normalize the generator's comma-separated marker output (or NONE) into a list
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    value = value.strip()
+    if not value or value.upper() == "NONE":
+        return []
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+def implementation_hash(implementation):
+    return hashlib.sha256((implementation or "").encode("utf-8")).hexdigest()
+
+
+def connect():
+    # Imported here so the in-memory store (memory_store.py) works without the driver installed
+    import psycopg2
+
+    dsn = os.environ.get("BTB_POSTGRES_DSN")
+    return psycopg2.connect(dsn) if dsn else psycopg2.connect(**CONNECT_KWARGS)
+
+
+def rollback_on_error(method):
+    # A failed statement aborts the transaction, and every later call on the connection
+    # would fail with it; roll back (or drop a broken connection) before re-raising
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            if self._conn is not None and not self._conn.closed:
+                try:
+                    self._conn.rollback()
+                except Exception:
+                    self.close()
+            raise
+    return wrapper
 
-conn = psycopg2.connect(database="postgres", user='postgres', password='postgres', host="localhost", port=5432)
-cursor = conn.cursor()
 
 class PostgresDB:
     def __init__(self):
-        self.conn = psycopg2.connect(database="postgres", user='postgres', password='postgres', host="localhost", port=5432)
-        self.cursor = self.conn.cursor()
-        self._create_table()
+        # Nothing is opened until the first query, so constructing one is free
+        self._conn = None
+        self._cursor = None
+        self._prepared = False
+
+    @property
+    def conn(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = connect()
+            self._cursor = self._conn.cursor()
+            self._prepared = False
+            self._ensure_schema()
+        return self._conn
+
+    @property
+    def cursor(self):
+        conn = self.conn
+        if self._cursor.closed:
+            self._cursor = conn.cursor()
+        return self._cursor
+
+    def _ensure_schema(self):
+        global _schema_ready
+        if _schema_ready:
+            return
+        with _schema_lock:
+            if not _schema_ready:
+                self._create_table()
+                self._migrate()
+                _schema_ready = True
+
+    def close(self):
+        if self._conn is not None and not self._conn.closed:
+            self._conn.close()
+        self._conn = None
+        self._cursor = None
+        self._prepared = False
 
     def _create_table(self):
         sql_context = """
         CREATE TABLE IF NOT EXISTS tools (
-            id TEXT PRIMARY KEY,                  -- Unique identifier for each tool
-            description TEXT NOT NULL,            -- Description of what the tool does
-            arguments TEXT,                       -- Comma-separated list of input parameters
-            argument_types TEXT,                  -- Comma-separated list of input parameter types
-            env_variables TEXT,                   -- Comma-separated list of environment variables to load
-            command TEXT,                         -- The command to run the tool
-            implementation TEXT NOT NULL,         -- The actual code implementation of the tool
-            dependencies TEXT NOT NULL            -- The actual code implementation of the tool
+            id TEXT PRIMARY KEY,                            -- Unique identifier for each tool
+            description TEXT NOT NULL,                      -- Description of what the tool does
+            arguments TEXT[] NOT NULL DEFAULT '{}',         -- Input parameters
+            argument_types TEXT[] NOT NULL DEFAULT '{}',    -- Input parameter types
+            env_variables TEXT[] NOT NULL DEFAULT '{}',     -- Environment variables to load
+            command TEXT,                                   -- The command to run the tool
+            implementation TEXT NOT NULL,                   -- The actual code implementation of the tool
+            dependencies TEXT[] NOT NULL DEFAULT '{}',      -- pip requirements of the implementation
+            language TEXT NOT NULL DEFAULT 'python',        -- Language of the implementation
+            implementation_hash TEXT,                       -- sha256 of implementation
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            usage_count INTEGER NOT NULL DEFAULT 0,         -- Number of times the tool was served
+            last_used_at TIMESTAMPTZ,
+            success_count INTEGER NOT NULL DEFAULT 0,       -- Client-reported successful runs
+            failure_count INTEGER NOT NULL DEFAULT 0,       -- Client-reported failed runs
+            consecutive_failures INTEGER NOT NULL DEFAULT 0,-- Failed runs since the last success
+            runtime_seconds DOUBLE PRECISION NOT NULL DEFAULT 0, -- Total runtime of reported runs
+            output_bytes BIGINT NOT NULL DEFAULT 0,         -- Total output size of reported runs
+            validation TEXT                                 -- Sandbox smoke test outcome (pending, passed, failed, skipped); NULL if never run
+        );
+        CREATE TABLE IF NOT EXISTS tool_aliases (
+            retired_id TEXT PRIMARY KEY,                    -- Id of a tool removed by compaction
+            canonical_id TEXT NOT NULL,                     -- Tool that now serves it
+            retired_at TIMESTAMPTZ NOT NULL DEFAULT now()
         );
         """
         self.cursor.execute(sql_context)
         self.conn.commit()
 
+    def _migrate(self):
+        # Bring tables created by the comma-separated TEXT schema up to date
+        self.cursor.execute("""
+        SELECT column_name, data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'tools';
+        """)
+        column_types = dict(self.cursor.fetchall())
+
+        for column in LIST_COLUMNS:
+            if column_types.get(column) == "text":
+                self.cursor.execute(f"""
+                ALTER TABLE tools ALTER COLUMN {column} TYPE TEXT[] USING (
+                    CASE
+                        WHEN {column} IS NULL OR btrim({column}) = '' OR upper(btrim({column})) = 'NONE' THEN '{{}}'::TEXT[]
+                        ELSE regexp_split_to_array(btrim({column}), '\\s*,\\s*')
+                    END
+                );
+                """)
+                self.cursor.execute(f"UPDATE tools SET {column} = '{{}}' WHERE {column} IS NULL;")
+                self.cursor.execute(f"ALTER TABLE tools ALTER COLUMN {column} SET DEFAULT '{{}}', ALTER COLUMN {column} SET NOT NULL;")
+
+        self.cursor.execute("""
+        ALTER TABLE tools
+            ADD COLUMN IF NOT EXISTS language TEXT NOT NULL DEFAULT 'python',
+            ADD COLUMN IF NOT EXISTS implementation_hash TEXT,
+            ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            ADD COLUMN IF NOT EXISTS usage_count INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS last_used_at TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS success_count INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS failure_count INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS consecutive_failures INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS runtime_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS output_bytes BIGINT NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS validation TEXT;
+        """)
+        self.cursor.execute("""
+        UPDATE tools SET implementation_hash = encode(sha256(convert_to(implementation, 'UTF8')), 'hex')
+        WHERE implementation_hash IS NULL;
+        """)
+        self.conn.commit()
+
+    def _prepare(self):
+        # Reconnect first: a new connection resets _prepared, its statements are gone
+        cursor = self.cursor
+        if self._prepared:
+            return
+        for name, (types, statement) in PREPARED_STATEMENTS.items():
+            cursor.execute(f"PREPARE {name} {types} AS {statement};")
+        self.conn.commit()
+        self._prepared = True
+
+    def _execute_prepared(self, name, params):
+        self._prepare()
+        placeholders = ", ".join(["%s"] * len(params))
+        self.cursor.execute(f"EXECUTE {name} ({placeholders});", params)
+
+    @rollback_on_error
     def delete_table(self):
         sql_context = """
-        DROP TABLE IF EXISTS tools;
+        DROP TABLE IF EXISTS tools, tool_aliases;
         """
         self.cursor.execute(sql_context)
+        # Plans referencing the dropped table are no longer valid
+        self.cursor.execute("DEALLOCATE ALL;")
         self.conn.commit()
+        self._prepared = False
+        self._create_table()
 
-    def add_tool(self, id, description, arguments, argument_types, env_variables, command, implementation, dependencies):
-        sql_context = """
-        INSERT INTO tools (id, description, arguments, argument_types, env_variables, command, implementation, dependencies)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
-        """
-        self.cursor.execute(sql_context, (id, description, arguments, argument_types, env_variables, command, implementation, dependencies))
+    @timed(DB_SECONDS, store="postgres", op="add_tool")
+    @rollback_on_error
+    def add_tool(self, id, description, arguments, argument_types, env_variables, command, implementation, dependencies, language="python", validation=None):
+        self._execute_prepared("btb_insert_tool", (
+            id,
+            description,
+            to_list(arguments),
+            to_list(argument_types),
+            to_list(env_variables),
+            command,
+            implementation,
+            to_list(dependencies),
+            implementation_hash(implementation),
+            language,
+            validation,
+        ))
         self.conn.commit()
 
+    @timed(DB_SECONDS, store="postgres", op="add_tools")
+    @rollback_on_error
+    def add_tools(self, tools):
+        # Bulk insert of tool dicts in as few round trips as possible
+        self._prepare()
+        rows = [(
+            tool["id"],
+            tool["description"],
+            to_list(tool.get("arguments")),
+            to_list(tool.get("argument_types")),
+            to_list(tool.get("env_variables")),
+            tool.get("command"),
+            tool["implementation"],
+            to_list(tool.get("dependencies")),
+            implementation_hash(tool["implementation"]),
+            tool.get("language") or "python",
+            tool.get("validation"),
+        ) for tool in tools]
+        import psycopg2.extras
+        psycopg2.extras.execute_batch(self.cursor, "EXECUTE btb_insert_tool (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);", rows)
+        self.conn.commit()
+
+    @timed(DB_SECONDS, store="postgres", op="remove_tool")
+    @rollback_on_error
     def remove_tool(self, id):
-        sql_context = """
-        DELETE FROM tools WHERE id = %s;
-        """
-        self.cursor.execute(sql_context, (id,))
+        self._execute_prepared("btb_remove_tool", (id,))
         self.conn.commit()
 
-    # Take a series of optional arguments and update the tool with the new values
-    def update_tool(self, id, description=None, arguments=None, argument_types=None, env_variables=None, command=None, implementation=None, dependencies=None):
-        prefix = "UPDATE tools SET"
-        if description is not None:
-            prefix += " description = %s, "
-        if arguments is not None:
-            prefix += " arguments = %s, "
-        if argument_types is not None:
-            prefix += " argument_types = %s, "
-        if env_variables is not None:
-            prefix += " env_variables = %s, "
-        if command is not None:
-            prefix += f" command = '{command}', "
-        if implementation is not None:
-            prefix += f" implementation = '{implementation}', "
-        if dependencies is not None:
-            prefix += f" dependencies = '{dependencies}', "
+    @timed(DB_SECONDS, store="postgres", op="retire_tools")
+    @rollback_on_error
+    def retire_tools(self, canonical_id, retired_ids):
+        # Fold retired_ids into canonical_id in one transaction: alias them (and anything
+        # already aliased to them), carry their usage over, then delete their rows
+        self.cursor.execute("""
+        INSERT INTO tool_aliases (retired_id, canonical_id) SELECT unnest(%s::text[]), %s
+        ON CONFLICT (retired_id) DO UPDATE SET canonical_id = EXCLUDED.canonical_id, retired_at = now();
+        """, (list(retired_ids), canonical_id))
+        self.cursor.execute("UPDATE tool_aliases SET canonical_id = %s WHERE canonical_id = ANY(%s);", (canonical_id, list(retired_ids)))
+        self.cursor.execute("""
+        UPDATE tools SET
+            usage_count = usage_count + retired.usage_count,
+            success_count = success_count + retired.success_count,
+            failure_count = failure_count + retired.failure_count,
+            runtime_seconds = runtime_seconds + retired.runtime_seconds,
+            output_bytes = output_bytes + retired.output_bytes,
+            last_used_at = GREATEST(tools.last_used_at, retired.last_used_at)
+        FROM (
+            SELECT COALESCE(sum(usage_count), 0) AS usage_count,
+                   COALESCE(sum(success_count), 0) AS success_count,
+                   COALESCE(sum(failure_count), 0) AS failure_count,
+                   COALESCE(sum(runtime_seconds), 0) AS runtime_seconds,
+                   COALESCE(sum(output_bytes), 0) AS output_bytes,
+                   max(last_used_at) AS last_used_at
+            FROM tools WHERE id = ANY(%s)
+        ) AS retired
+        WHERE id = %s;
+        """, (list(retired_ids), canonical_id))
+        self.cursor.execute("DELETE FROM tools WHERE id = ANY(%s);", (list(retired_ids),))
+        self.conn.commit()
+
+    @timed(DB_SECONDS, store="postgres", op="record_runs")
+    @rollback_on_error
+    def record_runs(self, runs):
+        # runs: RunTotals per tool id, see feedback.aggregate_reports
+        self._prepare()
+        rows = [(
+            id,
+            totals.successes,
+            totals.failures,
+            totals.successes > 0,
+            totals.trailing_failures,
+            totals.runtime_seconds,
+            totals.output_bytes,
+        ) for id, totals in runs.items()]
+        import psycopg2.extras
+        psycopg2.extras.execute_batch(self.cursor, "EXECUTE btb_record_runs (%s, %s, %s, %s, %s, %s, %s);", rows)
+        self.conn.commit()
+
+    # Execution stats of the given tools, keyed by id
+    @timed(DB_SECONDS, store="postgres", op="get_tool_stats")
+    @rollback_on_error
+    def get_tool_stats(self, ids):
+        self._execute_prepared("btb_get_tool_stats", (list(ids),))
+        return {row[0]: dict(zip(STATS_COLUMNS, row)) for row in self.cursor.fetchall()}
 
-        suffix = "WHERE id = %s;"
-        prefix += suffix
+    # The id a (possibly retired) tool id is served under
+    @timed(DB_SECONDS, store="postgres", op="resolve_id")
+    @rollback_on_error
+    def resolve_id(self, id):
+        self._execute_prepared("btb_resolve_id", (id,))
+        return self.cursor.fetchone()[0]
 
+    # retired id -> canonical id for every tool removed by compaction
+    @timed(DB_SECONDS, store="postgres", op="list_aliases")
+    @rollback_on_error
+    def list_aliases(self):
+        self.cursor.execute("SELECT retired_id, canonical_id FROM tool_aliases;")
+        return dict(self.cursor.fetchall())
+
+    # Take a series of optional arguments and update the tool with the new values
+    @timed(DB_SECONDS, store="postgres", op="update_tool")
+    @rollback_on_error
+    def update_tool(self, id, description=None, arguments=None, argument_types=None, env_variables=None, command=None, implementation=None, dependencies=None, validation=None):
+        values = {
+            "description": description,
+            "arguments": arguments,
+            "argument_types": argument_types,
+            "env_variables": env_variables,
+            "command": command,
+            "implementation": implementation,
+            "dependencies": dependencies,
+            "validation": validation,
+        }
+        assignments = []
         params = []
-        if description is not None:
-            params.append(description)
-        if arguments is not None:
-            params.append(arguments)
-        if argument_types is not None:
-            params.append(argument_types)
-        if env_variables is not None:
-            params.append(env_variables)
-        if command is not None:
-            params.append(command)
+        for column in UPDATABLE_COLUMNS:
+            value = values[column]
+            if value is None:
+                continue
+            assignments.append(f"{column} = %s")
+            params.append(to_list(value) if column in LIST_COLUMNS else value)
         if implementation is not None:
-            params.append(implementation)
-        if dependencies is not None:
-            params.append(dependencies)
+            assignments.append("implementation_hash = %s")
+            params.append(implementation_hash(implementation))
+            # A new implementation gets a fresh chance; the totals keep its history
+            assignments.append("consecutive_failures = 0")
+        if not assignments:
+            return
+        assignments.append("updated_at = now()")
         params.append(id)
-        self.cursor.execute(prefix, params)
+        self.cursor.execute(f"UPDATE tools SET {', '.join(assignments)} WHERE id = %s;", params)
         self.conn.commit()
 
-    # Get a tool from the database by id
+    @timed(DB_SECONDS, store="postgres", op="record_usage")
+    @rollback_on_error
+    def record_usage(self, id):
+        self._execute_prepared("btb_record_usage", (id,))
+        self.conn.commit()
+
+    # Text the lexical index is built from: (id, description, arguments) for every tool
+    @timed(DB_SECONDS, store="postgres", op="list_tool_documents")
+    @rollback_on_error
+    def list_tool_documents(self):
+        self.cursor.execute("SELECT id, description, arguments FROM tools;")
+        return self.cursor.fetchall()
+
+    # Every distinct value of a TEXT[] column across the catalog, e.g. all env vars any tool needs
+    @timed(DB_SECONDS, store="postgres", op="distinct_list_values")
+    @rollback_on_error
+    def distinct_list_values(self, column):
+        if column not in LIST_COLUMNS:
+            raise ValueError(f"{column} is not a list column")
+        self.cursor.execute(f"SELECT DISTINCT unnest({column}) FROM tools;")
+        return [row[0] for row in self.cursor.fetchall()]
+
+    # Metadata of every tool (or of ids), for rebuilding the vector store's filter metadata
+    @timed(DB_SECONDS, store="postgres", op="list_tool_metadata")
+    @rollback_on_error
+    def list_tool_metadata(self, ids=None):
+        if ids is None:
+            self.cursor.execute(f"SELECT {', '.join(METADATA_COLUMNS)} FROM tools;")
+        else:
+            self.cursor.execute(f"SELECT {', '.join(METADATA_COLUMNS)} FROM tools WHERE id = ANY(%s);", (list(ids),))
+        return [dict(zip(METADATA_COLUMNS, row)) for row in self.cursor.fetchall()]
+
+    # Every tool with its implementation, for catalog-wide jobs like compaction
+    @timed(DB_SECONDS, store="postgres", op="list_tools")
+    @rollback_on_error
+    def list_tools(self):
+        self.cursor.execute(f"SELECT {', '.join(TOOL_COLUMNS)} FROM tools;")
+        return [dict(zip(TOOL_COLUMNS, row)) for row in self.cursor.fetchall()]
+
+    # Get a tool from the database by id (or by an id compaction retired in its favour)
+    @timed(DB_SECONDS, store="postgres", op="get_tool")
+    @rollback_on_error
     def get_tool(self, id):
-        sql_context = """
-        SELECT * FROM tools WHERE id = %s;
-        """
-        self.cursor.execute(sql_context, (id,))
+        self._execute_prepared("btb_get_tool", (id,))
+        result = self.cursor.fetchone()
+        if result:
+            return dict(zip(TOOL_COLUMNS, result))
+        return None
+
+    # Get everything but the implementation, for callers that only need metadata
+    @timed(DB_SECONDS, store="postgres", op="get_tool_summary")
+    @rollback_on_error
+    def get_tool_summary(self, id):
+        self._execute_prepared("btb_get_tool_summary", (id,))
+        result = self.cursor.fetchone()
+        if result:
+            return dict(zip(SUMMARY_COLUMNS, result))
+        return None
+
+    @timed(DB_SECONDS, store="postgres", op="get_implementation")
+    @rollback_on_error
+    def get_implementation(self, id):
+        self._execute_prepared("btb_get_implementation", (id,))
         result = self.cursor.fetchone()
         if result:
-            return {
-                "id": result[0],
-                "description": result[1],
-                "arguments": result[2],
-                "argument_types": result[3],
-                "env_variables": result[4],
-                "command": result[5],
-                "implementation": result[6],
-                "dependencies": result[7]
-            }
+            return {"implementation": result[0], "implementation_hash": result[1]}
         return None
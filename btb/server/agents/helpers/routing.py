@@ -0,0 +1,168 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextvars
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from .backend import AgentBackend, BackendType
+from .scheduler import Priority
+
+# Stage name -> route. Every agent is routed by its stage name; a route names the
+# primary backend/model and optionally a hedge that is raced against it.
+#
+# BTB_ROUTING_CONFIG points to a JSON file with the same shape, merged over these defaults:
+# {
+#     "matcher": {
+#         "backend": "ANTHROPIC", "model": "claude-3-5-haiku-latest",
+#         "hedge": {"backend": "OPENAI", "model": "gpt-4o-mini", "percentile": 95}
+#     }
+# }
+DEFAULT_ROUTES = {
+    "summary": {"backend": "ANTHROPIC"},
+    "matcher": {"backend": "ANTHROPIC"},
+    "invoker": {"backend": "ANTHROPIC"},
+    "generator": {"backend": "ANTHROPIC"},
+    "formatter": {"backend": "ANTHROPIC"},
+    "debugger": {"backend": "ANTHROPIC"},
+    "requirement_resolver": {"backend": "ANTHROPIC"},
+}
+
+_routes = None
+_routes_lock = threading.Lock()
+
+def load_routes() -> Dict[str, Dict]:
+    global _routes
+    with _routes_lock:
+        if _routes is None:
+            routes = {stage: dict(route) for stage, route in DEFAULT_ROUTES.items()}
+            path = os.environ.get("BTB_ROUTING_CONFIG")
+            if path:
+                with open(path, "r") as f:
+                    for stage, route in json.load(f).items():
+                        routes[stage] = {**routes.get(stage, {}), **route}
+            forced = os.environ.get("BTB_LLM_BACKEND")
+            if forced:
+                # e.g. BTB_LLM_BACKEND=FAKE sends every stage to one backend, without hedging
+                routes = {stage: {"backend": forced.upper()} for stage in routes}
+            _routes = routes
+        return _routes
+
+
+class HedgedBackend:
+    """
+    Sends a prompt to the primary backend and, if it has not answered within its
+    observed latency percentile, sends the same prompt to the secondary backend.
+    The first successful answer wins; the slower call is left to finish in the
+    background and its result discarded.
+    """
+
+    # Shared by all hedged stages; the threads mostly wait on the network
+    executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="btb-hedge")
+    # Primary latencies per stage, shared because agents are built per request
+    stage_latencies: Dict[str, deque] = {}
+    stage_latencies_lock = threading.Lock()
+
+    def __init__(self,
+                 stage: str,
+                 primary: AgentBackend,
+                 secondary: AgentBackend,
+                 percentile: float = 95,
+                 default_delay: float = 2.0,
+                 min_delay: float = 0.1,
+                 min_samples: int = 20,
+                 window: int = 200):
+        """
+        Args:
+            stage: Stage name the latency history is kept under
+            primary: Backend asked first
+            secondary: Backend raced against the primary once the hedge delay passes
+            percentile: Primary latency percentile used as the hedge delay
+            default_delay: Hedge delay in seconds until min_samples latencies are known
+            min_delay: Lower bound on the hedge delay in seconds
+            min_samples: Primary latencies to observe before using the percentile
+            window: Number of recent primary latencies kept
+        """
+        self.primary = primary
+        self.secondary = secondary
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        with self.stage_latencies_lock:
+            if stage not in self.stage_latencies:
+                self.stage_latencies[stage] = deque(maxlen=window)
+            self.latencies = self.stage_latencies[stage]
+        self.lock = self.stage_latencies_lock
+        # Expose the primary's identity so callers can treat this like an AgentBackend
+        self.backend_type = primary.backend_type
+        self.model = primary.model
+        self.system_prompt = primary.system_prompt
+
+    def hedge_delay(self) -> float:
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return self.default_delay
+            return max(self.min_delay, float(np.percentile(self.latencies, self.percentile)))
+
+    def _timed(self, backend: AgentBackend, prompt: str, max_tokens: int, temperature: float, record: bool):
+        start = time.monotonic()
+        try:
+            return backend.generate(prompt, max_tokens=max_tokens, temperature=temperature)
+        finally:
+            if record:
+                with self.lock:
+                    self.latencies.append(time.monotonic() - start)
+
+    def generate(self, prompt: str, max_tokens: int = 4096, temperature: float = 0) -> str:
+        # Run in copies of the caller's context so request cancellation reaches both calls
+        primary = self.executor.submit(contextvars.copy_context().run, self._timed, self.primary, prompt, max_tokens, temperature, True)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done and primary.exception() is None:
+            return primary.result()
+
+        pending = {primary} if not done else set()
+        pending.add(self.executor.submit(contextvars.copy_context().run, self._timed, self.secondary, prompt, max_tokens, temperature, False))
+        error = primary.exception() if done else None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+
+def create_backend(stage: str,
+                   system_prompt: str,
+                   priority: Priority,
+                   backend: Optional[BackendType] = None,
+                   model: Optional[str] = None):
+    """
+    Build the backend for an agent from its stage route.
+
+    An explicit backend/model overrides the route and disables hedging.
+    """
+    if backend is not None:
+        return AgentBackend(backend, system_prompt, model=model, priority=priority, agent=stage)
+
+    routes = load_routes()
+    route = routes.get(stage) or {"backend": os.environ.get("BTB_LLM_BACKEND", "ANTHROPIC").upper()}
+    primary = AgentBackend(BackendType[route["backend"]], system_prompt, model=model or route.get("model"), priority=priority, agent=stage)
+    hedge = route.get("hedge")
+    if not hedge:
+        return primary
+    secondary = AgentBackend(BackendType[hedge["backend"]], system_prompt, model=hedge.get("model"), priority=priority, agent=stage)
+    return HedgedBackend(
+        stage,
+        primary,
+        secondary,
+        percentile=hedge.get("percentile", 95),
+        default_delay=hedge.get("default_delay", 2.0),
+        min_delay=hedge.get("min_delay", 0.1),
+        min_samples=hedge.get("min_samples", 20),
+    )
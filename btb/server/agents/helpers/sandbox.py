@@ -0,0 +1,183 @@
+"""
+Smoke tests for generated tools, run before they enter the catalog.
+
+A tool runs in a virtualenv cached per dependency set under BTB_SANDBOX_DIR
+(installed offline from the wheelhouse, see dependencies.py), in
+a fresh temporary directory, with a minimal environment (none of the server's
+secrets), in its own session so a timeout kills everything it started. This
+keeps generated code away from the server's credentials and working tree; it
+is not a security boundary against hostile code.
+
+Outcomes:
+    passed   the command (or an import of the module) exited 0
+    failed   it raised, exited non-zero, or its dependencies do not install
+    skipped  it cannot be exercised here: it needs environment variables the
+             sandbox does not have, timed out (likely network bound), or the
+             sandbox is disabled with BTB_SANDBOX=0
+"""
+from dataclasses import dataclass
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import List, Optional
+
+from .cancellation import bounded_wait, check_cancelled
+from .dependencies import Resolution, ResolutionError, get_dependency_cache, lock_file
+from ....metrics import counter, histogram
+
+SMOKE_TESTS = counter("btb_smoke_tests_total", "Sandboxed smoke tests of generated tools by outcome", ["outcome"])
+SMOKE_TEST_SECONDS = histogram("btb_smoke_test_seconds", "Sandboxed smoke test duration, environment setup included")
+
+SANDBOX_DIR = os.environ.get("BTB_SANDBOX_DIR", os.path.join(tempfile.gettempdir(), "btb-sandbox"))
+RUN_TIMEOUT = float(os.environ.get("BTB_SANDBOX_TIMEOUT", "10"))
+INSTALL_TIMEOUT = float(os.environ.get("BTB_SANDBOX_INSTALL_TIMEOUT", "120"))
+# Longest stdout/stderr tail kept for the debugger
+MAX_OUTPUT = 4000
+
+# Prefix of the error when a tool's dependencies cannot be resolved or installed
+DEPENDENCY_FAILURE = "dependency installation failed"
+
+# Runs the module's top level without its __main__ block, for tools with no command
+IMPORT_CHECK = "import runpy, sys; runpy.run_path(sys.argv[1], run_name='btb_smoke_test')"
+
+
+@dataclass
+class SmokeResult:
+    outcome: str
+    command: str
+    returncode: Optional[int] = None
+    stdout: str = ""
+    stderr: str = ""
+
+    @property
+    def passed(self) -> bool:
+        return self.outcome == "passed"
+
+    @property
+    def failed(self) -> bool:
+        return self.outcome == "failed"
+
+
+def enabled() -> bool:
+    return os.environ.get("BTB_SANDBOX", "1") != "0"
+
+
+def _tail(text: str) -> str:
+    return text if len(text) <= MAX_OUTPUT else "..." + text[-MAX_OUTPUT:]
+
+
+_venv_locks = {}
+_venv_locks_guard = threading.Lock()
+
+
+class SandboxSetupError(RuntimeError):
+    """A sandbox environment could not be created or its dependencies installed."""
+
+
+def environment(resolution: Resolution) -> str:
+    """
+    The bin directory of the cached virtualenv for this resolved dependency set,
+    built on first use. Threads wait on an in-process lock and other workers on
+    a file lock, so each environment is built once.
+    """
+    key = resolution.key
+    path = os.path.join(SANDBOX_DIR, "envs", key)
+    bin_dir = os.path.join(path, "bin")
+    ready = os.path.join(path, ".ready")
+    if os.path.exists(ready):
+        return bin_dir
+    with _venv_locks_guard:
+        lock = _venv_locks.setdefault(key, threading.Lock())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with lock, open(path + ".lock", "w") as f:
+        lock_file(f)
+        if os.path.exists(ready):
+            return bin_dir
+        shutil.rmtree(path, ignore_errors=True)
+        uv = shutil.which("uv")
+        try:
+            if uv:
+                subprocess.run([uv, "venv", "--quiet", "--python", sys.executable, path], check=True, capture_output=True, timeout=bounded_wait(INSTALL_TIMEOUT))
+                install = [uv, "pip", "install", "--quiet", "--python", os.path.join(bin_dir, "python")]
+            else:
+                subprocess.run([sys.executable, "-m", "venv", path], check=True, capture_output=True, timeout=bounded_wait(INSTALL_TIMEOUT))
+                install = [os.path.join(bin_dir, "python"), "-m", "pip", "install", "--quiet", "--disable-pip-version-check"]
+            if resolution.requirements:
+                check_cancelled()
+                offline = ["--no-index", "--find-links", get_dependency_cache().wheel_dir]
+                subprocess.run(install + offline + resolution.requirements, check=True, capture_output=True, text=True, timeout=bounded_wait(INSTALL_TIMEOUT))
+        except subprocess.CalledProcessError as e:
+            shutil.rmtree(path, ignore_errors=True)
+            raise SandboxSetupError(_tail(e.stderr if isinstance(e.stderr, str) else (e.stderr or b"").decode("utf-8", "replace")))
+        except subprocess.TimeoutExpired:
+            shutil.rmtree(path, ignore_errors=True)
+            check_cancelled()
+            raise SandboxSetupError(f"Environment setup took longer than {INSTALL_TIMEOUT}s")
+        open(ready, "w").close()
+    return bin_dir
+
+
+def smoke_test(id: str, implementation: str, dependencies: List[str], env_variables: List[str], command: Optional[str] = None) -> SmokeResult:
+    """
+    Run a tool once in the sandbox.
+
+    Args:
+        id: Tool id; the implementation is written to <id>.py, which is what commands call
+        command: Invocation to run, e.g. from ToolInvocationAgent; without one the module is only imported
+    """
+    if not enabled():
+        return SmokeResult("skipped", command or "", stderr="sandbox disabled")
+    if env_variables:
+        # Secrets are never passed into the sandbox, so tools that need them cannot run here
+        SMOKE_TESTS.labels(outcome="skipped").inc()
+        return SmokeResult("skipped", command or "", stderr=f"needs environment variables {', '.join(env_variables)}")
+
+    with SMOKE_TEST_SECONDS.time():
+        try:
+            bin_dir = environment(get_dependency_cache().resolve(dependencies))
+        except (ResolutionError, SandboxSetupError) as e:
+            SMOKE_TESTS.labels(outcome="failed").inc()
+            return SmokeResult("failed", command or "", stderr=f"{DEPENDENCY_FAILURE}: {e}")
+
+        check_cancelled()
+        with tempfile.TemporaryDirectory(prefix="btb-smoke-") as workdir:
+            script = os.path.join(workdir, f"{id}.py")
+            with open(script, "w") as f:
+                f.write(implementation)
+            env = {
+                "PATH": os.pathsep.join([bin_dir, "/usr/local/bin", "/usr/bin", "/bin"]),
+                "HOME": workdir,
+                "TMPDIR": workdir,
+                "VIRTUAL_ENV": os.path.dirname(bin_dir),
+                "PYTHONDONTWRITEBYTECODE": "1",
+                "LANG": "C.UTF-8",
+            }
+            args = command if command else [os.path.join(bin_dir, "python"), "-c", IMPORT_CHECK, script]
+            process = subprocess.Popen(
+                args,
+                shell=bool(command),
+                cwd=workdir,
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                start_new_session=True,
+            )
+            try:
+                stdout, stderr = process.communicate(timeout=bounded_wait(RUN_TIMEOUT))
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.communicate()
+                # Stopped by the caller's deadline rather than its own timeout
+                check_cancelled()
+                SMOKE_TESTS.labels(outcome="skipped").inc()
+                return SmokeResult("skipped", command or "", stderr=f"timed out after {RUN_TIMEOUT}s")
+
+    outcome = "passed" if process.returncode == 0 else "failed"
+    SMOKE_TESTS.labels(outcome=outcome).inc()
+    return SmokeResult(outcome, command or "", process.returncode, _tail(stdout), _tail(stderr))
@@ -0,0 +1,288 @@
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+from . import cancellation
+from ....metrics import counter, gauge, histogram
+
+LLM_QUEUE_SECONDS = histogram("btb_llm_queue_seconds", "Time LLM calls wait in the scheduler", ["backend", "priority"])
+LLM_IN_FLIGHT = gauge("btb_llm_in_flight", "LLM calls currently running", ["backend"])
+LLM_RETRIES = counter("btb_llm_retries_total", "LLM calls retried after a transient failure", ["backend"])
+LLM_FAILURES = counter("btb_llm_failures_total", "LLM calls that failed permanently", ["backend"])
+
+T = TypeVar("T")
+
+class Priority(IntEnum):
+    """Scheduling class of an LLM call. Lower values are served first."""
+    HIGH = 0    # short calls every request blocks on: summary, match
+    NORMAL = 1  # invocation
+    LOW = 2     # long generations: generator, formatter, debugger
+
+# Per backend defaults, overridable per backend or per backend/model through BTB_LLM_LIMITS, e.g.
+# BTB_LLM_LIMITS='{"ANTHROPIC": {"requests_per_minute": 50}, "OPENAI/gpt-4o": {"tokens_per_minute": 90000}}'
+DEFAULT_LIMITS = {
+    "requests_per_minute": 50,
+    "tokens_per_minute": 40_000,
+    "max_concurrency": 8,
+    "reserved_high_priority": 2,
+}
+
+# Built-in per backend overrides of DEFAULT_LIMITS; the fake backend is only limited by concurrency
+BACKEND_LIMITS = {
+    "FAKE": {"requests_per_minute": 100_000, "tokens_per_minute": 100_000_000, "max_concurrency": 64},
+}
+
+# HTTP statuses worth retrying; 529 is Anthropic's "overloaded"
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "InternalServerError", "RateLimitError", "OverloadedError"}
+
+def worker_share(limit: float, minimum: float = 1) -> float:
+    """
+    This process's part of a server-wide limit. Pre-forked workers (prefork.py
+    sets BTB_WORKERS) cannot share in-process state, so each enforces an equal
+    share and together they stay within the configured total.
+    """
+    workers = max(int(os.environ.get("BTB_WORKERS") or 1), 1)
+    return max(limit / workers, minimum)
+
+
+class LLMRequestError(RuntimeError):
+    """Raised when an LLM call fails permanently or exhausts its retries."""
+
+    def __init__(self, message: str, cause: Optional[BaseException] = None):
+        super().__init__(message)
+        self.cause = cause
+
+    @property
+    def rate_limited(self) -> bool:
+        # the provider kept shedding the call (429/529 and the like), rather than rejecting it
+        return self.cause is not None and is_retryable(self.cause)
+
+    @property
+    def retry_after(self) -> Optional[float]:
+        return retry_after_seconds(self.cause) if self.cause is not None else None
+
+
+class TokenBucket:
+    """
+    Continuously refilling bucket of rate_per_minute units. The balance may go
+    negative when actual usage exceeds what was reserved, which delays later callers.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        # A request larger than the whole bucket only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    # Honor retry-after-ms / retry-after from the provider response, when there is one
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+class _Lane:
+    """Limits and waiters for one backend/model pair."""
+
+    def __init__(self, limits: Dict):
+        self.requests = TokenBucket(limits["requests_per_minute"])
+        self.tokens = TokenBucket(limits["tokens_per_minute"])
+        self.max_concurrency = limits["max_concurrency"]
+        self.reserved_high_priority = min(limits["reserved_high_priority"], self.max_concurrency - 1)
+        self.in_flight = 0
+        self.waiting = []
+
+
+class LLMScheduler:
+    """
+    Shared gate in front of every LLM call.
+
+    Each backend/model pair gets a request bucket, a token bucket and a
+    concurrency cap. Waiters are admitted in priority order, and some slots are
+    kept free for HIGH priority calls so short stages are not stuck behind long
+    generations. Failed calls are retried with full-jitter exponential backoff,
+    waiting at least as long as the provider's retry-after.
+
+    Limits are for the whole server: with pre-forked workers every process
+    gets worker_share of the rate and concurrency limits.
+    """
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0, limits: Optional[Dict] = None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limits = limits if limits is not None else json.loads(os.environ.get("BTB_LLM_LIMITS", "{}"))
+        self.lanes: Dict[Tuple[str, str], _Lane] = {}
+        self.condition = threading.Condition()
+        self.sequence = itertools.count()
+
+    def configure_limit(self, backend: str, model: Optional[str] = None, **limits):
+        with self.condition:
+            key = f"{backend}/{model}" if model else backend
+            self.limits[key] = {**self.limits.get(key, {}), **limits}
+            self.lanes = {k: lane for k, lane in self.lanes.items() if k[0] != backend or (model and k[1] != model)}
+
+    def _lane(self, key: Tuple[str, str]) -> _Lane:
+        lane = self.lanes.get(key)
+        if lane is None:
+            backend, model = key
+            limits = {**DEFAULT_LIMITS, **BACKEND_LIMITS.get(backend, {}), **self.limits.get(backend, {}), **self.limits.get(f"{backend}/{model}", {})}
+            lane = self.lanes[key] = _Lane({
+                **limits,
+                "requests_per_minute": worker_share(limits["requests_per_minute"]),
+                "tokens_per_minute": worker_share(limits["tokens_per_minute"]),
+                "max_concurrency": math.floor(worker_share(limits["max_concurrency"])),
+            })
+        return lane
+
+    def _acquire(self, key: Tuple[str, str], tokens: int, priority: Priority):
+        with self.condition:
+            lane = self._lane(key)
+            ticket = (int(priority), next(self.sequence))
+            heapq.heappush(lane.waiting, ticket)
+            try:
+                while True:
+                    cancellation.check_cancelled()
+                    slots = lane.max_concurrency if priority == Priority.HIGH else lane.max_concurrency - lane.reserved_high_priority
+                    if lane.waiting[0] == ticket and lane.in_flight < slots:
+                        delay = max(lane.requests.wait_time(1), lane.tokens.wait_time(tokens))
+                        if delay == 0:
+                            lane.requests.take(1)
+                            lane.tokens.take(tokens)
+                            lane.in_flight += 1
+                            return
+                        self.condition.wait(self._wait_timeout(delay))
+                    else:
+                        self.condition.wait(self._wait_timeout(None))
+            finally:
+                lane.waiting.remove(ticket)
+                heapq.heapify(lane.waiting)
+                self.condition.notify_all()
+
+    def _wait_timeout(self, timeout: Optional[float]) -> Optional[float]:
+        # Waiters of a cancellable request poll so an abandoned request leaves the queue promptly
+        if cancellation.current_token.get() is None:
+            return timeout
+        timeout = cancellation.bounded_wait(timeout)
+        return 0.5 if timeout is None else min(timeout, 0.5)
+
+    def _release(self, key: Tuple[str, str], token_adjustment: int = 0):
+        with self.condition:
+            lane = self._lane(key)
+            lane.in_flight -= 1
+            if token_adjustment:
+                lane.tokens.take(token_adjustment)
+            self.condition.notify_all()
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def submit(self,
+               backend: str,
+               model: str,
+               call: Callable[[], Tuple[T, int]],
+               estimated_tokens: int,
+               priority: Priority = Priority.NORMAL) -> T:
+        """
+        Run call under the backend/model limits, retrying transient failures.
+
+        Args:
+            backend: Backend name, e.g. "ANTHROPIC"
+            model: Model name
+            call: Performs one request and returns (result, tokens actually used)
+            estimated_tokens: Tokens reserved before the call is made
+            priority: Scheduling class of the call
+        Returns:
+            The result of the first successful call
+        """
+        key = (backend, model)
+        queue_seconds = LLM_QUEUE_SECONDS.labels(backend=backend, priority=priority.name)
+        in_flight = LLM_IN_FLIGHT.labels(backend=backend)
+        for attempt in range(self.max_retries + 1):
+            queued = time.perf_counter()
+            self._acquire(key, estimated_tokens, priority)
+            queue_seconds.observe(time.perf_counter() - queued)
+            in_flight.inc()
+            used = estimated_tokens
+            try:
+                result, used = call()
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    LLM_FAILURES.labels(backend=backend).inc()
+                if not is_retryable(e):
+                    raise LLMRequestError(f"{backend} {model} request failed: {e}", e) from e
+                if attempt == self.max_retries:
+                    raise LLMRequestError(f"{backend} {model} request failed after {attempt + 1} attempts: {e}", e) from e
+                error = e
+                LLM_RETRIES.labels(backend=backend).inc()
+            finally:
+                in_flight.dec()
+                self._release(key, used - estimated_tokens)
+            cancellation.sleep(self._backoff(attempt, error))
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                max_retries=int(os.environ.get("BTB_LLM_MAX_RETRIES", "5")),
+            )
+        return _scheduler
@@ -0,0 +1,113 @@
+from collections import defaultdict, deque
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+# USD per million tokens: (input, cached input read, cache write, output), matched by model prefix
+PRICES = {
+    "claude-3-5-haiku": (0.8, 0.08, 1.0, 4.0),
+    "claude-3-haiku": (0.25, 0.03, 0.3, 1.25),
+    "claude-3-opus": (15.0, 1.5, 18.75, 75.0),
+    "claude-3": (3.0, 0.3, 3.75, 15.0),
+    "claude": (3.0, 0.3, 3.75, 15.0),
+    "gpt-4o-mini": (0.15, 0.075, 0.15, 0.6),
+    "gpt-4o": (2.5, 1.25, 2.5, 10.0),
+    "gpt-4-turbo": (10.0, 10.0, 10.0, 30.0),
+}
+
+
+def price(model: str) -> Optional[tuple]:
+    # Longest matching prefix wins, so "claude-3-5-haiku" beats "claude-3"
+    for prefix in sorted(PRICES, key=len, reverse=True):
+        if model and model.startswith(prefix):
+            return PRICES[prefix]
+    return None
+
+
+def call_cost(model: str, input_tokens: int, cached_tokens: int, cache_write_tokens: int, output_tokens: int) -> Optional[float]:
+    rates = price(model)
+    if rates is None:
+        return None
+    uncached = max(0, input_tokens - cached_tokens - cache_write_tokens)
+    return (uncached * rates[0] + cached_tokens * rates[1] + cache_write_tokens * rates[2] + output_tokens * rates[3]) / 1e6
+
+
+class UsageRecorder:
+    """
+    Token, cost and latency accounting for every LLM call, aggregated by agent.
+
+    input_tokens counts the whole prompt, cached_tokens the part served from the
+    provider's prompt cache and cache_write_tokens the part written to it.
+    """
+
+    def __init__(self, latency_window: int = 1000):
+        self.lock = threading.Lock()
+        self.latency_window = latency_window
+        self.started = time.time()
+        self.totals: Dict[tuple, Dict] = defaultdict(self._empty)
+        self.latencies: Dict[tuple, deque] = defaultdict(lambda: deque(maxlen=self.latency_window))
+
+    @staticmethod
+    def _empty():
+        return {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "latency_s": 0.0}
+
+    def record(self,
+               agent: str,
+               backend: str,
+               model: str,
+               input_tokens: int,
+               cached_tokens: int,
+               cache_write_tokens: int,
+               output_tokens: int,
+               latency: float):
+        cost = call_cost(model, input_tokens, cached_tokens, cache_write_tokens, output_tokens) or 0.0
+        key = (agent or "unknown", backend, model)
+        with self.lock:
+            totals = self.totals[key]
+            totals["calls"] += 1
+            totals["input_tokens"] += input_tokens
+            totals["cached_tokens"] += cached_tokens
+            totals["cache_write_tokens"] += cache_write_tokens
+            totals["output_tokens"] += output_tokens
+            totals["cost_usd"] += cost
+            totals["latency_s"] += latency
+            self.latencies[key].append(latency)
+
+    def summary(self) -> Dict:
+        """
+        Aggregates keyed by agent, each with a per backend/model breakdown.
+        """
+        with self.lock:
+            items = [(key, dict(totals), list(self.latencies[key])) for key, totals in self.totals.items()]
+        agents: Dict[str, Dict] = {}
+        for (agent, backend, model), totals, latencies in items:
+            entry = agents.setdefault(agent, {**self._empty(), "models": {}})
+            for field in self._empty():
+                entry[field] += totals[field]
+            entry["models"][f"{backend}/{model}"] = {
+                **totals,
+                "latency_p50_s": float(np.percentile(latencies, 50)) if latencies else None,
+                "latency_p95_s": float(np.percentile(latencies, 95)) if latencies else None,
+            }
+        for entry in agents.values():
+            entry["cache_hit_ratio"] = entry["cached_tokens"] / entry["input_tokens"] if entry["input_tokens"] else 0.0
+            entry["mean_latency_s"] = entry["latency_s"] / entry["calls"] if entry["calls"] else 0.0
+        return {
+            "since": self.started,
+            "agents": agents,
+            "total_cost_usd": sum(entry["cost_usd"] for entry in agents.values()),
+        }
+
+    def reset(self):
+        with self.lock:
+            self.totals.clear()
+            self.latencies.clear()
+            self.started = time.time()
+
+
+_recorder = UsageRecorder()
+
+def get_usage_recorder() -> UsageRecorder:
+    return _recorder
@@ -1,48 +1,176 @@
-import chromadb
+from enum import Enum, auto
+import os
+import tempfile
+import threading
+from typing import Dict, List
+from .embedding import Embedder, get_embedder
+from .filters import matches_where
+from .numpy_index import shared_index
+from ....metrics import histogram, timed
+
+DB_SECONDS = histogram("btb_db_seconds", "Catalog store call latency", ["store", "op"])
+
+class VectorBackend(Enum):
+    """Enum representing the available vector index implementations."""
+    CHROMA = auto()
+    NUMPY = auto()
+    MEMORY = auto()  # numpy index in a per-process throwaway directory, for offline benchmarks
+
+def default_vector_backend() -> VectorBackend:
+    # BTB_VECTOR_BACKEND=numpy selects the in-memory index
+    name = os.environ.get("BTB_VECTOR_BACKEND", "chroma")
+    try:
+        return VectorBackend[name.upper()]
+    except KeyError:
+        valid = ", ".join(backend.name.lower() for backend in VectorBackend)
+        raise ValueError(f"Unknown BTB_VECTOR_BACKEND {name!r}, expected one of: {valid}") from None
+
+_memory_path = None
+_memory_path_lock = threading.Lock()
+
+def _ephemeral_path() -> str:
+    # One directory per process so every VectorDB built by a request sees the same index
+    global _memory_path
+    with _memory_path_lock:
+        if _memory_path is None:
+            _memory_path = tempfile.mkdtemp(prefix="btb-vectors-")
+        return _memory_path
+
+def _as_lists(vectors):
+    return [vector.tolist() for vector in vectors]
 
 class VectorDB:
-    def __init__(self):
-        self.client = chromadb.PersistentClient(path="chroma_db")
-        self.collection = self.client.get_or_create_collection("tool_descriptions")
+    def __init__(self, backend: VectorBackend | None = None, path: str | None = None, quantize: bool | None = None, embedder: Embedder | None = None):
+        self.backend = backend or default_vector_backend()
+        # Embeddings are always computed here and handed to the index precomputed
+        self.embedder = embedder or get_embedder()
+        if self.backend == VectorBackend.MEMORY:
+            self.backend = VectorBackend.NUMPY
+            path = path or _ephemeral_path()
+        self.path = path
+        self._client = None
+        self._collection = None
+        if self.backend == VectorBackend.CHROMA:
+            pass
+        elif self.backend == VectorBackend.NUMPY:
+            if quantize is None:
+                quantize = os.environ.get("BTB_VECTOR_QUANTIZE", "") == "1"
+            self.index = shared_index(path or "vector_index", quantize)
+        else:
+            raise ValueError(f"Unsupported vector backend: {self.backend}")
+
+    @property
+    def client(self):
+        # chromadb is imported and opened on first use
+        if self._client is None:
+            import chromadb
+            self._client = chromadb.PersistentClient(path=self.path or "chroma_db")
+        return self._client
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = self.client.get_or_create_collection("tool_descriptions")
+        return self._collection
 
     def clear_collection(self):
+        if self.backend == VectorBackend.NUMPY:
+            self.index.clear()
+            return
         self.client.delete_collection("tool_descriptions")
+        self._collection = None
 
-    def add_tool(self, id: str, description: str):
+    def add_tool(self, id: str, description: str, metadata: Dict | None = None):
+        self.add_tools([id], [description], [metadata] if metadata else None)
+
+    @timed(DB_SECONDS, store="vector", op="add_tools")
+    def add_tools(self, ids: List[str], descriptions: List[str], metadatas: List[Dict] | None = None):
         # document is description of a tool
-        # we need to embed the document and add it to the vector database
+        # embed all documents in one batch and add them to the vector database
+        embeddings = self.embedder.embed(descriptions)
+        if self.backend == VectorBackend.NUMPY:
+            self.index.add(ids, embeddings, documents=descriptions, metadatas=metadatas)
+            return
         self.collection.add(
-            documents=[description],
-            ids=[id],
+            documents=descriptions,
+            embeddings=_as_lists(embeddings),
+            metadatas=metadatas,
+            ids=ids,
         )
 
-    def query(self, query: str):
+    @timed(DB_SECONDS, store="vector", op="query")
+    def query(self, query: str, n_results: int = 1, where: Dict | None = None):
         # query is a description of a tool
         # we need to embed the query and search the vector database
+        # where pre-filters candidates on tool metadata before ranking
+        embedding = self.embedder.embed([query])
+        if self.backend == VectorBackend.NUMPY:
+            predicate = (lambda metadata: matches_where(metadata, where)) if where else None
+            return self.index.query(embedding, n_results=n_results, predicate=predicate)
         results = self.collection.query(
-            query_texts=[query],
-            n_results=1,
+            query_embeddings=_as_lists(embedding),
+            n_results=n_results,
+            where=where,
         )
         return results
 
     def get_tool(self, id: str):
         # get a tool from the vector database
+        return self.get_tools([id])
+
+    @timed(DB_SECONDS, store="vector", op="get_tools")
+    def get_tools(self, ids: List[str]):
+        if self.backend == VectorBackend.NUMPY:
+            return self.index.get(ids)
         results = self.collection.get(
-            ids=[id],
+            ids=ids,
+            include=["documents", "metadatas"],
         )
         return results
 
+    @timed(DB_SECONDS, store="vector", op="set_metadata")
+    def set_metadata(self, ids: List[str], metadatas: List[Dict]):
+        if self.backend == VectorBackend.NUMPY:
+            self.index.set_metadata(ids, metadatas)
+            return
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    @timed(DB_SECONDS, store="vector", op="remove_tool")
     def remove_tool(self, id: str):
         # remove a tool from the vector database
+        if self.backend == VectorBackend.NUMPY:
+            self.index.delete([id])
+            return
         self.collection.delete(
             ids=[id],
         )
-    
-    def update_tool(self, id: str, description: str):
+
+    @timed(DB_SECONDS, store="vector", op="remove_tools")
+    def remove_tools(self, ids: List[str]):
+        if self.backend == VectorBackend.NUMPY:
+            self.index.delete(ids)
+            return
+        self.collection.delete(ids=ids)
+
+    def compact(self):
+        # Drop tombstoned rows now rather than waiting for compact_ratio; Chroma reclaims space itself
+        if self.backend == VectorBackend.NUMPY:
+            self.index.compact()
+
+    @timed(DB_SECONDS, store="vector", op="update_tool")
+    def update_tool(self, id: str, description: str, metadata: Dict | None = None):
 
         if description is not None:
+            embedding = self.embedder.embed([description])
+            if self.backend == VectorBackend.NUMPY:
+                self.index.update(id, embedding, document=description, metadata=metadata)
+                return
             # update a tool in the vector database
             self.collection.update(
                 ids=[id],
                 documents=[description],
+                embeddings=_as_lists(embedding),
+                metadatas=[metadata] if metadata else None,
             )
+        elif metadata is not None:
+            self.set_metadata([id], [metadata])
@@ -1,18 +1,15 @@
-from anthropic import Anthropic
-from anthropic.types.content_block import ContentBlock
-import weave
+from ... import tracing
 import dotenv
-from mdextractor import extract_md_blocks
-from typing import Dict, Optional, List
-from enum import Enum
-
+from .helpers.artifacts import load_artifact, save_artifact
 from .helpers.marker import Marker, parse_marked_blocks
-from .helpers.backend import BackendType, AgentBackend
+from .helpers.backend import BackendType
+from .helpers.routing import create_backend
+from .helpers.scheduler import Priority
 
 dotenv.load_dotenv()
 
 class ToolInvocationAgent:
-    def __init__(self, backend: BackendType = BackendType.ANTHROPIC):
+    def __init__(self, backend: BackendType | None = None, model: str | None = None):
         self.system_prompt = """You are a specialized code generation assistant focused on creating command line code for AI agents. 
 Your primary role is to:
 1. Take in a tool id, description, and implementation
@@ -41,13 +38,13 @@ Output:
 python abc-def-ghi.py "hello world"
 # END_IMPLEMENTATION
 """
-        self.backend = AgentBackend(backend, self.system_prompt)
+        self.backend = create_backend("invoker", self.system_prompt, Priority.NORMAL, backend, model)
 
     # def format_command(self, id: str, command: str) -> str:
     #     parts = command.split(' ')
     #     return parts[0] + ' ' + id + '.py ' + ' '.join(parts[1:])
 
-    @weave.op
+    @tracing.op
     def generate_invocation(
         self,
         id: str,
@@ -61,9 +58,8 @@ python abc-def-ghi.py "hello world"
     ) -> str:
         if load_file_name:
             try:
-                with open(load_file_name, "r") as f:
-                    command_implementation = f.read()
-                    return parse_marked_blocks(Marker.IMPLEMENTATION, command_implementation)
+                command_implementation = load_artifact(load_file_name)
+                return parse_marked_blocks(Marker.IMPLEMENTATION, command_implementation)
             except Exception as e:
                 return f"Failed to load file: {str(e)}"
 
@@ -75,12 +71,8 @@ python abc-def-ghi.py "hello world"
             f"SUMMARY: {summary}",
             f"implementation: {implementation}",
         ])
-        try:
-            command_implementation = self.backend.generate(prompt)
-            if save_file_name:
-                with open(save_file_name, "w") as f:
-                    f.write(command_implementation)
-        except Exception as e:
-            return f"Failed to generate main function: {str(e)}"
+        command_implementation = self.backend.generate(prompt)
+        if save_file_name:
+            save_artifact(save_file_name, command_implementation)
 
         return parse_marked_blocks(Marker.IMPLEMENTATION, command_implementation)
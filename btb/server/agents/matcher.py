@@ -1,18 +1,15 @@
-import os
-from anthropic.types.content_block import ContentBlock
-import weave
+from ... import tracing
 import dotenv
-import re
-from mdextractor import extract_md_blocks
-from typing import Dict, Optional, List
-from enum import Enum
+from .helpers.artifacts import load_artifact, save_artifact
 from .helpers.marker import Marker, parse_marked_blocks
-from .helpers.backend import BackendType, AgentBackend
+from .helpers.backend import BackendType
+from .helpers.routing import create_backend
+from .helpers.scheduler import Priority
 
 dotenv.load_dotenv()
 
 class ToolMatcherAgent:
-    def __init__(self, backend: BackendType = BackendType.ANTHROPIC):
+    def __init__(self, backend: BackendType | None = None, model: str | None = None):
         self.system_prompt = """You are a specialized code matching assistant focused on determining if a tool with a given description can be used to accomplish another task described to you.
 Your primary role is to:
 1. Take in code blocks and description of the code from a previous response
@@ -33,31 +30,26 @@ example 2:
 FALSE
 # END_MATCH
 """
-        self.backend = AgentBackend(backend, self.system_prompt)
+        self.backend = create_backend("matcher", self.system_prompt, Priority.HIGH, backend, model)
 
-    @weave.op
+    @tracing.op
     def match_tool(self, task_description: str, tool_description: str, tool_implementation: str, load_file_name: str | None = None, save_file_name: str | None = None) -> str:
         if load_file_name:
             try:
-                with open(load_file_name, "r") as f:
-                    return f.read()
+                return load_artifact(load_file_name)
             except Exception as e:
                 return f"Failed to load file: {str(e)}"
 
-        try:
-            prompt = f"""
+        prompt = f"""
 Task description: {task_description}
 Tool description: {tool_description}
 Tool Implementation: {tool_implementation}
 
 Can this tool be used to accomplish the task?
 """
-            with_main_fn = self.backend.generate(prompt)
-        except Exception as e:
-            return f"Failed to generate main function: {str(e)}"
+        with_main_fn = self.backend.generate(prompt)
 
         match = parse_marked_blocks(Marker.MATCH, with_main_fn)
         if save_file_name:
-            with open(save_file_name, "w") as f:
-                f.write(match)
+            save_artifact(save_file_name, match)
         return match
@@ -1,12 +1,12 @@
-from anthropic import Anthropic
-import os
 import json
-from typing import List, Dict, Optional, Union, Any, Literal
+from typing import List, Dict, Optional
 import argparse
-import weave
-from enum import Enum, auto
-import openai
-from agents.helpers.backend import BackendType, AgentBackend
+import os
+import warnings
+from ... import tracing
+from .helpers.backend import BackendType
+from .helpers.routing import create_backend
+from .helpers.scheduler import Priority
 
 class RequirementResolverAgent:
     """
@@ -14,16 +14,12 @@ class RequirementResolverAgent:
     and determine the necessary pip libraries to accomplish the task.
     """
     
-    def __init__(self, 
-                 api_key: Optional[str] = None, 
-                 backend_type: BackendType = BackendType.ANTHROPIC,
-                 model: Optional[str] = None):
+    def __init__(self, backend: BackendType | None = None, model: Optional[str] = None):
         """
         Initialize the RequirementResolverAgent.
         
         Args:
-            api_key: API key for the selected backend. If None, will try to get from environment variable.
-            backend_type: The type of LLM backend to use (default: ANTHROPIC)
+            backend: The type of LLM backend to use (default: the requirement_resolver route, see routing.py)
             model: The specific model to use (default: None, will use backend default)
         """
         self.system_prompt = """You are a specialized AI assistant focused on determining the necessary Python libraries needed to accomplish a given task.
@@ -54,14 +50,9 @@ Return your response in the following JSON format:
 Be thorough but practical - include all necessary libraries but avoid unnecessary ones.
 """
         # Initialize the backend
-        self.backend = AgentBackend(
-            backend_type=backend_type,
-            system_prompt=self.system_prompt,
-            api_key=api_key,
-            model=model
-        )
+        self.backend = create_backend("requirement_resolver", self.system_prompt, Priority.NORMAL, backend, model)
 
-    @weave.op
+    @tracing.op
     def resolve_requirements(self, task_description: str) -> Dict:
         """
         Analyze a task description and determine the necessary pip libraries.
@@ -107,6 +98,20 @@ Be thorough but practical - include all necessary libraries but avoid unnecessar
                 "error": str(e)
             }
     
+    def resolve_packages(self, task_description: str) -> List[str]:
+        """
+        Pip names of the essential libraries for a task, without versions: the
+        dependency cache pins them (see helpers/dependencies.py).
+        
+        Returns:
+            The package names, empty if resolution failed
+        """
+        resolved = self.resolve_requirements(task_description)
+        if not resolved["success"]:
+            return []
+        libraries = resolved["requirements"].get("libraries", [])
+        return [lib["name"] for lib in libraries if lib.get("name") and lib.get("essential", True)]
+
     def generate_requirements_txt(self, resolved_requirements: Dict, output_file: str = "requirements.txt") -> str:
         """
         Generate a requirements.txt file from the resolved requirements.
@@ -160,19 +165,24 @@ def main():
     parser = argparse.ArgumentParser(description="Resolve Python package requirements for a given task")
     parser.add_argument("task", help="Description of the task to accomplish")
     parser.add_argument("--output", "-o", default="requirements.txt", help="Output file for requirements")
-    parser.add_argument("--api-key", help="API key (optional if set as environment variable)")
     parser.add_argument("--backend", choices=["anthropic", "openai"], default="anthropic", 
                         help="LLM backend to use (default: anthropic)")
     parser.add_argument("--model", help="Specific model to use (optional)")
+    parser.add_argument("--api-key", help="Deprecated: set ANTHROPIC_API_KEY or OPENAI_API_KEY instead")
     
     args = parser.parse_args()
     
     # Convert string backend choice to enum
     backend_type = BackendType.ANTHROPIC if args.backend == "anthropic" else BackendType.OPENAI
+
+    if args.api_key:
+        # Backends read their key from the environment, so pass it on that way
+        env_variable = "ANTHROPIC_API_KEY" if backend_type == BackendType.ANTHROPIC else "OPENAI_API_KEY"
+        warnings.warn(f"--api-key is deprecated and will be removed; set {env_variable} instead", DeprecationWarning, stacklevel=2)
+        os.environ[env_variable] = args.api_key
     
     resolver = RequirementResolverAgent(
-        api_key=args.api_key,
-        backend_type=backend_type,
+        backend=backend_type,
         model=args.model
     )
     resolved = resolver.resolve_requirements(args.task)
@@ -1,18 +1,15 @@
-import os
-from anthropic.types.content_block import ContentBlock
-import weave
+from ... import tracing
 import dotenv
-import re
-from mdextractor import extract_md_blocks
-from typing import Dict, Optional, List
-from enum import Enum
+from .helpers.artifacts import load_artifact, save_artifact
 from .helpers.marker import Marker, parse_marked_blocks
-from .helpers.backend import BackendType, AgentBackend
+from .helpers.backend import BackendType
+from .helpers.routing import create_backend
+from .helpers.scheduler import Priority
 
 dotenv.load_dotenv()
 
 class ToolSummaryAgent:
-    def __init__(self, backend: BackendType = BackendType.ANTHROPIC):
+    def __init__(self, backend: BackendType | None = None, model: str | None = None):
         self.system_prompt = """You are a specialized code designer
 Your primary role is to:
 1. Take in a specific task description
@@ -33,24 +30,19 @@ Output:
 Find the top N results in google given a specific number N and a search query. Return a List of URLs
 # END_SUMMARY
 """
-        self.backend = AgentBackend(backend, self.system_prompt)
+        self.backend = create_backend("summary", self.system_prompt, Priority.HIGH, backend, model)
 
-    @weave.op
+    @tracing.op
     def summarize(self, task_description: str, load_file_name: str | None = None, save_file_name: str | None = None) -> str:
         if load_file_name:
             try:
-                with open(load_file_name, "r") as f:
-                    return f.read()
+                return load_artifact(load_file_name)
             except Exception as e:
                 return f"Failed to load file: {str(e)}"
 
-        try:
-            with_main_fn = self.backend.generate(task_description)
-        except Exception as e:
-            return f"Failed to generate main function: {str(e)}"
+        with_main_fn = self.backend.generate(task_description)
 
         summary = parse_marked_blocks(Marker.SUMMARY, with_main_fn)
         if save_file_name:
-            with open(save_file_name, "w") as f:
-                f.write(summary)
+            save_artifact(save_file_name, summary)
         return summary
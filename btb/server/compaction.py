@@ -0,0 +1,177 @@
+"""
+Merge near-duplicate catalog tools.
+
+Every matcher FALSE generates a new tool, so over time the catalog collects
+variants of the same tool. Compaction groups tools whose descriptions embed
+close together and whose implementations are (nearly) the same, keeps the most
+successfully used tool of each group and retires the rest: their usage and run
+statistics are added to the kept tool, their rows and index entries are
+removed, and their ids become aliases, so get_tool and record_usage on a
+retired id serve the canonical tool.
+
+Only tools with the same language, argument types and environment variables
+are merged, so a command built for a retired tool still runs against its
+replacement.
+
+    python -m btb.server.compaction --dry-run
+
+The server runs it periodically when BTB_COMPACTION_INTERVAL (seconds) is set.
+"""
+import argparse
+from datetime import datetime
+import difflib
+import json
+import multiprocessing
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .agents.helpers.db_helper import DBAdapter
+from .agents.helpers.embedding import get_embedder
+from .agents.helpers.feedback import success_rate
+from .. import metrics
+
+COMPACTION_SECONDS = metrics.histogram("btb_compaction_seconds", "Duration of catalog compaction runs")
+TOOLS_RETIRED = metrics.counter("btb_tools_retired_total", "Tools merged into a canonical tool by compaction")
+
+
+def signature(tool: Dict) -> Tuple:
+    # Tools are only interchangeable if a command built for one runs the other
+    return (
+        tool.get("language") or "python",
+        tuple(argument_type.strip().lower() for argument_type in tool["argument_types"]),
+        tuple(sorted(tool["env_variables"])),
+    )
+
+
+def score(tool: Dict) -> Tuple:
+    # Most successful use first, then most recently used, then oldest
+    last_used = tool.get("last_used_at")
+    created = tool.get("created_at")
+    return (
+        (tool.get("usage_count") or 0) * success_rate(tool),
+        last_used.timestamp() if isinstance(last_used, datetime) else 0.0,
+        -created.timestamp() if isinstance(created, datetime) else 0.0,
+    )
+
+
+def implementation_similarity(a: Dict, b: Dict, threshold: float) -> bool:
+    if a["implementation_hash"] == b["implementation_hash"]:
+        return True
+    matcher = difflib.SequenceMatcher(None, a["implementation"] or "", b["implementation"] or "", autojunk=False)
+    # The quick upper bounds rule out most pairs before the full comparison
+    return matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold
+
+
+def plan_merges(tools: List[Dict], vectors: np.ndarray, description_threshold: float, implementation_threshold: float) -> List[Tuple[str, List[str]]]:
+    """
+    Group tools into (canonical id, retired ids). Tools are visited best score
+    first and each joins the first canonical it is similar to, so every retired
+    tool is directly similar to its canonical (no chaining through neighbours).
+    """
+    groups: Dict[Tuple, List[int]] = {}
+    for i, tool in enumerate(tools):
+        groups.setdefault(signature(tool), []).append(i)
+
+    merges = []
+    for members in groups.values():
+        members.sort(key=lambda i: score(tools[i]), reverse=True)
+        canonicals: List[int] = []
+        retired: Dict[int, List[str]] = {}
+        for i in members:
+            similarities = vectors[canonicals] @ vectors[i] if canonicals else []
+            for canonical, similarity in zip(canonicals, similarities):
+                if similarity >= description_threshold and implementation_similarity(tools[canonical], tools[i], implementation_threshold):
+                    retired[canonical].append(tools[i]["id"])
+                    break
+            else:
+                canonicals.append(i)
+                retired[i] = []
+        merges.extend((tools[canonical]["id"], ids) for canonical, ids in retired.items() if ids)
+    return merges
+
+
+def compact_catalog(description_threshold: float = 0.92, implementation_threshold: float = 0.8, dry_run: bool = False) -> Dict:
+    """
+    Args:
+        description_threshold: Cosine similarity of description embeddings for two tools to merge
+        implementation_threshold: difflib ratio of implementations for two tools to merge
+        dry_run: Only report the merges
+    Returns:
+        The number of tools before and after, and the merges as {canonical id: retired ids}
+    """
+    start = time.perf_counter()
+    db = DBAdapter()
+    try:
+        tools = db.list_tools()
+        if len(tools) < 2:
+            return {"tools": len(tools), "remaining": len(tools), "merges": {}}
+        vectors = np.stack(get_embedder().embed([tool["description"] for tool in tools])).astype(np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        merges = plan_merges(tools, vectors, description_threshold, implementation_threshold)
+        retired = sum(len(ids) for _, ids in merges)
+        if not dry_run and merges:
+            for canonical_id, ids in merges:
+                db.retire_tools(canonical_id, ids)
+                TOOLS_RETIRED.inc(len(ids))
+            db.vector_db.compact()
+        return {"tools": len(tools), "remaining": len(tools) - retired, "merges": dict(merges)}
+    finally:
+        db.close()
+        COMPACTION_SECONDS.observe(time.perf_counter() - start)
+
+
+def _run_logged(**kwargs):
+    try:
+        report = compact_catalog(**kwargs)
+        print(f"Compaction: {report['tools']} tools, {report['remaining']} after merging {len(report['merges'])} groups")
+    except Exception as e:
+        print(f"Compaction failed: {e}")
+
+
+class CompactionSchedule:
+    """
+    Runs compaction every interval seconds. In multi-worker mode the master calls
+    tick() from its loop and each run gets its own process, so the master stays
+    single threaded for forking; start_thread() is for the single-process server.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_run = time.monotonic() + interval
+        self.process = None
+
+    def tick(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        if time.monotonic() < self.next_run:
+            return
+        self.next_run = time.monotonic() + self.interval
+        self.process = multiprocessing.get_context("fork").Process(target=_run_logged, name="btb-compaction", daemon=True)
+        self.process.start()
+
+    def start_thread(self):
+        def loop():
+            while True:
+                time.sleep(self.interval)
+                _run_logged()
+
+        thread = threading.Thread(target=loop, name="btb-compaction", daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge near-duplicate catalog tools")
+    parser.add_argument("--description-threshold", type=float, default=0.92)
+    parser.add_argument("--implementation-threshold", type=float, default=0.8)
+    parser.add_argument("--dry-run", action="store_true", help="Print the merges without applying them")
+    args = parser.parse_args()
+    report = compact_catalog(args.description_threshold, args.implementation_threshold, args.dry_run)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import contextvars
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .agents.helpers.cancellation import CancelToken, RequestCancelled, current_token
+
+class StageTimeoutError(TimeoutError):
+    """A single stage ran longer than its timeout."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """The whole graph ran past its deadline."""
+
+
+class Stage:
+    """
+    One step of a StageGraph.
+
+    fn is called with one keyword argument per name in inputs, taken from the
+    initial values or from the stages of those names, and its return value is
+    published under the stage's own name.
+    """
+
+    def __init__(self, name: str, fn: Callable[..., Any], inputs: Iterable[str] = (), timeout: Optional[float] = None):
+        self.name = name
+        self.fn = fn
+        self.inputs = list(inputs)
+        self.timeout = timeout
+
+
+class StageGraph:
+    """
+    Runs stages concurrently as soon as their inputs are available.
+
+    The first failing stage, stage timeout or deadline cancels the run: stages
+    that have not started are never started, and the shared CancelToken is set
+    so running stages stop at their next cancellation check (for example while
+    queued in the LLM scheduler). Those abandoned stages may still be running
+    when run() raises, so resources they share are released through on_settled.
+    """
+
+    # Stages mostly block on network calls, so threads are cheap here
+    executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="btb-stage")
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names must be unique")
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done or name not in self.stages:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage graph has a cycle through {name}")
+            visiting.add(name)
+            for dependency in self.stages[name].inputs:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def run(self, initial: Dict[str, Any], timeout: Optional[float] = None, on_stage_done: Optional[Callable[[str, float], None]] = None, on_settled: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        """
+        Execute every stage.
+
+        Args:
+            initial: Values available to stages before any stage runs
+            timeout: Overall deadline in seconds for the whole graph
+            on_stage_done: Called with (stage name, seconds) after each stage succeeds
+            on_settled: Called once no stage of this run is executing any more; after
+                an abort that can be after run() has raised, from the last stage's thread
+        Returns:
+            initial merged with every stage's result, keyed by stage name
+        """
+        for stage in self.stages.values():
+            missing = [name for name in stage.inputs if name not in initial and name not in self.stages]
+            if missing:
+                if on_settled:
+                    on_settled()
+                raise ValueError(f"Stage {stage.name} depends on unknown inputs {missing}")
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        token = CancelToken(deadline)
+        results = dict(initial)
+        remaining = dict(self.stages)
+        running: Dict[Future, tuple] = {}
+
+        def start_ready():
+            for name, stage in list(remaining.items()):
+                if all(dependency in results for dependency in stage.inputs):
+                    del remaining[name]
+                    kwargs = {dependency: results[dependency] for dependency in stage.inputs}
+                    context = contextvars.copy_context()
+                    context.run(current_token.set, token)
+                    future = self.executor.submit(context.run, stage.fn, **kwargs)
+                    running[future] = (stage, time.monotonic())
+
+        try:
+            start_ready()
+            while running:
+                now = time.monotonic()
+                wake = [started + stage.timeout for stage, started in running.values() if stage.timeout is not None]
+                if deadline is not None:
+                    wake.append(deadline)
+                wait_for = max(0.0, min(wake) - now) if wake else None
+                done, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    stage, started = running.pop(future)
+                    try:
+                        results[stage.name] = future.result()
+                    except RequestCancelled:
+                        raise DeadlineExceededError(f"Request cancelled during stage {stage.name}: {token.reason}")
+                    if on_stage_done:
+                        on_stage_done(stage.name, time.monotonic() - started)
+
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    pending = [stage.name for stage, _ in running.values()] + list(remaining)
+                    raise DeadlineExceededError(f"Request deadline of {timeout}s exceeded; unfinished stages: {pending}")
+                for stage, started in running.values():
+                    if stage.timeout is not None and now - started >= stage.timeout:
+                        raise StageTimeoutError(f"Stage {stage.name} exceeded its {stage.timeout}s timeout")
+                start_ready()
+
+            if remaining:
+                raise ValueError(f"Stages never became ready: {list(remaining)}")
+            return results
+        finally:
+            if running or remaining:
+                token.cancel("request aborted")
+                for future in running:
+                    future.cancel()
+            if on_settled:
+                _when_all_done(list(running), on_settled)
+
+
+def _when_all_done(futures: List[Future], callback: Callable[[], None]):
+    # Call callback once every future is done (at once if there are none)
+    if not futures:
+        callback()
+        return
+    lock = threading.Lock()
+    left = [len(futures)]
+
+    def done(_):
+        with lock:
+            left[0] -= 1
+            last = left[0] == 0
+        if last:
+            callback()
+
+    for future in futures:
+        future.add_done_callback(done)
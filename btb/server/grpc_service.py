@@ -0,0 +1,184 @@
+"""
+gRPC ToolAgent service, served next to the Flask JSON API.
+
+The RPCs run the same request path as /api/genTool (admission control, the
+stage graph, persistence), so both transports share queues and metrics. The
+schema is in btb/rpc.py.
+
+    GenerateTool   one task, like POST /api/genTool
+    GenerateTools  several tasks handled concurrently, with a status per task
+    StreamTool     one task, with a ProgressEvent as every stage finishes and
+                   the result in the last event
+    GetTool        a catalog tool by id, like GET /api/tools/<id>
+
+Implementations whose hash the client lists in known_hashes are left out of
+responses. The server starts when --grpc-port (or BTB_GRPC_PORT) is set; with
+workers, every worker serves the port (SO_REUSEPORT).
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import queue
+import threading
+import time
+
+import grpc
+
+from .admission import parse_priority
+from .agents.helpers.db_helper import DBAdapter
+from .. import metrics, rpc
+
+RPC_SECONDS = metrics.histogram("btb_grpc_seconds", "gRPC ToolAgent latency by method and status code", ["method", "code"])
+
+# HTTP statuses of serve_tool_request as gRPC codes
+STATUS_CODES = {
+    400: grpc.StatusCode.INVALID_ARGUMENT,
+    404: grpc.StatusCode.NOT_FOUND,
+    429: grpc.StatusCode.RESOURCE_EXHAUSTED,
+    503: grpc.StatusCode.UNAVAILABLE,
+    504: grpc.StatusCode.DEADLINE_EXCEEDED,
+}
+
+# Tasks of one GenerateTools call handled at a time; admission control still applies to each
+BATCH_CONCURRENCY = 8
+
+
+class ToolAgentService:
+    def __init__(self, server):
+        """
+        Args:
+            server: The ToolAgentServer whose serve_tool_request handles the tasks
+        """
+        self.server = server
+        self.batch_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="btb-grpc-batch")
+
+    def _caller(self, request, context) -> str:
+        return request.caller or dict(context.invocation_metadata()).get("x-btb-caller") or context.peer() or "unknown"
+
+    def _serve(self, request, context, on_progress=None):
+        """(status, body) of serve_tool_request for a ToolRequest."""
+        if not request.task:
+            return 400, {"error": "Missing task in request"}
+        try:
+            constraints = json.loads(request.constraints_json) if request.constraints_json else None
+        except ValueError as e:
+            return 400, {"error": f"constraints_json is not valid JSON: {e}"}
+        priority = parse_priority(request.priority or None)
+        return self.server.serve_tool_request(request.task, constraints, self._caller(request, context), priority, on_progress)
+
+    def _result(self, request, status: int, body: dict):
+        if status != 200:
+            return rpc.ToolResult(status=status, error=body.get("error", ""))
+        return rpc.ToolResult(status=status, response=rpc.tool_response(body, request.known_hashes))
+
+    def _abort(self, context, status: int, body: dict):
+        if "retry_after" in body:
+            context.set_trailing_metadata((("retry-after", str(body["retry_after"])),))
+        context.abort(STATUS_CODES.get(status, grpc.StatusCode.INTERNAL), body.get("error", ""))
+
+    def generate_tool(self, request, context):
+        status, body = self._serve(request, context)
+        if status != 200:
+            self._abort(context, status, body)
+        return rpc.tool_response(body, request.known_hashes)
+
+    def generate_tools(self, request, context):
+        def handle(item):
+            status, body = self._serve(item, context)
+            return self._result(item, status, body)
+
+        return rpc.BatchToolResponse(results=list(self.batch_pool.map(handle, request.requests)))
+
+    def stream_tool(self, request, context):
+        events = queue.Queue()
+        done = object()
+
+        def run():
+            try:
+                status, body = self._serve(request, context, lambda stage, seconds: events.put(rpc.ProgressEvent(stage=stage, seconds=seconds)))
+                events.put(rpc.ProgressEvent(stage="done", result=self._result(request, status, body)))
+            except Exception as e:
+                events.put(rpc.ProgressEvent(stage="done", result=rpc.ToolResult(status=500, error=str(e))))
+            finally:
+                events.put(done)
+
+        # A client that goes away stops receiving events; the request itself still completes
+        threading.Thread(target=run, name="btb-grpc-stream", daemon=True).start()
+        while True:
+            event = events.get()
+            if event is done:
+                return
+            yield event
+
+    def get_tool(self, request, context):
+        # ids retired by compaction resolve to the tool that replaced them
+        from .server import with_resolution
+
+        db_helper = DBAdapter()
+        try:
+            tool = db_helper.get_tool_summary(request.id)
+            # the implementation is only read when the client does not have it already
+            if tool is not None and tool["implementation_hash"] not in request.known_hashes:
+                implementation = db_helper.get_implementation(tool["id"])
+                tool = {**tool, **implementation} if implementation else None
+        finally:
+            db_helper.close()
+        if tool is None:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Tool {request.id} not found")
+        return rpc.tool_descriptor(with_resolution(tool), request.known_hashes)
+
+    def handler(self) -> grpc.GenericRpcHandler:
+        handlers = {}
+        for method, (request_type, response_type, streaming) in rpc.METHODS.items():
+            behaviour = self._timed(method, getattr(self, _snake_case(method)), streaming)
+            factory = grpc.unary_stream_rpc_method_handler if streaming else grpc.unary_unary_rpc_method_handler
+            handlers[method] = factory(
+                behaviour,
+                request_deserializer=rpc.message_class(request_type).FromString,
+                response_serializer=rpc.message_class(response_type).SerializeToString,
+            )
+        return grpc.method_handlers_generic_handler(rpc.SERVICE, handlers)
+
+    def _timed(self, method: str, behaviour, streaming: bool):
+        def observe(context, start):
+            code = context.code()
+            RPC_SECONDS.labels(method=method, code=(code or grpc.StatusCode.OK).name).observe(time.perf_counter() - start)
+
+        if streaming:
+            def timed_stream(request, context):
+                start = time.perf_counter()
+                try:
+                    yield from behaviour(request, context)
+                finally:
+                    observe(context, start)
+            return timed_stream
+
+        def timed(request, context):
+            start = time.perf_counter()
+            try:
+                return behaviour(request, context)
+            finally:
+                observe(context, start)
+        return timed
+
+
+def _snake_case(name: str) -> str:
+    return "".join(f"_{c.lower()}" if c.isupper() else c for c in name).lstrip("_")
+
+
+def start_grpc_server(server, port: int, host: str = "0.0.0.0", max_workers: int = 32) -> grpc.Server:
+    """
+    Serve the ToolAgent service of server on host:port until the process exits.
+
+    Args:
+        max_workers: Concurrent RPCs; a StreamTool call holds one for the whole request
+    """
+    service = ToolAgentService(server)
+    grpc_server = grpc.server(
+        ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="btb-grpc"),
+        handlers=[service.handler()],
+        # Worker processes bind the same port; the kernel spreads connections across them
+        options=[("grpc.so_reuseport", 1)],
+    )
+    grpc_server.add_insecure_port(f"{host}:{port}")
+    grpc_server.start()
+    return grpc_server
@@ -0,0 +1,228 @@
+"""
+Pre-forked WSGI serving.
+
+The master binds the listening socket, forks the workers and supervises them.
+Each worker builds its own app after the fork, so no connections or threads are
+shared between processes, and serves requests from the inherited socket with
+a threaded werkzeug server.
+
+    SIGTERM / SIGINT  graceful shutdown: workers stop accepting, finish
+                      in-flight requests (up to graceful_timeout) and exit
+    SIGHUP            graceful restart of every worker
+
+A worker is also recycled after serving max_requests requests (plus a random
+jitter so they do not all restart at once).
+
+Workers share no memory, so per-process limits (the LLM scheduler's rate and
+concurrency limits, admission control) are split between them: the master
+exports BTB_WORKERS and each worker enforces its share, see
+scheduler.worker_share. Metrics are summed across workers through the
+snapshot directory the master exports as BTB_METRICS_DIR (a temporary one
+unless it is already set), so whichever worker answers a /metrics scrape
+reports the whole server, see metrics.py.
+"""
+import os
+import random
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from .. import metrics
+
+
+class _RequestCounter:
+    """WSGI middleware tracking in-flight requests and triggering recycling."""
+
+    def __init__(self, app, max_requests: int, on_limit: Callable[[], None]):
+        self.app = app
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        self.served = 0
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        from werkzeug.wsgi import ClosingIterator
+
+        with self.lock:
+            self.in_flight += 1
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            self._finished()
+            raise
+        # The server calls close() once the body is written, which is when the request is done
+        return ClosingIterator(response, self._finished)
+
+    def _finished(self):
+        with self.lock:
+            self.in_flight -= 1
+            self.served += 1
+            limit_reached = self.max_requests and self.served == self.max_requests
+        if limit_reached:
+            self.on_limit()
+
+
+class PreforkServer:
+    def __init__(self,
+                 app_factory: Callable[[], Callable],
+                 host: str = "0.0.0.0",
+                 port: int = 5000,
+                 workers: int = 2,
+                 max_requests: int = 1000,
+                 max_requests_jitter: int = 100,
+                 graceful_timeout: float = 30.0,
+                 on_tick: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            app_factory: Builds the WSGI app; called once in every worker
+            workers: Number of worker processes
+            max_requests: Requests a worker serves before it is replaced (0 disables recycling)
+            max_requests_jitter: Up to this many extra requests are added per worker
+            graceful_timeout: Seconds in-flight requests get to finish on shutdown
+            on_tick: Called periodically in the master, e.g. to supervise a helper process
+        """
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.on_tick = on_tick
+        self.children: Dict[int, float] = {}
+        self.socket = None
+        self.stopping = False
+        self.restart_requested = False
+        self.metrics_dir = None
+        self.owns_metrics_dir = False
+
+    def _prepare_metrics_dir(self):
+        self.metrics_dir = os.environ.get("BTB_METRICS_DIR")
+        if self.metrics_dir:
+            # Snapshots left by a previous run would be added to this one's totals
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            for name in os.listdir(self.metrics_dir):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.metrics_dir, name))
+        else:
+            self.metrics_dir = tempfile.mkdtemp(prefix="btb-metrics-")
+            self.owns_metrics_dir = True
+            os.environ["BTB_METRICS_DIR"] = self.metrics_dir
+
+    def run(self):
+        os.environ["BTB_WORKERS"] = str(self.workers)
+        self._prepare_metrics_dir()
+        self.socket = socket.create_server((self.host, self.port), backlog=2048)
+        self.socket.set_inheritable(True)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_restart)
+        print(f"Serving on {self.host}:{self.port} with {self.workers} workers (master pid {os.getpid()})")
+        try:
+            while not self.stopping:
+                self._reap()
+                if self.restart_requested:
+                    self.restart_requested = False
+                    self._signal_all(signal.SIGTERM)
+                while len(self.children) < self.workers and not self.stopping:
+                    self._spawn()
+                if self.on_tick:
+                    self.on_tick()
+                time.sleep(0.2)
+        finally:
+            self._shutdown()
+
+    def _handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def _handle_restart(self, signum, frame):
+        self.restart_requested = True
+
+    def _reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            if pid in self.children:
+                del self.children[pid]
+                metrics.retire(self.metrics_dir, pid)
+                code = os.waitstatus_to_exitcode(status)
+                if code != 0 and not self.stopping:
+                    print(f"Worker {pid} exited with {code}")
+
+    def _signal_all(self, signum):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                self.children.pop(pid, None)
+
+    def _shutdown(self):
+        self._signal_all(signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        self._signal_all(signal.SIGKILL)
+        self._reap()
+        self.socket.close()
+        if self.owns_metrics_dir:
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.time()
+            return
+        code = 1
+        try:
+            code = self._worker()
+        except BaseException as e:
+            print(f"Worker {os.getpid()} failed: {e}")
+        finally:
+            os._exit(code)
+
+    def _worker(self) -> int:
+        from werkzeug.serving import make_server
+
+        # The master decides when workers stop; a terminal Ctrl-C reaches the whole group
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        random.seed()
+
+        server = None
+        stopped = threading.Event()
+
+        def stop():
+            if not stopped.is_set():
+                stopped.set()
+                # shutdown() blocks until serve_forever returns, so it cannot run on the serving thread
+                threading.Thread(target=server.shutdown, daemon=True).start()
+
+        limit = self.max_requests + random.randint(0, self.max_requests_jitter) if self.max_requests else 0
+        app = _RequestCounter(self.app_factory(), limit, stop)
+        snapshots = metrics.start_snapshots(self.metrics_dir)
+        server = make_server(self.host, self.port, app, threaded=True, fd=self.socket.fileno())
+        # Track handler threads so server_close() can wait for responses still being flushed
+        server.daemon_threads = False
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop())
+        server.serve_forever()
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while app.in_flight and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if not app.in_flight:
+            server.server_close()
+        # The master folds this last snapshot into the retired totals once it reaps the worker
+        snapshots.set()
+        metrics.write_snapshot(self.metrics_dir)
+        return 0
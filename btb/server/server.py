@@ -1,97 +1,413 @@
 from .agents.generator import ToolGeneratorAgent
-from .agents import ToolFormatterAgent, ToolInvocationAgent, ToolGeneratorAgent, ToolSummaryAgent, ToolMatcherAgent
+from .agents import RequirementResolverAgent, ToolDebuggerAgent, ToolFormatterAgent, ToolInvocationAgent, ToolGeneratorAgent, ToolSummaryAgent, ToolMatcherAgent
 from .agents.helpers.db_helper import DBAdapter
-import weave
+from .agents.helpers.postgres import to_list, implementation_hash
+from .agents.helpers.usage import get_usage_recorder
+from .agents.helpers.artifacts import current_request_id, get_artifact_log
+from .agents.helpers.index_service import start_index_service
+from .agents.helpers.dependencies import ResolutionError, get_dependency_cache, normalize
+from .agents.helpers.sandbox import DEPENDENCY_FAILURE, smoke_test
+from .compaction import CompactionSchedule
+from .admission import AdmissionController, AdmissionRejected, parse_priority
+from .dag import Stage, StageGraph
+from .prefork import PreforkServer
+from .. import metrics, tracing
+from .agents.helpers.cancellation import CancelToken, RequestCancelled, check_cancelled, current_token
+from .agents.helpers.scheduler import LLMRequestError
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import uuid
 import argparse
+import logging
+import math
+import os
+import secrets
+import time
 from dotenv import load_dotenv
 load_dotenv()
 
-weave.init("wandb/zach-agent-project-v1")
+logger = logging.getLogger(__name__)
+
+# Per-stage timeouts and the overall request deadline, in seconds. The longest
+# chain (summary → candidates → candidate → matched → generated → command) fits
+# inside the default deadline; stored and usage run alongside command.
+STAGE_TIMEOUTS = {
+    "summary": 30,
+    "candidates": 10,
+    "candidate": 10,
+    "matched": 45,
+    "generated": 150,
+    "command": 45,
+    "stored": 10,
+    "usage": 10,
+}
+REQUEST_DEADLINE = float(os.environ.get("BTB_REQUEST_DEADLINE", "300"))
+# Debugger attempts on a generated tool that fails its smoke test
+MAX_REPAIRS = int(os.environ.get("BTB_MAX_REPAIRS", "2"))
+# New tools are validated after the response, by this many jobs at a time, each within this budget
+VALIDATION_WORKERS = int(os.environ.get("BTB_VALIDATION_WORKERS", "2"))
+VALIDATION_DEADLINE = float(os.environ.get("BTB_VALIDATION_DEADLINE", "900"))
+# Retrieved tools reranked by their execution record before the best one is matched
+RERANK_POOL = 3
+
+REQUEST_SECONDS = metrics.histogram("btb_request_seconds", "End-to-end /api/genTool latency", ["status"])
+REQUESTS_IN_FLIGHT = metrics.gauge("btb_requests_in_flight", "Tool requests being handled")
+STAGE_SECONDS = metrics.histogram("btb_stage_seconds", "Latency of each handle_tool_request stage", ["stage"])
+CATALOG_LOOKUPS = metrics.counter("btb_catalog_lookups_total", "Catalog lookups by outcome (hit reuses a tool)", ["result"])
+MATCHER_DECISIONS = metrics.counter("btb_matcher_decisions_total", "Matcher verdicts on retrieved candidates", ["decision"])
+TOOLS_GENERATED = metrics.counter("btb_tools_generated_total", "Tools generated because nothing in the catalog matched")
+VALIDATIONS = metrics.counter("btb_validations_total", "Background validations of new tools by final outcome", ["outcome"])
+TOOL_REPAIRS = metrics.counter("btb_tool_repairs_total", "Debugger repairs of generated tools by smoke test result afterwards", ["outcome"])
+
+def generate_tool(generator: ToolGeneratorAgent, formatter: ToolFormatterAgent, summary: str, id: str) -> dict:
+    """
+    Generate and format a tool for summary.
+
+    Returns:
+        The tool in the shape of DBAdapter.get_tool, so callers need not wait for the insert
+    Raises:
+        RuntimeError: if generation failed
+        LLMRequestError: if the generator's LLM call failed
+        RequestCancelled: if the request was cancelled meanwhile
+    """
+    generated = generator.generate_tool_code(summary, "python", save_file_name=f"generate:{id}")
+    if generated["success"] != str(True):
+        raise RuntimeError(generated["error"])
+    try:
+        generated['implementation'] = formatter.generate_main_function(generated["implementation"], save_file_name=f"formatted:{id}")
+    except RequestCancelled:
+        raise
+    except Exception:
+        # the unformatted implementation still works, it just lacks the main function wrapper
+        logger.warning("Formatting tool %s failed; keeping the generated implementation", id, exc_info=True)
+    TOOLS_GENERATED.inc()
+
+    return {
+        "id": id,
+        "description": summary,
+        "arguments": to_list(generated.get("arguments")),
+        "argument_types": to_list(generated.get("argument_types")),
+        "env_variables": to_list(generated.get("env_variables")),
+        "command": generated.get("command"),
+        "dependencies": to_list(generated.get("dependencies")),
+        "language": "python",
+        "implementation": generated.get("implementation"),
+        "implementation_hash": implementation_hash(generated.get("implementation")),
+        "usage_count": 0,
+        "success_count": 0,
+        "failure_count": 0,
+        "consecutive_failures": 0,
+        "runtime_seconds": 0.0,
+        "output_bytes": 0,
+        "validation": None,
+    }
+
+
+def resolve_dependencies(resolver: RequirementResolverAgent | None, tool: dict) -> dict:
+    """
+    Pin a new tool's dependencies and fill the wheelhouse with them. If pip
+    cannot resolve the declared names, the resolver is asked once for the right
+    pip packages.
+
+    Returns:
+        The tool, with its dependencies replaced if the resolver's resolved and the declared did not
+    """
+    cache = get_dependency_cache()
+    try:
+        cache.resolve(tool["dependencies"])
+        return tool
+    except ResolutionError as e:
+        error = str(e)
+    if resolver is None:
+        return tool
+    check_cancelled()
+    packages = resolver.resolve_packages("\n".join([
+        tool["description"],
+        f"The declared dependencies ({', '.join(tool['dependencies'])}) could not be installed: {error}",
+        "Implementation:",
+        tool["implementation"],
+    ]))
+    if not packages or normalize(packages) == normalize(tool["dependencies"]):
+        return tool
+    try:
+        cache.resolve(packages)
+    except ResolutionError:
+        return tool
+    return {**tool, "dependencies": packages}
+
+
+def with_resolution(tool: dict) -> dict:
+    # pinned requirements and wheelhouse files for the client's offline install, if resolved
+    resolution = get_dependency_cache().lookup(tool["dependencies"])
+    resolved = {"requirements": resolution.requirements, "wheels": resolution.wheels} if resolution else None
+    return {**tool, "resolved_dependencies": resolved}
+
+
+def validate_tool(debugger: ToolDebuggerAgent, tool: dict, command: str | None = None, max_repairs: int = MAX_REPAIRS, resolver: RequirementResolverAgent | None = None) -> dict:
+    """
+    Resolve a generated tool's dependencies, smoke test it in the sandbox and
+    let the debugger repair it while it fails, at most max_repairs times.
+
+    Returns:
+        The tool with the last implementation tried and its smoke test outcome in "validation"
+    Raises:
+        RequestCancelled: if the current CancelToken is cancelled or past its deadline
+    """
+    tool = resolve_dependencies(resolver, dict(tool))
+    result = smoke_test(tool["id"], tool["implementation"], tool["dependencies"], tool["env_variables"], command)
+    for _ in range(max_repairs):
+        check_cancelled()
+        # dependency failures are outside the implementation, so the debugger cannot fix them
+        if not result.failed or result.stderr.startswith(DEPENDENCY_FAILURE):
+            break
+        error = result.stderr or f"exited with code {result.returncode}\n{result.stdout}"
+        try:
+            fixed = debugger.fix_implementation(tool["implementation"], result.command, error, save_file_name=f"repair:{tool['id']}")
+        except RequestCancelled:
+            raise
+        except Exception:
+            logger.warning("Repairing tool %s failed", tool["id"], exc_info=True)
+            break
+        if not fixed.strip():
+            break
+        tool["implementation"] = fixed
+        result = smoke_test(tool["id"], fixed, tool["dependencies"], tool["env_variables"], command)
+        TOOL_REPAIRS.labels(outcome=result.outcome).inc()
+    tool["implementation_hash"] = implementation_hash(tool["implementation"])
+    tool["validation"] = result.outcome
+    return tool
+
+_validation_executor = ThreadPoolExecutor(max_workers=VALIDATION_WORKERS, thread_name_prefix="btb-validate")
+
+
+def _validate_and_update(tool: dict, command: str):
+    # Runs on _validation_executor, under its own deadline rather than the request's
+    token = CancelToken(time.monotonic() + VALIDATION_DEADLINE)
+    current_token.set(token)
+    db_helper = DBAdapter()
+    try:
+        validated = validate_tool(ToolDebuggerAgent(), tool, command, resolver=RequirementResolverAgent())
+    except RequestCancelled:
+        # out of budget: the tool could not be exercised, which is what skipped means
+        validated = {**tool, "validation": "skipped"}
+    except Exception:
+        logger.warning("Validation of %s failed", tool["id"], exc_info=True)
+        validated = {**tool, "validation": "skipped"}
+    try:
+        changed = validated["implementation"] != tool["implementation"] or validated["dependencies"] != tool["dependencies"]
+        db_helper.update_tool(
+            tool["id"],
+            implementation=validated["implementation"] if changed else None,
+            dependencies=validated["dependencies"] if changed else None,
+            validation=validated["validation"],
+        )
+        VALIDATIONS.labels(outcome=validated["validation"]).inc()
+    finally:
+        db_helper.close()
+
+
+def validate_in_background(tool: dict, command: str):
+    """
+    Resolve, smoke test and repair a newly stored tool after its request has
+    been answered, then store the outcome (and any repaired implementation).
+    Until then the tool is served with validation "pending"; one that still
+    fails is no longer offered, see feedback.is_broken. A worker recycled
+    mid-validation leaves the tool pending.
+    """
+    context = contextvars.copy_context()
+    return _validation_executor.submit(context.run, _validate_and_update, tool, command)
+
 
 class ToolAgentServer():
-    def __init__(self, clear_db=False):
+    def __init__(self, clear_db=False, workers=0, host="0.0.0.0", port=5000, max_requests=1000, index_socket=None, grpc_port=None):
+        """
+        Args:
+            clear_db: Drop every stored tool before serving
+            workers: Number of pre-forked worker processes; 0 runs Flask's single-process development server
+            host: Interface the production server binds to
+            port: Port to serve on
+            max_requests: Requests a worker serves before it is recycled
+            index_socket: Unix socket of the index service used when workers > 0
+            grpc_port: Also serve the gRPC ToolAgent service on this port (see grpc_service.py)
+        """
+        grpc_port = grpc_port or os.environ.get("BTB_GRPC_PORT")
+        self.grpc_port = int(grpc_port) if grpc_port else None
+        self.index_service = None
+        self.index_socket = index_socket or os.environ.get("BTB_INDEX_SOCKET") or "/tmp/btb-index.sock"
+        if workers:
+            # One process owns the vector store and lexical index; workers query it over the socket
+            os.environ.setdefault("BTB_INDEX_AUTHKEY", secrets.token_hex(16))
+            self.index_service = start_index_service(self.index_socket)
+            os.environ["BTB_INDEX_SOCKET"] = self.index_socket
+        db = DBAdapter()
         if clear_db:
-            db = DBAdapter()
             db.clear_db()
-        self.run_server()
+        else:
+            db.sync_metadata()
+        db.close()
+        self.run_server(workers, host, port, max_requests)
 
-    @weave.op
-    def handle_tool_request(self, task_description: str):
+    @tracing.op
+    def handle_tool_request(self, task_description: str, constraints: dict | None = None, on_progress=None):
         generator = ToolGeneratorAgent()
         formatter = ToolFormatterAgent()
         invoker = ToolInvocationAgent()
         matcher = ToolMatcherAgent()
         summarizer = ToolSummaryAgent()
         db_helper = DBAdapter()
+        # artifacts saved by the stages are indexed under this id, see helpers/artifacts.py
+        request_id = str(uuid.uuid4())
+        current_request_id.set(request_id)
 
-        @weave.op
-        def generate_new_tool(summary: str):
-            id = str(uuid.uuid4())
-            generated = generator.generate_tool_code(summary, "python", save_file_name=f"save_runs/generate_{id}.py")
-            try:
-                generated['implementation'] = formatter.generate_main_function(generated["implementation"], save_file_name=f"save_runs/formatted_{id}.py")
-            except Exception as e:
-                print('exception:', e)
+        @tracing.op
+        def generate_new_tool(summary: str, matched: dict | None):
+            if matched:
+                return None
+            return generate_tool(generator, formatter, summary, str(uuid.uuid4()))
+
+        # Stages check the CancelToken before touching the database: after an abort
+        # they may still be running, and db_helper is closed once they stop
+        def find_candidates(summary: str):
+            check_cancelled()
+            results = db_helper.query(summary, n_results=RERANK_POOL, constraints=constraints)
+            # execution feedback reorders the best matches and drops broken tools
+            ids = db_helper.rank_candidates(results['ids'][0])
+            print(f"IDs: {ids}")
+            return ids
+
+        def fetch_candidate(candidates: list):
+            # the full row: the matcher reads the implementation, and a match is served with it
+            check_cancelled()
+            return db_helper.get_tool(candidates[0]) if candidates else None
 
+        @tracing.op
+        def match_candidate(summary: str, candidate: dict | None):
+            if candidate is None:
+                return None
+            # Match the tool to the task description
+            match = matcher.match_tool(summary, candidate["description"], candidate["implementation"])
+            MATCHER_DECISIONS.labels(decision=match if match in ("TRUE", "FALSE") else "INVALID").inc()
+            if match == "TRUE":
+                print(f"Tool found: {candidate['id']}")
+                return candidate
+            return None
+
+        def choose_tool(matched: dict | None, generated: dict | None):
+            CATALOG_LOOKUPS.labels(result="hit" if matched else "miss").inc()
+            return matched or generated
+
+        def generate_command(task: str, summary: str, tool: dict):
+            return invoker.generate_invocation(
+                id=tool['id'],
+                task=task,
+                arguments=", ".join(tool['arguments']),
+                argument_types=", ".join(tool['argument_types']),
+                summary=summary,
+                implementation=tool['implementation'],
+                save_file_name=f"invocation:{tool.get('id')}"
+            )
+
+        def store_generated(generated: dict | None):
+            # new tools are stored as soon as they exist and validated after the response
+            if not generated:
+                return
+            check_cancelled()
+            generated["validation"] = "pending"
             db_helper.add_tool(
-                id,
-                summary,
-                generated.get("arguments"),
-                generated.get("argument_types"),
-                generated.get("env_variables"),
-                generated.get("command"),
-                generated.get("implementation"),
-                generated.get("dependencies")
+                generated["id"],
+                generated["description"],
+                generated["arguments"],
+                generated["argument_types"],
+                generated["env_variables"],
+                generated["command"],
+                generated["implementation"],
+                generated["dependencies"],
+                generated["language"],
+                generated["validation"],
             )
 
-            return db_helper.get_tool(id)
+        def record_usage(tool: dict, stored):
+            check_cancelled()
+            db_helper.record_usage(tool['id'])
 
-        @weave.op
-        def try_retrieve_tool(summary: str):
-            results = db_helper.query(summary)
-            ids = results['ids'][0]
-            print(f"IDs: {ids}")
-            if len(ids) > 0:
-                id = ids[0]
-                tool = db_helper.get_tool(id)
-                # Match the tool to the task description
-                match = matcher.match_tool(summary, tool["description"], tool["implementation"])
-                if match == "TRUE":
-                    print(f"Tool found: {id}")
-                    return tool
-            return None
+        def respond(tool: dict, command: str, usage):
+            return {**with_resolution(tool), 'command': command, 'request_id': request_id}
 
-        summary = summarizer.summarize(task_description)
-        tool_or_none = try_retrieve_tool(summary)
-        tool = tool_or_none if tool_or_none else generate_new_tool(summary)
-
-        command = invoker.generate_invocation(
-            id=tool['id'],
-            task=task_description,
-            arguments=tool['arguments'],
-            argument_types=tool['argument_types'],
-            summary=summary,
-            implementation=tool['implementation'],
-            save_file_name=f"save_runs/invocation_{tool.get('id')}.py"
-        )
-        tool["env_variables"] =  list(map(str.strip, tool['env_variables'].split(","))) if tool['env_variables'] != "NONE" else []
-        tool["dependencies"] = list(map(str.strip, tool['dependencies'].split(","))) if tool['dependencies'] != "NONE" else []
-        tool['command'] = command
-        return tool
+        graph = StageGraph([
+            Stage("summary", lambda task: summarizer.summarize(task), ["task"], STAGE_TIMEOUTS["summary"]),
+            Stage("candidates", find_candidates, ["summary"], STAGE_TIMEOUTS["candidates"]),
+            Stage("candidate", fetch_candidate, ["candidates"], STAGE_TIMEOUTS["candidate"]),
+            Stage("matched", match_candidate, ["summary", "candidate"], STAGE_TIMEOUTS["matched"]),
+            Stage("generated", generate_new_tool, ["summary", "matched"], STAGE_TIMEOUTS["generated"]),
+            Stage("tool", choose_tool, ["matched", "generated"]),
+            Stage("command", generate_command, ["task", "summary", "tool"], STAGE_TIMEOUTS["command"]),
+            # the generated tool is stored while its command is written; usage needs the row
+            Stage("stored", store_generated, ["generated"], STAGE_TIMEOUTS["stored"]),
+            Stage("usage", record_usage, ["tool", "stored"], STAGE_TIMEOUTS["usage"]),
+            Stage("response", respond, ["tool", "command", "usage"]),
+        ])
+        stage_seconds = {}
+
+        def on_stage_done(stage: str, seconds: float):
+            STAGE_SECONDS.labels(stage=stage).observe(seconds)
+            stage_seconds[stage] = seconds
+            # e.g. the gRPC StreamTool RPC, which forwards every finished stage
+            if on_progress:
+                on_progress(stage, seconds)
+
+        # closed only once no stage uses it, which after an abort may be after run() raised
+        results = graph.run({"task": task_description}, timeout=REQUEST_DEADLINE, on_stage_done=on_stage_done, on_settled=db_helper.close)
+        if results["generated"]:
+            # smoke tested with the request's own invocation
+            validate_in_background(results["generated"], results["command"])
+        # per-stage timings and whether a catalog tool was reused, for clients and benchmarks
+        return {**results["response"], 'reused': results["matched"] is not None, 'stage_seconds': stage_seconds}
+
+    def serve_tool_request(self, task: str, constraints: dict | None, caller: str, priority, on_progress=None):
+        """
+        Admit and handle one tool request; shared by the JSON and gRPC APIs.
+
+        Returns:
+            (status, body): 200 and the handle_tool_request result, or an HTTP error status
+            and {"error": ...}, with "retry_after" in seconds when the request was shed
+        """
+        start = time.perf_counter()
+        try:
+            self.admission.acquire(caller, priority)
+        except AdmissionRejected as e:
+            REQUEST_SECONDS.labels(status='rejected').observe(time.perf_counter() - start)
+            retry_after = math.ceil(e.retry_after)
+            return e.status, {'error': f'Request not admitted: {e.reason}', 'retry_after': retry_after}
 
-        # return {
-        #     "id": tool['id'],
-        #     "command": command,
-        #     "implementation": tool['implementation'],
-        #     "env_variables": tool['env_variables'].split(",") if tool['env_variables'] != "NONE" else [],
-        #     "dependencies": tool['dependencies'].split(",") if tool['dependencies'] != "NONE" else []
-        # }
+        status = 'ok'
+        admitted = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            return 200, self.handle_tool_request(task, constraints, on_progress)
+        except (TimeoutError, RequestCancelled) as e:
+            status = 'timeout'
+            return 504, {'error': str(e)}
+        except LLMRequestError as e:
+            if not e.rate_limited:
+                status = 'error'
+                return 500, {'error': str(e)}
+            # the provider is still shedding load after the scheduler's retries
+            status = 'rejected'
+            return 429, {'error': str(e), 'retry_after': math.ceil(e.retry_after or 1)}
+        except Exception as e:
+            status = 'error'
+            return 500, {'error': str(e)}
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            self.admission.release(time.perf_counter() - admitted)
+            REQUEST_SECONDS.labels(status=status).observe(time.perf_counter() - start)
 
-    def run_server(self):
-        from flask import Flask, request, jsonify
+    def create_app(self):
+        from flask import Flask, Response, request, jsonify, send_from_directory
 
         app = Flask(__name__)
+        # One per process: in multi-worker mode every worker admits its own share
+        self.admission = AdmissionController.from_env()
 
         @app.route('/api/genTool', methods=['POST'])
         def gen_tool():
@@ -100,20 +416,137 @@ class ToolAgentServer():
             if not data or 'task' not in data:
                 return jsonify({'error': 'Missing task in request body'}), 400
 
-            task = data['task']
+            # optional metadata pre-filters, see helpers/filters.py:constraints_to_where
+            constraints = data.get('constraints')
+            # callers are queued fairly by X-BTB-Caller (or address) and by priority: high, normal or low
+            caller = request.headers.get('X-BTB-Caller') or request.remote_addr or 'unknown'
+            priority = parse_priority(data.get('priority') or request.headers.get('X-BTB-Priority'))
+            status, body = self.serve_tool_request(data['task'], constraints, caller, priority)
+            response = jsonify(body)
+            if 'retry_after' in body:
+                response.headers['Retry-After'] = str(body['retry_after'])
+            return response, status
+
+        @app.route('/api/artifacts', methods=['GET'])
+        def artifacts():
+            # stage artifacts of a tool and/or request, e.g. /api/artifacts?request_id=...
+            tool_id = request.args.get('tool_id')
+            request_id = request.args.get('request_id')
+            if not tool_id and not request_id:
+                return jsonify({'error': 'Pass tool_id and/or request_id'}), 400
+            return jsonify(get_artifact_log().artifacts(tool_id=tool_id, request_id=request_id))
+
+        @app.route('/api/telemetry', methods=['POST'])
+        def telemetry():
+            # batched run reports from clients, see btb/client/telemetry.py
+            reports = (request.json or {}).get('reports')
+            if not isinstance(reports, list):
+                return jsonify({'error': 'Pass a list of reports'}), 400
+            db_helper = DBAdapter()
+            try:
+                tools = db_helper.record_runs(reports)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            finally:
+                db_helper.close()
+            return jsonify({'accepted': len(reports), 'tools': tools})
+
+        @app.route('/api/tools/<id>', methods=['GET'])
+        def get_tool(id):
+            # ids retired by compaction resolve to the tool that replaced them
+            db_helper = DBAdapter()
             try:
-                result = self.handle_tool_request(task)
-                return jsonify(result)
-            except Exception as e:
-                return jsonify({'error': str(e)}), 500
+                tool = db_helper.get_tool(id)
+            finally:
+                db_helper.close()
+            if tool is None:
+                return jsonify({'error': f'Tool {id} not found'}), 404
+            return jsonify({**with_resolution(tool), 'requested_id': id})
+
+        @app.route('/api/wheels/<path:filename>', methods=['GET'])
+        def wheel(filename):
+            # wheelhouse files named in resolved_dependencies, fetched once by each client
+            return send_from_directory(get_dependency_cache().wheel_dir, filename)
+
+        @app.route('/api/admission', methods=['GET'])
+        def admission_status():
+            # running and queued requests and the current expected queue wait
+            return jsonify(self.admission.status())
+
+        @app.route('/metrics', methods=['GET'])
+        def prometheus_metrics():
+            return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+        @app.route('/api/usage', methods=['GET'])
+        def usage():
+            # token, cost and latency totals per agent since start (or the last reset)
+            recorder = get_usage_recorder()
+            summary = recorder.summary()
+            if request.args.get('reset'):
+                recorder.reset()
+            return jsonify(summary)
+
+        return app
+
+    def run_server(self, workers=0, host="0.0.0.0", port=5000, max_requests=1000):
+        compaction_interval = float(os.environ.get("BTB_COMPACTION_INTERVAL", "0"))
+        self.compaction = CompactionSchedule(compaction_interval) if compaction_interval > 0 else None
+        if not workers:
+            if self.compaction:
+                self.compaction.start_thread()
+            self._worker_app(host).run(port=port)
+            return
+        try:
+            PreforkServer(
+                lambda: self._worker_app(host),
+                host=host,
+                port=port,
+                workers=workers,
+                max_requests=max_requests,
+                on_tick=self._on_tick,
+            ).run()
+        finally:
+            self.index_service.terminate()
+
+    def _worker_app(self, host: str):
+        # Called after the fork in multi-worker mode: grpc must not be loaded in the master
+        app = self.create_app()
+        if self.grpc_port:
+            from .grpc_service import start_grpc_server
+            self.grpc_server = start_grpc_server(self, self.grpc_port, host)
+        return app
+
+    def _on_tick(self):
+        self._supervise_index_service()
+        if self.compaction:
+            self.compaction.tick()
 
-        app.run(port=5000)
+    def _supervise_index_service(self):
+        # Restart the index owner if it died; workers reconnect on their next call
+        if not self.index_service.is_alive():
+            print(f"Index service exited with code {self.index_service.exitcode}, restarting")
+            self.index_service = start_index_service(self.index_socket)
 
 # take in a clear_db flag
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--clear_db", action="store_true")
+    parser.add_argument("--workers", type=int, default=0, help="pre-forked worker processes (0: development server)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--max-requests", type=int, default=1000, help="requests per worker before it is recycled")
+    parser.add_argument("--index-socket", default=None)
+    parser.add_argument("--grpc-port", type=int, default=None, help="also serve the gRPC ToolAgent service on this port")
     return parser.parse_args()
 
 if __name__ == "__main__":
     args = parse_args()
+    ToolAgentServer(
+        clear_db=args.clear_db,
+        workers=args.workers,
+        host=args.host,
+        port=args.port,
+        max_requests=args.max_requests,
+        index_socket=args.index_socket,
+        grpc_port=args.grpc_port,
+    )
@@ -0,0 +1,201 @@
+"""
+Pre-generate catalog tools from a corpus of expected tasks.
+
+    python -m btb.server.warmup corpus.jsonl --parallelism 8
+
+The corpus is JSONL in the format of requests.jsonl: each line has a "task"
+field, or a "title" and "body" that together describe the task, and
+optionally an id ("request_id" or "id").
+
+Tasks are summarized, clustered by summary embedding, and one tool is
+generated (and smoke tested, see validate_tool) per cluster that the catalog
+does not already cover. All LLM calls go through the shared scheduler, so
+--parallelism only bounds how many are in flight; rate limits still apply. Generated tools are bulk-loaded with
+DBAdapter.add_tools.
+
+Progress is appended to a state file after every step, so an interrupted run
+picks up where it stopped: finished summaries and tools are not regenerated.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import json
+import os
+import threading
+import uuid
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .agents import RequirementResolverAgent, ToolDebuggerAgent, ToolFormatterAgent, ToolGeneratorAgent, ToolSummaryAgent
+from .agents.helpers.db_helper import DBAdapter
+from .agents.helpers.embedding import get_embedder
+from .server import generate_tool, validate_tool
+
+# Tool ids are derived from the cluster so a resumed run cannot load a cluster twice
+TOOL_NAMESPACE = uuid.UUID("5b7c1d2e-8a8f-4f0e-9a51-6f1f0c7d2b10")
+
+
+def load_corpus(path: str) -> List[Tuple[str, str]]:
+    """(key, task) for every line of the corpus."""
+    tasks = []
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            task = record.get("task") or "\n".join(part for part in (record.get("title"), record.get("body")) if part)
+            key = record.get("request_id") or record.get("id") or hashlib.sha256(task.encode("utf-8")).hexdigest()[:16]
+            tasks.append((str(key), task.strip()))
+    return tasks
+
+
+class WarmupState:
+    """Append-only JSONL checkpoint of finished steps."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.summaries: Dict[str, str] = {}
+        self.tools: Dict[str, Dict] = {}
+        self.skipped: Dict[str, str] = {}
+        self.loaded = set()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Last line cut short by the interruption
+                        continue
+                    self._apply(record)
+
+    def _apply(self, record: Dict):
+        if record["step"] == "summary":
+            self.summaries[record["key"]] = record["summary"]
+        elif record["step"] == "tool":
+            self.tools[record["cluster"]] = record["tool"]
+        elif record["step"] == "covered":
+            self.skipped[record["cluster"]] = record["tool_id"]
+        elif record["step"] == "loaded":
+            self.loaded.update(record["ids"])
+
+    def record(self, **record):
+        with self.lock:
+            self._apply(record)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def cluster_summaries(keys: List[str], summaries: List[str], threshold: float) -> List[List[int]]:
+    """
+    Greedy single pass: each summary joins the first cluster whose leader is at
+    least threshold cosine-similar, else starts a new cluster. Deterministic for
+    a given corpus order, so cluster ids are stable across resumed runs.
+    """
+    vectors = np.stack(get_embedder().embed(summaries)).astype(np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    leaders: List[int] = []
+    clusters: List[List[int]] = []
+    for i in range(len(keys)):
+        if leaders:
+            similarities = vectors[leaders] @ vectors[i]
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                clusters[best].append(i)
+                continue
+        leaders.append(i)
+        clusters.append([i])
+    return clusters
+
+
+def covering_tool(db: DBAdapter, summary: str, threshold: float):
+    # An existing tool whose description is at least threshold similar covers the cluster
+    result = db.vector_db.query(summary, n_results=1)
+    if result["ids"] and result["ids"][0] and 1 - result["distances"][0][0] >= threshold:
+        return result["ids"][0][0]
+    return None
+
+
+def run(corpus: str, state_path: str, parallelism: int, threshold: float, batch_size: int):
+    tasks = load_corpus(corpus)
+    state = WarmupState(state_path)
+    db = DBAdapter()
+    summarizer = ToolSummaryAgent()
+
+    pending = [(key, task) for key, task in tasks if key not in state.summaries]
+    print(f"{len(tasks)} tasks, {len(pending)} to summarize")
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        futures = {executor.submit(summarizer.summarize, task): key for key, task in pending}
+        for future in as_completed(futures):
+            try:
+                state.record(step="summary", key=futures[future], summary=future.result())
+            except Exception as e:
+                print(f"summary of {futures[future]} failed: {e}")
+
+    keys = [key for key, _ in tasks if state.summaries.get(key)]
+    summaries = [state.summaries[key] for key in keys]
+    clusters = cluster_summaries(keys, summaries, threshold) if keys else []
+    print(f"{len(clusters)} clusters")
+
+    to_generate = []
+    for members in clusters:
+        cluster = keys[members[0]]
+        if cluster in state.tools or cluster in state.skipped:
+            continue
+        existing = covering_tool(db, summaries[members[0]], threshold)
+        if existing:
+            state.record(step="covered", cluster=cluster, tool_id=existing)
+        else:
+            to_generate.append((cluster, summaries[members[0]]))
+    print(f"{len(to_generate)} tools to generate, {len(state.tools)} already generated, {len(state.skipped)} covered by the catalog")
+
+    generator = ToolGeneratorAgent()
+    formatter = ToolFormatterAgent()
+    debugger = ToolDebuggerAgent()
+    resolver = RequirementResolverAgent()
+
+    def generate(summary: str, id: str):
+        # No task to build a command from, so the smoke test only imports the module
+        return validate_tool(debugger, generate_tool(generator, formatter, summary, id), resolver=resolver)
+
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        futures = {
+            executor.submit(generate, summary, str(uuid.uuid5(TOOL_NAMESPACE, cluster))): cluster
+            for cluster, summary in to_generate
+        }
+        for future in as_completed(futures):
+            try:
+                state.record(step="tool", cluster=futures[future], tool=future.result())
+            except Exception as e:
+                print(f"generation for cluster {futures[future]} failed: {e}")
+
+    # Tools inserted just before an interruption may not be checkpointed as loaded yet
+    # Tools that still failed their smoke test after repairs are not worth storing
+    unloaded = [
+        tool for tool in state.tools.values()
+        if tool["id"] not in state.loaded and tool.get("validation") != "failed" and db.get_tool_summary(tool["id"]) is None
+    ]
+    for i in range(0, len(unloaded), batch_size):
+        batch = unloaded[i:i + batch_size]
+        db.add_tools(batch)
+        state.record(step="loaded", ids=[tool["id"] for tool in batch])
+    db.close()
+    print(f"loaded {len(unloaded)} tools")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate catalog tools from a task corpus")
+    parser.add_argument("corpus", help="JSONL of expected tasks, e.g. requests.jsonl")
+    parser.add_argument("--state", default=None, help="Checkpoint file (default: <corpus>.warmup-state.jsonl)")
+    parser.add_argument("--parallelism", type=int, default=8, help="LLM calls in flight; the scheduler's rate limits still apply")
+    parser.add_argument("--threshold", type=float, default=0.9, help="Cosine similarity for tasks to share a tool")
+    parser.add_argument("--batch-size", type=int, default=100, help="Tools per bulk insert")
+    args = parser.parse_args()
+    run(args.corpus, args.state or args.corpus + ".warmup-state.jsonl", args.parallelism, args.threshold, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Sampled, asynchronous tracing.
+
+Functions are decorated with @tracing.op instead of @weave.op. Whether and how
+they are traced is configured through the environment:
+
+    BTB_TRACE_MODE         off | weave | jsonl (default: weave)
+    BTB_TRACE_PROJECT      weave project (default: wandb/zach-agent-project-v1)
+    BTB_TRACE_FILE         output file for jsonl mode (default: traces.jsonl)
+    BTB_TRACE_SAMPLE_RATE  fraction of root calls (requests) traced (default: 1.0)
+    BTB_TRACE_ENABLE       comma-separated function names; if set, only these are traced
+    BTB_TRACE_DISABLE      comma-separated function names never traced
+                           (default: parse_marked_blocks,DBAdapter.add_tool)
+
+When tracing is off, or a function is not enabled, the decorator returns the
+function unchanged. The sampling decision is made once at the root call and
+inherited by everything it calls, so an unsampled request only pays for a
+context variable lookup per decorated call. Finished traces are handed to a
+background thread, so exporting never blocks the request.
+
+In weave mode the calls are created after the request finished, and weave
+stamps them with the time of the export: their start, end and latency in the
+weave UI are not the request's. The recorded times are in each call's
+attributes (started_at, ended_at, duration_s).
+"""
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import functools
+import itertools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+MODE = os.environ.get("BTB_TRACE_MODE", "weave").lower()
+SAMPLE_RATE = float(os.environ.get("BTB_TRACE_SAMPLE_RATE", "1.0"))
+ENABLED = {name.strip() for name in os.environ.get("BTB_TRACE_ENABLE", "").split(",") if name.strip()}
+DISABLED = {name.strip() for name in os.environ.get("BTB_TRACE_DISABLE", "parse_marked_blocks,DBAdapter.add_tool").split(",") if name.strip()}
+
+# Longest repr kept per traced argument or return value
+MAX_VALUE_LENGTH = 2000
+
+
+class Span:
+    __slots__ = ("id", "name", "parent", "trace", "inputs", "output", "error", "start", "end")
+
+    def __init__(self, id: int, name: str, parent: Optional["Span"], inputs: Dict[str, str]):
+        self.id = id
+        self.name = name
+        self.parent = parent
+        self.trace: List[Span] = parent.trace if parent else []
+        self.inputs = inputs
+        self.output = None
+        self.error = None
+        self.start = time.time()
+        self.end = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "parent_id": self.parent.id if self.parent else None,
+            "name": self.name,
+            "inputs": self.inputs,
+            "output": self.output,
+            "error": self.error,
+            "start": self.start,
+            "end": self.end,
+        }
+
+
+# Current span; _UNSAMPLED marks a root call that lost the sampling draw
+_UNSAMPLED = object()
+_current: ContextVar[Any] = ContextVar("btb_trace_span", default=None)
+_ids = itertools.count(1)
+
+
+def _short(value: Any) -> str:
+    text = repr(value)
+    return text if len(text) <= MAX_VALUE_LENGTH else text[:MAX_VALUE_LENGTH] + "..."
+
+
+def _display_name(fn: Callable) -> str:
+    return fn.__qualname__.replace(".<locals>", "")
+
+
+def _is_enabled(fn: Callable) -> bool:
+    names = {fn.__name__, _display_name(fn)}
+    if names & DISABLED:
+        return False
+    return not ENABLED or bool(names & ENABLED)
+
+
+class JsonlExporter:
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]):
+        with open(self.path, "a") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict()) + "\n")
+
+
+def _timing_attributes(span: Span) -> Dict[str, Any]:
+    return {
+        "started_at": datetime.fromtimestamp(span.start, timezone.utc).isoformat(),
+        "ended_at": datetime.fromtimestamp(span.end, timezone.utc).isoformat(),
+        "duration_s": span.end - span.start,
+    }
+
+
+class WeaveExporter:
+    """
+    Replays finished traces into weave, initializing the client on first export.
+
+    weave's create_call and finish_call take no timestamps, so the call times
+    weave shows are the replay's; only the attributes carry the recorded ones.
+    """
+
+    def __init__(self, project: str):
+        self.project = project
+        self.client = None
+
+    def export(self, spans: List[Span]):
+        if self.client is None:
+            import weave
+            self.client = weave.init(self.project)
+        calls = {}
+        # Parents start before their children, so creating in start order keeps the tree intact
+        for span in sorted(spans, key=lambda s: (s.start, s.id)):
+            parent = calls.get(span.parent.id) if span.parent else None
+            calls[span.id] = self.client.create_call(
+                op=span.name,
+                inputs=span.inputs,
+                parent=parent,
+                attributes=_timing_attributes(span),
+            )
+        for span in sorted(spans, key=lambda s: (s.end, s.id)):
+            exception = RuntimeError(span.error) if span.error else None
+            self.client.finish_call(calls[span.id], output=span.output, exception=exception)
+
+
+class _ExportQueue:
+    """Bounded queue drained by one daemon thread. Traces are dropped, not waited on, when full."""
+
+    def __init__(self, exporter, max_traces: int = 1000):
+        self.exporter = exporter
+        self.queue: queue.Queue = queue.Queue(maxsize=max_traces)
+        self.dropped = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def put(self, trace: List[Span]):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="btb-trace-export", daemon=True)
+                    self.thread.start()
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            trace = self.queue.get()
+            try:
+                self.exporter.export(trace)
+            except Exception as e:
+                print(f"trace export failed: {e}")
+
+    def reset_after_fork(self):
+        # The export thread does not survive fork; the child starts its own on first use
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def flush(self, timeout: float = 5.0):
+        deadline = time.monotonic() + timeout
+        while not self.queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+def _create_exporter():
+    if MODE == "weave":
+        return WeaveExporter(os.environ.get("BTB_TRACE_PROJECT", "wandb/zach-agent-project-v1"))
+    if MODE == "jsonl":
+        return JsonlExporter(os.environ.get("BTB_TRACE_FILE", "traces.jsonl"))
+    return None
+
+_exporter = _create_exporter()
+_queue = _ExportQueue(_exporter) if _exporter else None
+if _queue is not None:
+    os.register_at_fork(after_in_child=_queue.reset_after_fork)
+
+
+def op(fn: Callable) -> Callable:
+    """Trace fn as a span of the current trace (or as a new root, subject to sampling)."""
+    if _queue is None or not _is_enabled(fn):
+        return fn
+    name = _display_name(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        parent = _current.get()
+        if parent is _UNSAMPLED:
+            return fn(*args, **kwargs)
+        if parent is None and random.random() >= SAMPLE_RATE:
+            token = _current.set(_UNSAMPLED)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current.reset(token)
+
+        # Methods: leave self out of the recorded inputs
+        recorded = args[1:] if args and hasattr(args[0], fn.__name__) else args
+        inputs = {f"arg{i}": _short(value) for i, value in enumerate(recorded)}
+        inputs.update({key: _short(value) for key, value in kwargs.items()})
+        span = Span(next(_ids), name, parent, inputs)
+        token = _current.set(span)
+        try:
+            result = fn(*args, **kwargs)
+            span.output = _short(result)
+            return result
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end = time.time()
+            _current.reset(token)
+            span.trace.append(span)
+            if parent is None:
+                _queue.put(span.trace)
+
+    return wrapper
+
+
+def flush(timeout: float = 5.0):
+    """Wait (bounded) for queued traces to be exported, e.g. before a short-lived process exits."""
+    if _queue is not None:
+        _queue.flush(timeout)
@@ -1,7 +1,11 @@
 from btb import ToolAgentServer
 from dotenv import load_dotenv
+import argparse
 load_dotenv()
 
 if __name__ == "__main__":
-    server = ToolAgentServer(True)
-    server.run_server()
+    parser = argparse.ArgumentParser()
+    # Wipes the catalog, including tools loaded by btb.server.warmup
+    parser.add_argument("--clear_db", action="store_true")
+    args = parser.parse_args()
+    ToolAgentServer(clear_db=args.clear_db)
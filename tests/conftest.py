@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+# Everything offline: in-process catalog and vectors, hashed embeddings and the
+# fake LLM backend without its simulated latency
+_scratch = tempfile.mkdtemp(prefix="btb-tests-")
+for name, value in {
+    "BTB_CATALOG_STORE": "memory",
+    "BTB_VECTOR_BACKEND": "memory",
+    "BTB_EMBEDDING_MODEL": "hash",
+    "BTB_EMBEDDING_CACHE_PATH": os.path.join(_scratch, "embedding_cache"),
+    "BTB_LLM_BACKEND": "FAKE",
+    "BTB_FAKE_LLM_SPEED": "0",
+    "BTB_TRACE_MODE": "off",
+    "BTB_ARTIFACT_PATH": os.path.join(_scratch, "artifacts"),
+    "BTB_WHEELHOUSE": os.path.join(_scratch, "wheelhouse"),
+    "BTB_TELEMETRY": "0",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from btb.server.admission import AdmissionController, AdmissionRejected, parse_priority
+from btb.server.agents.helpers.scheduler import Priority
+
+
+def _queue(controller, caller, order, priority=Priority.NORMAL):
+    def run():
+        controller.acquire(caller, priority)
+        order.append(caller)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    # let it reach the queue, so arrival order is deterministic
+    time.sleep(0.05)
+    return thread
+
+
+def _drain(controller, threads, order):
+    for _ in threads:
+        before = len(order)
+        controller.release()
+        deadline = time.monotonic() + 2
+        while len(order) == before and time.monotonic() < deadline:
+            time.sleep(0.01)
+    for thread in threads:
+        thread.join(2)
+
+
+def test_callers_are_served_round_robin():
+    controller = AdmissionController(max_concurrent=1, initial_service_time=0.1, queue_timeout=5)
+    controller.acquire("holder")
+    order = []
+    threads = [_queue(controller, caller, order) for caller in ["burst", "burst", "burst", "other"]]
+    _drain(controller, threads, order)
+    # one burst request, then the other caller, before the rest of the burst
+    assert order == ["burst", "other", "burst", "burst"]
+
+
+def test_higher_priority_is_admitted_first():
+    controller = AdmissionController(max_concurrent=1, initial_service_time=0.1, queue_timeout=5)
+    controller.acquire("holder")
+    order = []
+    threads = [
+        _queue(controller, "low", order, Priority.LOW),
+        _queue(controller, "high", order, Priority.HIGH),
+    ]
+    _drain(controller, threads, order)
+    assert order == ["high", "low"]
+
+
+def test_caller_over_its_share_is_rejected_with_429():
+    controller = AdmissionController(max_concurrent=1, initial_service_time=0.1, max_queue_per_caller=1, queue_timeout=5)
+    controller.acquire("holder")
+    order = []
+    thread = _queue(controller, "burst", order)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire("burst")
+    assert rejected.value.status == 429
+    assert rejected.value.retry_after >= 1
+    _drain(controller, [thread], order)
+
+
+def test_full_queue_is_rejected_with_503():
+    controller = AdmissionController(max_concurrent=1, initial_service_time=0.1, max_queue=1, queue_timeout=5)
+    controller.acquire("holder")
+    order = []
+    thread = _queue(controller, "a", order)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire("b")
+    assert rejected.value.status == 503
+    assert rejected.value.reason == "queue_full"
+    _drain(controller, [thread], order)
+
+
+def test_default_limits_agree_at_the_initial_service_time():
+    controller = AdmissionController()
+    # the last queue slot is still within queue_timeout, one more would not be
+    assert controller._expected_wait(controller.max_queue - 1) <= controller.queue_timeout
+    assert controller._expected_wait(controller.max_queue) > controller.queue_timeout
+
+
+def test_from_env_divides_limits_between_workers(monkeypatch):
+    monkeypatch.setenv("BTB_WORKERS", "4")
+    monkeypatch.setenv("BTB_MAX_CONCURRENT_REQUESTS", "8")
+    monkeypatch.setenv("BTB_MAX_QUEUED_REQUESTS", "64")
+    controller = AdmissionController.from_env()
+    assert controller.max_concurrent == 2
+    assert controller.max_queue == 16
+
+
+def test_parse_priority():
+    assert parse_priority("High") == Priority.HIGH
+    assert parse_priority(None) == Priority.NORMAL
+    assert parse_priority("urgent") == Priority.NORMAL
@@ -0,0 +1,51 @@
+import os
+
+from btb.server.agents.helpers.artifacts import ArtifactLog
+
+
+def _logs(path):
+    return sorted(name for name in os.listdir(path) if name.endswith(".log"))
+
+
+def test_retention_skips_segments_other_writers_have_open(tmp_path):
+    # two logs on one directory stand in for two pre-forked workers
+    worker = ArtifactLog(path=str(tmp_path))
+    worker._write_batch([{"kind": "generate", "tool_id": "a", "request_id": None, "ts": 1.0, "content": "x" * 100}])
+    other = ArtifactLog(path=str(tmp_path), max_bytes=0)
+    other.sequence = 100  # same pid and second as worker, so keep the names apart
+    other._write_batch([{"kind": "generate", "tool_id": "b", "request_id": None, "ts": 2.0, "content": "y"}])
+    assert worker.segment + ".log" in _logs(tmp_path)
+
+    worker._close_segment()
+    other._rotate()
+    assert _logs(tmp_path) == [other.segment + ".log"]
+    assert other.latest("generate", "a") is None
+
+
+def test_forked_child_does_not_keep_the_parent_segment_locked(tmp_path):
+    log = ArtifactLog(path=str(tmp_path))
+    log._write_batch([{"kind": "generate", "tool_id": "a", "request_id": None, "ts": 1.0, "content": "x"}])
+    segment = log.segment
+    read, write = os.pipe()
+    ready_read, ready_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # the child outlives the parent's segment, like a worker forked from a master that logged
+        os.close(write)
+        os.write(ready_write, b"x")
+        os.read(read, 1)
+        os._exit(0)
+    os.close(read)
+    os.close(ready_write)
+    # fork hooks have run in the child once it is ready
+    os.read(ready_read, 1)
+    os.close(ready_read)
+    try:
+        log._close_segment()
+        other = ArtifactLog(path=str(tmp_path), max_bytes=0)
+        other.sequence = 100
+        other._rotate()
+        assert segment + ".log" not in _logs(tmp_path)
+    finally:
+        os.close(write)
+        os.waitpid(pid, 0)
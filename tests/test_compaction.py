@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from btb.server.agents.helpers.postgres import implementation_hash
+from btb.server.compaction import plan_merges
+
+
+def _tool(id, implementation, usage_count=0, argument_types=("str",), env_variables=()):
+    return {
+        "id": id,
+        "language": "python",
+        "argument_types": list(argument_types),
+        "env_variables": list(env_variables),
+        "implementation": implementation,
+        "implementation_hash": implementation_hash(implementation),
+        "usage_count": usage_count,
+        "success_count": 0,
+        "failure_count": 0,
+        "last_used_at": None,
+        "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+    }
+
+
+def _vectors(*rows):
+    vectors = np.array(rows, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_duplicates_merge_into_most_used_tool():
+    code = "def main(city):\n    return fetch(city)\n"
+    tools = [_tool("a", code, usage_count=1), _tool("b", code, usage_count=5), _tool("c", code)]
+    merges = plan_merges(tools, _vectors([1, 0], [1, 0], [1, 0]), 0.9, 0.8)
+    assert merges == [("b", ["a", "c"])]
+
+
+def test_different_descriptions_are_kept_apart():
+    code = "def main(city):\n    return fetch(city)\n"
+    tools = [_tool("a", code), _tool("b", code)]
+    assert plan_merges(tools, _vectors([1, 0], [0, 1]), 0.9, 0.8) == []
+
+
+def test_different_implementations_are_kept_apart():
+    tools = [_tool("a", "def main(x):\n    return x\n"), _tool("b", "import os\nprint(os.environ)\n" * 5)]
+    assert plan_merges(tools, _vectors([1, 0], [1, 0]), 0.9, 0.8) == []
+
+
+def test_incompatible_signatures_are_never_merged():
+    code = "def main(city):\n    return fetch(city)\n"
+    tools = [_tool("a", code), _tool("b", code, argument_types=("int",)), _tool("c", code, env_variables=("KEY",))]
+    assert plan_merges(tools, _vectors([1, 0], [1, 0], [1, 0]), 0.9, 0.8) == []
+
+
+def test_no_chaining_through_neighbours():
+    code = "def main(city):\n    return fetch(city)\n"
+    # a~b and b~c, but a and c are too far apart; c must not join a through b
+    tools = [_tool("a", code, usage_count=3), _tool("b", code, usage_count=2), _tool("c", code, usage_count=1)]
+    vectors = _vectors([1, 0], [0.95, 0.31], [0.81, 0.59])
+    merges = dict(plan_merges(tools, vectors, 0.94, 0.8))
+    assert merges["a"] == ["b"]
+    assert "c" not in merges["a"]
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from btb.server.agents.helpers import cancellation
+from btb.server.dag import DeadlineExceededError, Stage, StageGraph, StageTimeoutError
+
+
+def test_stages_get_their_inputs_and_independent_stages_overlap():
+    started = {}
+
+    def timed(name, value):
+        def fn(**inputs):
+            started[name] = time.monotonic()
+            time.sleep(0.1)
+            return value(**inputs)
+        return fn
+
+    graph = StageGraph([
+        Stage("left", timed("left", lambda task: task + 1), ["task"]),
+        Stage("right", timed("right", lambda task: task * 2), ["task"]),
+        Stage("sum", lambda left, right: left + right, ["left", "right"]),
+    ])
+    results = graph.run({"task": 3})
+    assert results["sum"] == 10
+    assert abs(started["left"] - started["right"]) < 0.05
+
+
+def test_cycles_and_unknown_inputs_are_rejected():
+    with pytest.raises(ValueError):
+        StageGraph([Stage("a", lambda b: b, ["b"]), Stage("b", lambda a: a, ["a"])])
+    with pytest.raises(ValueError):
+        StageGraph([Stage("a", lambda missing: missing, ["missing"])]).run({})
+
+
+def test_deadline_cancels_running_stages():
+    cancelled = threading.Event()
+    later = []
+
+    def slow(task):
+        try:
+            cancellation.sleep(5)
+        except cancellation.RequestCancelled:
+            cancelled.set()
+            raise
+
+    graph = StageGraph([
+        Stage("slow", slow, ["task"]),
+        Stage("later", lambda slow: later.append(slow), ["slow"]),
+    ])
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        graph.run({"task": None}, timeout=0.2)
+    assert time.monotonic() - started < 1
+    assert cancelled.wait(1)
+    assert later == []
+
+
+def test_stage_timeout():
+    graph = StageGraph([Stage("slow", lambda task: cancellation.sleep(5), ["task"], timeout=0.1)])
+    with pytest.raises(StageTimeoutError):
+        graph.run({"task": None}, timeout=10)
+
+
+def test_failing_stage_propagates_its_error():
+    def fail(task):
+        raise KeyError("boom")
+
+    with pytest.raises(KeyError):
+        StageGraph([Stage("fail", fail, ["task"])]).run({"task": None})
+
+
+def test_on_settled_waits_for_abandoned_stages():
+    events = []
+
+    def stubborn(task):
+        # ignores cancellation for a while, like a stage blocked in a driver call
+        time.sleep(0.3)
+        events.append("stage done")
+
+    graph = StageGraph([Stage("stubborn", stubborn, ["task"], timeout=0.05)])
+    settled = threading.Event()
+    with pytest.raises(StageTimeoutError):
+        graph.run({"task": None}, on_settled=lambda: (events.append("settled"), settled.set()))
+    assert events == []
+    assert settled.wait(2)
+    assert events == ["stage done", "settled"]
+
+
+def test_on_settled_runs_after_success():
+    settled = []
+    StageGraph([Stage("a", lambda task: task, ["task"])]).run({"task": 1}, on_settled=lambda: settled.append(True))
+    assert settled == [True]
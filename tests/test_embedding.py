@@ -0,0 +1,41 @@
+import threading
+
+import numpy as np
+
+from btb.server.agents.helpers.embedding import EmbeddingCache
+
+
+def test_put_does_not_wait_for_the_disk(tmp_path, monkeypatch):
+    cache = EmbeddingCache(spill_path=str(tmp_path))
+    release = threading.Event()
+    write = cache._write
+    monkeypatch.setattr(cache, "_write", lambda key, vector: (release.wait(5), write(key, vector)))
+
+    cache.put("ab12", np.ones(4, dtype=np.float32))
+    # the writer is stuck, yet put returned and memory serves the entry
+    assert not (tmp_path / "ab" / "ab12.npy").exists()
+    assert cache.get("ab12") is not None
+    release.set()
+    cache.flush()
+    assert (tmp_path / "ab" / "ab12.npy").exists()
+
+
+def test_evicted_and_restarted_entries_are_read_back_from_disk(tmp_path):
+    cache = EmbeddingCache(max_entries=1, spill_path=str(tmp_path))
+    cache.put("aa01", np.full(4, 1.0, dtype=np.float32))
+    cache.put("bb02", np.full(4, 2.0, dtype=np.float32))
+    cache.flush()
+    assert "aa01" not in cache.entries
+    np.testing.assert_array_equal(cache.get("aa01"), np.full(4, 1.0))
+
+    restarted = EmbeddingCache(spill_path=str(tmp_path))
+    np.testing.assert_array_equal(restarted.get("bb02"), np.full(4, 2.0))
+    assert restarted.get("cc03") is None
+
+
+def test_spilled_files_are_pruned_to_the_limit(tmp_path):
+    cache = EmbeddingCache(spill_path=str(tmp_path), max_spill_files=10)
+    for i in range(12):
+        cache.put(f"{i:02d}ff", np.zeros(2, dtype=np.float32))
+    cache.flush()
+    assert sum(1 for _ in cache._spilled()) <= 10
@@ -0,0 +1,63 @@
+from btb.server.agents.helpers.filters import constraints_to_where, matches_where, tool_metadata
+
+WEATHER = tool_metadata("python", ["WEATHER_API_KEY"], ["requests>=2"], "import requests")
+LOCAL = tool_metadata("python", [], ["numpy"], "import numpy")
+FLAKY = tool_metadata("python", [], [], "x = 1", success_rate=0.2)
+
+
+def _where(constraints):
+    return constraints_to_where(
+        constraints,
+        known_env_variables=["WEATHER_API_KEY"],
+        known_dependencies=["requests>=2", "numpy"],
+    )
+
+
+def test_metadata_flags_list_values():
+    assert WEATHER["env:WEATHER_API_KEY"] is True
+    assert WEATHER["dep:requests"] is True
+    assert WEATHER["pure"] is False
+    assert LOCAL["pure"] is True
+
+
+def test_no_constraints_means_no_filter():
+    assert constraints_to_where(None) is None
+    assert constraints_to_where({}) is None
+
+
+def test_available_env_variables_excludes_tools_needing_others():
+    where = _where({"available_env_variables": []})
+    assert not matches_where(WEATHER, where)
+    assert matches_where(LOCAL, where)
+    assert matches_where(WEATHER, _where({"available_env_variables": ["WEATHER_API_KEY"]}))
+
+
+def test_allowed_dependencies_match_by_package_name():
+    where = _where({"allowed_dependencies": ["Requests"]})
+    assert matches_where(WEATHER, where)
+    assert not matches_where(LOCAL, where)
+
+
+def test_combined_constraints():
+    where = _where({"language": "python", "pure": True, "max_dependencies": 0})
+    assert "$and" in where
+    assert matches_where(FLAKY, where)
+    assert not matches_where(LOCAL, where)
+    assert not matches_where(WEATHER, where)
+
+
+def test_min_success_rate():
+    where = _where({"min_success_rate": 0.5})
+    assert matches_where(LOCAL, where)
+    assert not matches_where(FLAKY, where)
+
+
+def test_every_write_path_stores_success_rate():
+    from btb.server.agents.helpers.db_helper import DBAdapter
+
+    db = DBAdapter()
+    db.add_tool("single-add", "convert celsius to fahrenheit", ["c"], ["float"], [], None, "print(1)", [])
+    db.add_tools([{"id": "bulk-add", "description": "convert fahrenheit to celsius", "arguments": ["f"], "argument_types": ["float"], "implementation": "print(2)"}])
+    metadatas = db.vector_db.get_tools(["single-add", "bulk-add"])["metadatas"]
+    assert [metadata["success_rate"] for metadata in metadatas] == [1.0, 1.0]
+    assert "single-add" in db.query("convert celsius to fahrenheit", n_results=2, constraints={"min_success_rate": 0.5})["ids"][0]
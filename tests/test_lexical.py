@@ -0,0 +1,27 @@
+from btb.server.agents.helpers.lexical import BM25Index, hybrid_rank, reciprocal_rank_fusion, tool_document
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["d", "b", "e"]])
+    # second in both beats first in only one
+    assert fused[0] == "b"
+    assert set(fused) == {"a", "b", "c", "d", "e"}
+
+
+def test_rrf_limits_results():
+    assert reciprocal_rank_fusion([["a", "b", "c"]], n_results=2) == ["a", "b"]
+
+
+def test_hybrid_rank_prefers_vector_ranking_on_ties():
+    assert hybrid_rank(["v"], ["l"], n_results=2) == ["v", "l"]
+    assert hybrid_rank(["v1", "v2"], [], n_results=1) == ["v1"]
+
+
+def test_bm25_finds_tools_by_description_and_arguments():
+    index = BM25Index()
+    index.add("weather", tool_document("Fetch the weather forecast for a city", ["city"]))
+    index.add("stocks", tool_document("Look up a stock price", ["ticker"]))
+    assert index.query("weather in a city")[0][0] == "weather"
+    assert index.query("ticker")[0][0] == "stocks"
+    index.remove("stocks")
+    assert all(id != "stocks" for id, _ in index.query("ticker"))
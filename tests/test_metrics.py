@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from btb import metrics
+
+
+def _worker(requests, in_flight, latency):
+    # what one pre-forked worker's registry would hold
+    registry = metrics.Registry()
+    registry.register(metrics.Counter("test_requests_total", "Requests", ["status"])).labels(status="ok").inc(requests)
+    registry.register(metrics.Gauge("test_in_flight", "In flight")).set(in_flight)
+    registry.register(metrics.Histogram("test_seconds", "Latency", buckets=(1, 10))).observe(latency)
+    return registry.snapshot()
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("BTB_METRICS_DIR", str(tmp_path))
+    metrics._write_snapshot(os.path.join(tmp_path, "101.json"), _worker(3, 2, 0.5))
+    metrics._write_snapshot(os.path.join(tmp_path, "102.json"), _worker(4, 1, 5))
+    return str(tmp_path)
+
+
+def test_scrape_sums_every_worker(metrics_dir):
+    text = metrics.render()
+    assert 'test_requests_total{status="ok"} 7' in text
+    assert "test_in_flight 3" in text
+    assert 'test_seconds_bucket{le="1"} 1' in text
+    assert 'test_seconds_bucket{le="10"} 2' in text
+    assert "test_seconds_sum 5.5" in text
+    # the scraping process's own snapshot is written too
+    assert os.path.exists(os.path.join(metrics_dir, f"{os.getpid()}.json"))
+
+
+def test_retired_workers_keep_their_counts_but_not_their_gauges(metrics_dir):
+    metrics.retire(metrics_dir, 101)
+    assert not os.path.exists(os.path.join(metrics_dir, "101.json"))
+    text = metrics.render()
+    assert 'test_requests_total{status="ok"} 7' in text
+    assert "test_in_flight 1" in text
+    assert "test_seconds_count 2" in text
+
+    # the replacement worker starts from zero; the total does not go backwards
+    metrics._write_snapshot(os.path.join(metrics_dir, "103.json"), _worker(1, 0, 0.1))
+    metrics.retire(metrics_dir, 102)
+    assert 'test_requests_total{status="ok"} 8' in metrics.render()
+
+
+def test_without_a_directory_only_this_process_is_rendered(monkeypatch):
+    monkeypatch.delenv("BTB_METRICS_DIR", raising=False)
+    assert metrics.render() == metrics.REGISTRY.render()
@@ -0,0 +1,120 @@
+import threading
+
+import numpy as np
+import pytest
+
+from btb.server.agents.helpers.numpy_index import NumpyVectorIndex
+
+
+def _unit(rng, n, dim=32):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+
+def test_add_and_query_return_nearest_first(tmp_path, rng):
+    vectors = _unit(rng, 20)
+    index = NumpyVectorIndex(path=str(tmp_path), initial_capacity=4)
+    index.add([f"t{i}" for i in range(20)], vectors, documents=[f"doc {i}" for i in range(20)])
+    result = index.query(vectors[[3, 11]], n_results=3)
+    assert [ids[0] for ids in result["ids"]] == ["t3", "t11"]
+    assert result["documents"][0][0] == "doc 3"
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-5)
+    assert len(index) == 20
+
+
+def test_re_adding_an_id_replaces_it(tmp_path, rng):
+    vectors = _unit(rng, 2)
+    index = NumpyVectorIndex(path=str(tmp_path))
+    index.add(["a"], vectors[:1])
+    index.add(["a"], vectors[1:])
+    assert len(index) == 1
+    assert index.query(vectors[1:], n_results=5)["ids"] == [["a"]]
+
+
+def test_deleted_rows_are_never_returned(tmp_path, rng):
+    vectors = _unit(rng, 10)
+    index = NumpyVectorIndex(path=str(tmp_path), compact_ratio=0.9)
+    index.add([f"t{i}" for i in range(10)], vectors)
+    index.delete(["t4"])
+    assert index.count == 10  # tombstoned, not compacted yet
+    ids = index.query(vectors[4:5], n_results=10)["ids"][0]
+    assert "t4" not in ids
+    assert len(ids) == 9
+
+
+def test_compaction_keeps_ids_vectors_and_metadata_together(tmp_path, rng):
+    vectors = _unit(rng, 12)
+    ids = [f"t{i}" for i in range(12)]
+    index = NumpyVectorIndex(path=str(tmp_path), compact_ratio=0.25)
+    index.add(ids, vectors, metadatas=[{"n": i} for i in range(12)])
+    index.delete(ids[:6:2])
+    index.delete(["t1"])  # crosses compact_ratio
+    assert index.count == len(index) == 8
+    for i in range(6, 12):
+        result = index.query(vectors[i:i + 1], n_results=1)
+        assert result["ids"] == [[f"t{i}"]]
+        assert result["metadatas"] == [[{"n": i}]]
+
+    reloaded = NumpyVectorIndex(path=str(tmp_path))
+    assert reloaded.query(vectors[9:10], n_results=1)["ids"] == [["t9"]]
+    assert sorted(reloaded.row_of) == sorted(index.row_of)
+
+
+def test_predicate_filters_before_top_k(tmp_path, rng):
+    vectors = _unit(rng, 10)
+    index = NumpyVectorIndex(path=str(tmp_path))
+    index.add([f"t{i}" for i in range(10)], vectors, metadatas=[{"even": i % 2 == 0} for i in range(10)])
+    ids = index.query(vectors[3:4], n_results=10, predicate=lambda metadata: metadata["even"])["ids"][0]
+    assert ids and all(int(id[1:]) % 2 == 0 for id in ids)
+
+
+def test_filtered_queries_stay_consistent_during_compaction(tmp_path, rng):
+    vectors = _unit(rng, 400)
+    index = NumpyVectorIndex(path=str(tmp_path), compact_ratio=0.05)
+    ids = [f"t{i}" for i in range(400)]
+    index.add(ids, vectors, metadatas=[{"n": i, "even": i % 2 == 0} for i in range(400)])
+    stop = threading.Event()
+    wrong = []
+
+    def query():
+        while not stop.is_set():
+            result = index.query(vectors[:4], n_results=5, predicate=lambda metadata: metadata["even"])
+            for row_ids, metadatas in zip(result["ids"], result["metadatas"]):
+                wrong.extend(id for id, metadata in zip(row_ids, metadatas) if id != f"t{metadata['n']}" or int(id[1:]) % 2)
+
+    thread = threading.Thread(target=query)
+    thread.start()
+    try:
+        for start in range(1, 400, 40):
+            index.delete(ids[start:start + 20])
+    finally:
+        stop.set()
+        thread.join(10)
+    assert wrong == []
+
+
+def test_quantized_top_k_matches_exact_top_k(tmp_path, rng):
+    vectors = _unit(rng, 500, dim=64)
+    queries = _unit(rng, 20, dim=64)
+    ids = [f"t{i}" for i in range(500)]
+    exact = NumpyVectorIndex(path=str(tmp_path / "exact"))
+    quantized = NumpyVectorIndex(path=str(tmp_path / "quantized"), quantize=True)
+    exact.add(ids, vectors)
+    quantized.add(ids, vectors)
+
+    exact_ids = exact.query(queries, n_results=10)["ids"]
+    quantized_result = quantized.query(queries, n_results=10)
+    recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(exact_ids, quantized_result["ids"])])
+    assert recall >= 0.9
+    # exact hits are found first in both, with distances within int8 rounding
+    assert quantized.query(vectors[:5], n_results=1)["ids"] == [[id] for id in ids[:5]]
+    np.testing.assert_allclose(
+        quantized_result["distances"][0][0],
+        exact.query(queries[:1], n_results=1)["distances"][0][0],
+        atol=0.02,
+    )
@@ -0,0 +1,149 @@
+import threading
+import time
+
+import pytest
+
+from btb.server.agents.helpers import cancellation
+from btb.server.agents.helpers.cancellation import CancelToken, RequestCancelled
+from btb.server.agents.helpers.scheduler import LLMRequestError, LLMScheduler, Priority, TokenBucket, worker_share
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(rate_per_minute=60)
+    assert bucket.wait_time(60) == 0.0
+    bucket.take(60)
+    # one token per second
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_token_bucket_caps_oversized_requests_at_capacity():
+    bucket = TokenBucket(rate_per_minute=60)
+    bucket.take(60)
+    assert bucket.wait_time(1000) == pytest.approx(60.0, abs=0.1)
+
+
+def test_worker_share_splits_limits(monkeypatch):
+    monkeypatch.setenv("BTB_WORKERS", "4")
+    assert worker_share(100) == 25
+    assert worker_share(2) == 1
+    monkeypatch.delenv("BTB_WORKERS")
+    assert worker_share(100) == 100
+
+
+def test_submit_retries_transient_failures():
+    scheduler = LLMScheduler(max_retries=3, base_delay=0.001, max_delay=0.01)
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimited()
+        return "ok", 10
+
+    assert scheduler.submit("TEST", "model", call, estimated_tokens=10) == "ok"
+    assert len(attempts) == 3
+
+
+def test_submit_does_not_retry_permanent_failures():
+    scheduler = LLMScheduler(max_retries=3, base_delay=0.001)
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        raise BadRequest()
+
+    with pytest.raises(LLMRequestError) as raised:
+        scheduler.submit("TEST", "model", call, estimated_tokens=10)
+    assert len(attempts) == 1
+    assert not raised.value.rate_limited
+
+
+def test_exhausted_retries_count_as_rate_limited():
+    scheduler = LLMScheduler(max_retries=1, base_delay=0.001, max_delay=0.01)
+
+    def call():
+        raise RateLimited()
+
+    with pytest.raises(LLMRequestError) as raised:
+        scheduler.submit("TEST", "model", call, estimated_tokens=10)
+    assert raised.value.rate_limited
+
+
+def _lane_limits(concurrency):
+    return {"TEST": {"requests_per_minute": 100_000, "tokens_per_minute": 100_000_000, "max_concurrency": concurrency, "reserved_high_priority": 0}}
+
+
+def test_waiters_are_served_by_priority():
+    scheduler = LLMScheduler(limits=_lane_limits(1))
+    release = threading.Event()
+    order = []
+
+    def blocking():
+        release.wait()
+        return None, 1
+
+    def record(name):
+        order.append(name)
+        return None, 1
+
+    holder = threading.Thread(target=scheduler.submit, args=("TEST", "model", blocking, 1))
+    holder.start()
+    time.sleep(0.05)
+    waiters = [
+        threading.Thread(target=scheduler.submit, args=("TEST", "model", lambda: record("low"), 1, Priority.LOW)),
+        threading.Thread(target=scheduler.submit, args=("TEST", "model", lambda: record("high"), 1, Priority.HIGH)),
+    ]
+    for waiter in waiters:
+        waiter.start()
+        time.sleep(0.05)
+    release.set()
+    for thread in [holder, *waiters]:
+        thread.join(5)
+    assert order == ["high", "low"]
+
+
+def test_cancelled_request_leaves_the_queue():
+    scheduler = LLMScheduler(limits=_lane_limits(1))
+    release = threading.Event()
+    holder = threading.Thread(target=scheduler.submit, args=("TEST", "model", lambda: (release.wait(), 1), 1))
+    holder.start()
+    time.sleep(0.05)
+
+    token = CancelToken(time.monotonic() + 0.2)
+    cancellation.current_token.set(token)
+    try:
+        started = time.monotonic()
+        with pytest.raises(RequestCancelled):
+            scheduler.submit("TEST", "model", lambda: ("never", 1), 1)
+        assert time.monotonic() - started < 2
+    finally:
+        cancellation.current_token.set(None)
+        release.set()
+        holder.join(5)
+
+
+class RecordingScheduler:
+    def __init__(self):
+        self.reserved = []
+
+    def submit(self, backend, model, call, estimated_tokens, priority=Priority.NORMAL):
+        self.reserved.append(estimated_tokens)
+        return call()[0]
+
+
+def test_backend_reserves_prompt_and_expected_output():
+    from btb.server.agents.helpers.backend import EXPECTED_OUTPUT_TOKENS, AgentBackend, BackendType
+
+    scheduler = RecordingScheduler()
+    backend = AgentBackend(BackendType.FAKE, "s" * 400, priority=Priority.LOW, scheduler=scheduler, agent="generator")
+    backend.generate("p" * 400)
+    backend.generate("p" * 400, max_tokens=100)
+    assert scheduler.reserved == [200 + EXPECTED_OUTPUT_TOKENS[Priority.LOW], 200 + 100]
@@ -0,0 +1,50 @@
+import pytest
+
+from btb.server import server
+from btb.server.admission import AdmissionController, parse_priority
+from btb.server.agents.helpers.cancellation import RequestCancelled
+from btb.server.agents.helpers.scheduler import LLMRequestError
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+@pytest.fixture
+def tool_server(monkeypatch):
+    validated = []
+    # smoke tests install dependencies and run code; keep them out of request tests
+    monkeypatch.setattr(server, "validate_in_background", lambda tool, command: validated.append(tool["id"]))
+    instance = server.ToolAgentServer.__new__(server.ToolAgentServer)
+    instance.admission = AdmissionController()
+    instance.validated = validated
+    return instance
+
+
+def test_new_tool_is_generated_then_reused(tool_server):
+    generated = tool_server.handle_tool_request("convert 3 miles to kilometers")
+    assert not generated["reused"]
+    assert generated["command"]
+    assert tool_server.validated == [generated["id"]]
+    assert {"summary", "generated", "stored", "usage", "command"} <= set(generated["stage_seconds"])
+
+    reused = tool_server.handle_tool_request("convert 7 miles to kilometers")
+    assert reused["reused"]
+    assert reused["id"] == generated["id"]
+    assert tool_server.validated == [generated["id"]]
+
+
+@pytest.mark.parametrize("error, status", [
+    (RequestCancelled("deadline exceeded"), 504),
+    (LLMRequestError("rate limited", RateLimited()), 429),
+    (LLMRequestError("bad request", ValueError()), 500),
+])
+def test_failures_map_to_statuses(tool_server, monkeypatch, error, status):
+    def fail(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(server.ToolAgentServer, "handle_tool_request", fail)
+    answered, body = tool_server.serve_tool_request("anything", None, "caller", parse_priority(None))
+    assert answered == status
+    assert body["error"]
+    assert tool_server.admission.active == 0
@@ -0,0 +1,87 @@
+import pytest
+import requests
+
+from btb.client import telemetry
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    # each entry is the list of tool ids sent; the server answers with the next status
+    sent = []
+    statuses = []
+
+    def post(url, json, timeout):
+        sent.append([report["tool_id"] for report in json["reports"]])
+        status = statuses.pop(0) if statuses else 200
+        if status is None:
+            raise requests.ConnectionError("unreachable")
+        return Response(status)
+
+    monkeypatch.setattr(telemetry.requests, "post", post)
+    return sent, statuses
+
+
+def _reporter(ids):
+    # a long interval, so only the test flushes
+    reporter = telemetry.TelemetryReporter("http://btb.invalid/api/telemetry", interval=3600)
+    for id in ids:
+        reporter.report(id, True, 0.1, 10)
+    return reporter
+
+
+def _pending(reporter):
+    return [report["tool_id"] for report, _ in reporter.pending]
+
+
+def test_failed_batch_is_retried_once(posts):
+    sent, statuses = posts
+    reporter = _reporter(["a", "b"])
+    statuses.extend([None, None])
+    reporter.flush()
+    assert _pending(reporter) == ["a", "b"]
+    reporter.flush()
+    # the second failure drops them
+    assert _pending(reporter) == []
+    assert sent == [["a", "b"], ["a", "b"]]
+
+
+def test_retry_succeeds(posts):
+    sent, statuses = posts
+    reporter = _reporter(["a"])
+    statuses.append(503)
+    reporter.flush()
+    reporter.flush()
+    assert sent == [["a"], ["a"]]
+    assert _pending(reporter) == []
+
+
+def test_client_errors_are_not_retried(posts):
+    sent, statuses = posts
+    reporter = _reporter(["a"])
+    statuses.append(400)
+    reporter.flush()
+    assert _pending(reporter) == []
+
+
+def test_oldest_reports_are_dropped_when_full(posts, monkeypatch):
+    sent, statuses = posts
+    monkeypatch.setattr(telemetry, "MAX_PENDING", 3)
+    reporter = _reporter(["a", "b"])
+    statuses.append(None)
+
+    # a report arriving during the failed send leaves room for one retry only
+    def post_then_report(url, json, timeout):
+        reporter.pending.extend([({"tool_id": "c"}, False), ({"tool_id": "d"}, False)])
+        raise requests.ConnectionError("unreachable")
+
+    monkeypatch.setattr(telemetry.requests, "post", post_then_report)
+    reporter.flush()
+    assert _pending(reporter) == ["b", "c", "d"]
+
+    reporter = _reporter(["a", "b", "c", "d"])
+    assert _pending(reporter) == ["b", "c", "d"]
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import pytest
+
+from btb.tracing import Span, WeaveExporter
+
+
+class StubWeaveClient:
+    def __init__(self):
+        self.created = []
+        self.finished = []
+
+    def create_call(self, op, inputs, parent=None, attributes=None):
+        self.created.append({"op": op, "parent": parent, "attributes": attributes})
+        return op
+
+    def finish_call(self, call, output=None, exception=None):
+        self.finished.append(call)
+
+
+def _span(id, name, parent, start, end):
+    span = Span(id, name, parent, {})
+    span.start, span.end = start, end
+    span.trace.append(span)
+    return span
+
+
+def test_weave_calls_carry_the_recorded_times():
+    root = _span(1, "handle_tool_request", None, 1_700_000_000.0, 1_700_000_012.5)
+    child = _span(2, "generate", root, 1_700_000_001.0, 1_700_000_011.0)
+    exporter = WeaveExporter("project")
+    exporter.client = StubWeaveClient()
+    exporter.export(root.trace)
+
+    created = {call["op"]: call for call in exporter.client.created}
+    assert created["generate"]["parent"] == "handle_tool_request"
+    attributes = created["handle_tool_request"]["attributes"]
+    assert datetime.fromisoformat(attributes["started_at"]).timestamp() == root.start
+    assert datetime.fromisoformat(attributes["ended_at"]).timestamp() == root.end
+    assert attributes["duration_s"] == pytest.approx(12.5)
+    assert created["generate"]["attributes"]["duration_s"] == pytest.approx(child.end - child.start)
+    # children finish before the parent
+    assert exporter.client.finished == ["generate", "handle_tool_request"]
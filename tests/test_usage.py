@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+import pytest
+
+from btb.server import server
+from btb.server.agents.helpers.backend import AgentBackend, BackendType
+from btb.server.agents.helpers.scheduler import LLMScheduler
+from btb.server.agents.helpers.usage import UsageRecorder, call_cost, get_usage_recorder
+
+
+class StubMessages:
+    def __init__(self, usage):
+        self.usage = usage
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(content=[SimpleNamespace(text="answer")], usage=self.usage)
+
+
+class StubAnthropic:
+    def __init__(self, usage):
+        self.messages = StubMessages(usage)
+
+
+class StubCompletions:
+    def __init__(self, usage):
+        self.usage = usage
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        message = SimpleNamespace(content="answer")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=self.usage)
+
+
+def _anthropic_usage(input_tokens=100, cache_read=0, cache_write=0, output_tokens=20):
+    return SimpleNamespace(input_tokens=input_tokens, cache_read_input_tokens=cache_read, cache_creation_input_tokens=cache_write, output_tokens=output_tokens)
+
+
+def _backend(client, backend_type=BackendType.ANTHROPIC, **kwargs):
+    recorder = UsageRecorder()
+    backend = AgentBackend(
+        backend_type,
+        "system prompt",
+        model="claude-3-5-haiku-latest" if backend_type == BackendType.ANTHROPIC else "gpt-4o-mini",
+        scheduler=LLMScheduler(max_retries=0),
+        agent="generator",
+        client=client,
+        usage_recorder=recorder,
+        **kwargs,
+    )
+    return backend, recorder
+
+
+def test_system_prompt_is_sent_as_a_cacheable_block():
+    client = StubAnthropic(_anthropic_usage())
+    backend, _ = _backend(client)
+    assert backend.generate("prompt") == "answer"
+    system = client.messages.calls[0]["system"]
+    assert system == [{"type": "text", "text": "system prompt", "cache_control": {"type": "ephemeral"}}]
+
+
+def test_prompt_caching_can_be_turned_off():
+    client = StubAnthropic(_anthropic_usage())
+    backend, _ = _backend(client, cache_system_prompt=False)
+    backend.generate("prompt")
+    assert client.messages.calls[0]["system"] == "system prompt"
+
+
+def test_anthropic_usage_counts_cached_and_written_input():
+    # Anthropic's input_tokens leaves out the cache read and cache write parts
+    client = StubAnthropic(_anthropic_usage(input_tokens=10, cache_read=900, cache_write=100, output_tokens=50))
+    backend, recorder = _backend(client)
+    backend.generate("prompt")
+    totals = recorder.summary()["agents"]["generator"]
+    assert totals["calls"] == 1
+    assert totals["input_tokens"] == 1010
+    assert totals["cached_tokens"] == 900
+    assert totals["cache_write_tokens"] == 100
+    assert totals["output_tokens"] == 50
+    assert totals["cache_hit_ratio"] == pytest.approx(900 / 1010)
+    assert totals["cost_usd"] == pytest.approx(call_cost("claude-3-5-haiku-latest", 1010, 900, 100, 50))
+
+
+def test_openai_cached_prompt_tokens_are_recorded():
+    usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=10, total_tokens=1010, prompt_tokens_details=SimpleNamespace(cached_tokens=768))
+    client = SimpleNamespace(chat=SimpleNamespace(completions=StubCompletions(usage)))
+    backend, recorder = _backend(client, BackendType.OPENAI)
+    backend.generate("prompt")
+    totals = recorder.summary()["agents"]["generator"]
+    assert totals["input_tokens"] == 1000
+    assert totals["cached_tokens"] == 768
+    assert totals["cache_write_tokens"] == 0
+
+
+def test_cost_prices_each_kind_of_token():
+    # claude-3-5-haiku: 0.8 input, 0.08 cache read, 1.0 cache write, 4.0 output per million
+    assert call_cost("claude-3-5-haiku-20241022", 1_000_000, 500_000, 250_000, 1_000_000) == pytest.approx(0.2 + 0.04 + 0.25 + 4.0)
+    assert call_cost("unknown-model", 1, 0, 0, 1) is None
+
+
+def test_summary_breaks_totals_down_by_model():
+    recorder = UsageRecorder()
+    recorder.record("matcher", "ANTHROPIC", "claude-3-5-haiku-latest", 100, 50, 0, 10, 0.2)
+    recorder.record("matcher", "OPENAI", "gpt-4o-mini", 100, 0, 0, 10, 0.4)
+    recorder.record(None, "FAKE", "fake", 10, 0, 0, 1, 0.1)
+    summary = recorder.summary()
+    matcher = summary["agents"]["matcher"]
+    assert matcher["calls"] == 2
+    assert matcher["input_tokens"] == 200
+    assert matcher["mean_latency_s"] == pytest.approx(0.3)
+    assert set(matcher["models"]) == {"ANTHROPIC/claude-3-5-haiku-latest", "OPENAI/gpt-4o-mini"}
+    assert matcher["models"]["OPENAI/gpt-4o-mini"]["latency_p50_s"] == pytest.approx(0.4)
+    assert "unknown" in summary["agents"]
+    assert summary["total_cost_usd"] == pytest.approx(sum(entry["cost_usd"] for entry in summary["agents"].values()))
+
+
+def test_usage_endpoint_reports_and_resets():
+    recorder = get_usage_recorder()
+    recorder.reset()
+    recorder.record("summary", "ANTHROPIC", "claude-3-5-haiku-latest", 100, 80, 0, 5, 0.1)
+    instance = server.ToolAgentServer.__new__(server.ToolAgentServer)
+    client = instance.create_app().test_client()
+
+    body = client.get("/api/usage?reset=1").get_json()
+    assert body["agents"]["summary"]["cached_tokens"] == 80
+    assert client.get("/api/usage").get_json()["agents"] == {}
@@ -0,0 +1,141 @@
+import uuid
+
+import pytest
+
+from btb.server import server
+from btb.server.agents.helpers.db_helper import DBAdapter
+from btb.server.agents.helpers.postgres import implementation_hash
+from btb.server.agents.helpers.sandbox import DEPENDENCY_FAILURE, SmokeResult
+
+
+class StubDebugger:
+    def __init__(self, fixes):
+        self.fixes = list(fixes)
+        self.errors = []
+
+    def fix_implementation(self, implementation, command, error, save_file_name=None):
+        self.errors.append(error)
+        fix = self.fixes.pop(0)
+        if isinstance(fix, Exception):
+            raise fix
+        return fix
+
+
+@pytest.fixture
+def smoke_results(monkeypatch):
+    # outcomes handed out in order; each run records the implementation it was given
+    results = []
+    runs = []
+
+    def smoke_test(id, implementation, dependencies, env_variables, command=None):
+        runs.append(implementation)
+        return results.pop(0)
+
+    monkeypatch.setattr(server, "smoke_test", smoke_test)
+    monkeypatch.setattr(server, "resolve_dependencies", lambda resolver, tool: tool)
+    return results, runs
+
+
+def _tool(implementation="broken()"):
+    return {
+        "id": str(uuid.uuid4()),
+        "description": "add two numbers",
+        "arguments": ["a", "b"],
+        "argument_types": ["int", "int"],
+        "env_variables": [],
+        "command": None,
+        "dependencies": [],
+        "language": "python",
+        "implementation": implementation,
+        "implementation_hash": implementation_hash(implementation),
+    }
+
+
+def _failed(stderr="NameError: broken"):
+    return SmokeResult("failed", "python tool.py", returncode=1, stderr=stderr)
+
+
+def test_passing_tool_is_not_repaired(smoke_results):
+    results, runs = smoke_results
+    results.append(SmokeResult("passed", "python tool.py", returncode=0))
+    debugger = StubDebugger([])
+    validated = server.validate_tool(debugger, _tool("ok()"))
+    assert validated["validation"] == "passed"
+    assert runs == ["ok()"]
+    assert debugger.errors == []
+
+
+def test_failing_tool_is_repaired_until_it_passes(smoke_results):
+    results, runs = smoke_results
+    results.extend([_failed(), SmokeResult("passed", "python tool.py", returncode=0)])
+    debugger = StubDebugger(["fixed()"])
+    tool = _tool()
+    validated = server.validate_tool(debugger, tool, "python tool.py")
+    assert validated["validation"] == "passed"
+    assert validated["implementation"] == "fixed()"
+    assert validated["implementation_hash"] == implementation_hash("fixed()")
+    assert runs == ["broken()", "fixed()"]
+    assert debugger.errors == ["NameError: broken"]
+    # the caller's tool is left as it was
+    assert tool["implementation"] == "broken()"
+
+
+def test_repairs_stop_after_max_repairs(smoke_results):
+    results, runs = smoke_results
+    results.extend([_failed(), _failed(), _failed()])
+    validated = server.validate_tool(StubDebugger(["try1()", "try2()"]), _tool(), max_repairs=2)
+    assert validated["validation"] == "failed"
+    assert validated["implementation"] == "try2()"
+    assert runs == ["broken()", "try1()", "try2()"]
+
+
+def test_dependency_failures_are_not_sent_to_the_debugger(smoke_results):
+    results, _ = smoke_results
+    results.append(_failed(f"{DEPENDENCY_FAILURE}: no matching distribution"))
+    debugger = StubDebugger([])
+    validated = server.validate_tool(debugger, _tool())
+    assert validated["validation"] == "failed"
+    assert debugger.errors == []
+
+
+def test_debugger_errors_and_empty_fixes_end_the_loop(smoke_results):
+    results, runs = smoke_results
+    results.append(_failed())
+    validated = server.validate_tool(StubDebugger([RuntimeError("LLM down")]), _tool())
+    assert validated["validation"] == "failed"
+    assert validated["implementation"] == "broken()"
+
+    results.append(_failed())
+    validated = server.validate_tool(StubDebugger(["  "]), _tool())
+    assert validated["implementation"] == "broken()"
+    assert len(runs) == 2
+
+
+def test_background_validation_stores_the_outcome(smoke_results, monkeypatch):
+    results, _ = smoke_results
+    results.extend([_failed(), SmokeResult("passed", "python tool.py", returncode=0)])
+    monkeypatch.setattr(server, "ToolDebuggerAgent", lambda: StubDebugger(["fixed()"]))
+    monkeypatch.setattr(server, "RequirementResolverAgent", lambda: None)
+    tool = _tool()
+    db = DBAdapter()
+    db.add_tool(tool["id"], tool["description"], tool["arguments"], tool["argument_types"], [], None, tool["implementation"], [], validation="pending")
+
+    server.validate_in_background(tool, "python tool.py").result(10)
+    stored = db.get_tool(tool["id"])
+    assert stored["validation"] == "passed"
+    assert stored["implementation"] == "fixed()"
+
+
+def test_background_validation_errors_count_as_skipped(monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("sandbox unavailable")
+
+    monkeypatch.setattr(server, "validate_tool", fail)
+    monkeypatch.setattr(server, "ToolDebuggerAgent", lambda: None)
+    monkeypatch.setattr(server, "RequirementResolverAgent", lambda: None)
+    tool = _tool()
+    db = DBAdapter()
+    db.add_tool(tool["id"], tool["description"], tool["arguments"], tool["argument_types"], [], None, tool["implementation"], [], validation="pending")
+
+    server.validate_in_background(tool, "python tool.py").result(10)
+    assert db.get_tool(tool["id"])["validation"] == "skipped"